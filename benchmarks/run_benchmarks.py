@@ -0,0 +1,480 @@
+
+"""Offline benchmarks for the render and audio hot paths.
+
+Runs without network access: Gemini TTS is replaced by a stub client that
+returns silent PCM sized to the voiceover (batched requests get a quiet
+tone per line, with pauses, so they split), and storyboards are built by
+`build_storyboard` from synthetic quizzes. Every case runs in a fresh child
+process with its own cache directories, so results do not depend on what
+an earlier case left behind.
+
+    python benchmarks/run_benchmarks.py                      # full matrix
+    python benchmarks/run_benchmarks.py --quick              # 1 question, one resolution
+    python benchmarks/run_benchmarks.py --save-baseline      # record benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --only profile=      # encoder profiles: time and size
+    python benchmarks/run_benchmarks.py --only tts_prefetch  # TTS requests per quiz, batched or not
+    python benchmarks/run_benchmarks.py --only formats=      # one render, several output formats
+
+Results are written as JSON (`--output`) and compared against the baseline;
+the exit status is 1 when any case is slower than the baseline by more than
+`--threshold` (relative) and `--min-delta` (seconds). Baselines are only
+comparable on the same machine, so record one per CI runner.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+BENCH_DIR = Path(__file__).resolve().parent
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+
+# Entry points must not import these until they are actually used.
+_HEAVY_MODULES = ("moviepy", "google.adk", "google.genai", "gradio")
+_IMPORT_PROBE = (
+    "import sys, time\n"
+    "t = time.perf_counter()\n"
+    "import {module}\n"
+    "print(time.perf_counter() - t)\n"
+    "print(','.join(m for m in {heavy!r} if m in sys.modules))\n"
+)
+
+# Stub TTS speaking rate, used to size the returned PCM.
+_STUB_WORDS_PER_SEC = 2.5
+_STUB_PCM_RATE = 24000
+# Pause the stub leaves between the lines of a batched request.
+_STUB_BATCH_PAUSE_SEC = 2.0
+
+
+def _synthetic_quiz(num_questions: int) -> Dict[str, Any]:
+    return {
+        "topic": "Benchmark Topic",
+        "difficulty": "medium",
+        "questions": [
+            {
+                "id": i,
+                "question": f"Benchmark question number {i}: which of these options is the right one?",
+                "options": [f"Option {c} for question {i}" for c in "ABCD"],
+                "correct_option_index": i % 4,
+                "fact": f"Fact {i}: a sentence long enough to wrap across two lines of the caption box.",
+            }
+            for i in range(1, num_questions + 1)
+        ],
+    }
+
+
+def _stub_pcm(contents: Any) -> bytes:
+    from quiz_generator_agent.tts_batch import batch_prompt
+
+    text = str(contents)
+    instruction = batch_prompt([])
+    if not text.startswith(instruction):
+        seconds = max(1.0, len(text.split()) / _STUB_WORDS_PER_SEC)
+        return b"\x00\x00" * int(seconds * _STUB_PCM_RATE)
+
+    import numpy as np
+
+    pause = np.zeros(int(_STUB_BATCH_PAUSE_SEC * _STUB_PCM_RATE), dtype="<i2")
+    parts = []
+    for line in text[len(instruction):].split("\n\n"):
+        n = int(max(1.0, len(line.split()) / _STUB_WORDS_PER_SEC) * _STUB_PCM_RATE)
+        parts += [(2000 * np.sin(np.arange(n) * (2 * np.pi * 220 / _STUB_PCM_RATE))).astype("<i2"), pause]
+    return np.concatenate(parts).tobytes()
+
+
+class _StubModels:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.requests = 0
+
+    def generate_content(self, model, contents, config=None):
+        self.requests += 1
+        time.sleep(self.latency)
+        return _stub_response(_stub_pcm(contents))
+
+    def generate_content_stream(self, model, contents, config=None):
+        # Half-second chunks (24000 bytes), like a streamed TTS response.
+        self.requests += 1
+        time.sleep(self.latency)
+        pcm, step = _stub_pcm(contents), _STUB_PCM_RATE
+        for start in range(0, len(pcm), step):
+            yield _stub_response(pcm[start:start + step])
+
+
+def _stub_response(data: bytes):
+    from types import SimpleNamespace
+
+    part = SimpleNamespace(inline_data=SimpleNamespace(data=data))
+    return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+
+
+class _StubClient:
+    def __init__(self, latency: float = 0.0):
+        self.models = _StubModels(latency)
+
+
+def _timed(fn: Callable[[], Any], repeat: int, setup: Callable[[], Any] | None = None) -> List[float]:
+    runs = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        t0 = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - t0)
+    return runs
+
+
+# --- cases (run inside the child process) ---------------------------------
+
+
+def _bench_import(case: Dict[str, Any], work: Path) -> List[float]:
+    # Each run is a fresh interpreter, so nothing is already in sys.modules.
+    probe = _IMPORT_PROBE.format(module=case["module"], heavy=_HEAVY_MODULES)
+    runs = []
+    for _ in range(case["repeat"]):
+        proc = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True)
+        elapsed, heavy = proc.stdout.splitlines()[-2:]
+        if heavy:
+            raise RuntimeError(f"importing {case['module']} also imported {heavy}")
+        runs.append(float(elapsed))
+    return runs
+
+
+def _bench_timer_audio(case: Dict[str, Any], work: Path) -> List[float]:
+    from quiz_generator_agent.audio_agent import _create_timer_audio
+
+    path = work / "timer.wav"
+    return _timed(lambda: _create_timer_audio(path, duration=3.0, style=case["style"]), case["repeat"])
+
+
+def _bench_font(case: Dict[str, Any], work: Path) -> List[float]:
+    from quiz_generator_agent import fonts
+    from quiz_generator_agent.video_agent import _get_available_font
+
+    setup = fonts.reset_font_registry if case["cold"] else None
+    _get_available_font()
+    return _timed(_get_available_font, case["repeat"], setup=setup)
+
+
+def _bench_render_scene(case: Dict[str, Any], work: Path) -> List[float]:
+    import shutil
+
+    import quiz_generator_agent.config as cfg
+    from quiz_generator_agent import frame_cache
+    from quiz_generator_agent.storyboard_agent import build_storyboard
+    from quiz_generator_agent.video_agent import _render_scene
+
+    scenes = build_storyboard(_synthetic_quiz(1))["scenes"]
+
+    def render_all():
+        for idx, scene in enumerate(scenes):
+            _render_scene(scene, idx).close()
+
+    def drop_frame_cache():
+        shutil.rmtree(cfg.FRAME_CACHE_DIR, ignore_errors=True)
+        frame_cache._cache = None
+
+    render_all()
+    return _timed(render_all, case["repeat"], setup=drop_frame_cache if case["cold"] else None)
+
+
+def _bench_render_video(case: Dict[str, Any], work: Path) -> Tuple[List[float], Dict[str, Any]]:
+    import shutil
+
+    import quiz_generator_agent.config as cfg
+    from quiz_generator_agent import audio_cache, clients, frame_cache
+    from quiz_generator_agent.storyboard_agent import build_storyboard
+    from quiz_generator_agent.video_agent import render_video_from_storyboard
+
+    clients.set_client(_StubClient())
+    storyboard = build_storyboard(_synthetic_quiz(case["questions"]))
+
+    def fresh_run():
+        # Every repeat starts from empty caches and an empty outputs/ dir.
+        for path in (Path("outputs"), cfg.AUDIO_CACHE_DIR, cfg.FRAME_CACHE_DIR):
+            shutil.rmtree(path, ignore_errors=True)
+        audio_cache._cache = None
+        frame_cache._cache = None
+
+    # "formats" cases render every listed format in one call.
+    formats = case["formats"].split("+") if "formats" in case else []
+    outputs = []
+    runs = _timed(
+        lambda: outputs.append(render_video_from_storyboard(storyboard, renderer=case["renderer"], formats=formats)),
+        case["repeat"],
+        setup=fresh_run,
+    )
+    videos = outputs[-1].get("videos") or {"": outputs[-1]["final_video"]}
+    return runs, {"output_bytes": sum(Path(path).stat().st_size for path in videos.values())}
+
+
+def _bench_tts_prefetch(case: Dict[str, Any], work: Path) -> Tuple[List[float], Dict[str, Any]]:
+    import shutil
+
+    import quiz_generator_agent.config as cfg
+    from quiz_generator_agent import audio_cache
+    from quiz_generator_agent.audio_agent import prefetch_audio
+    from quiz_generator_agent.storyboard_agent import build_storyboard
+
+    cfg.TTS_BATCH_SIZE = case["batch"]
+    client = _StubClient(latency=case["latency"])
+    scenes = build_storyboard(_synthetic_quiz(case["questions"]))["scenes"]
+
+    def fresh_run():
+        for path in (work / "audio", cfg.AUDIO_CACHE_DIR):
+            shutil.rmtree(path, ignore_errors=True)
+        audio_cache._cache = None
+        client.models.requests = 0
+
+    runs = _timed(lambda: prefetch_audio(scenes, str(work / "audio"), tts_client=client), case["repeat"], setup=fresh_run)
+    return runs, {"tts_requests": client.models.requests}
+
+
+_CASES = {
+    "import_time": _bench_import,
+    "timer_audio": _bench_timer_audio,
+    "font_lookup": _bench_font,
+    "render_scene": _bench_render_scene,
+    "render_video": _bench_render_video,
+    "tts_prefetch": _bench_tts_prefetch,
+}
+
+
+def _run_child(case: Dict[str, Any], result_file: Path) -> None:
+    import logging
+
+    logging.disable(logging.WARNING)
+    work = Path.cwd()
+    result = _CASES[case["kind"]](case, work)
+    # Cases return their timings, optionally with extra measurements.
+    runs, extra = result if isinstance(result, tuple) else (result, {})
+    result_file.write_text(json.dumps({"runs": runs, **extra}), encoding="utf-8")
+
+
+# --- driver ------------------------------------------------------------------
+
+
+def _case_id(case: Dict[str, Any]) -> str:
+    params = ",".join(f"{k}={v}" for k, v in sorted(case.items()) if k not in ("kind", "repeat"))
+    return f"{case['kind']}[{params}]" if params else case["kind"]
+
+
+def _parse_list(text: str, cast=str) -> List[Any]:
+    return [cast(part) for part in text.split(",") if part.strip()]
+
+
+def _build_matrix(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    resolutions = _parse_list(args.resolutions)
+    fps_values = _parse_list(args.fps, int)
+    questions = _parse_list(args.questions, int)
+    compose_questions = set(_parse_list(args.compose_questions, int))
+    if args.quick:
+        resolutions, fps_values, questions = resolutions[:1], fps_values[:1], [1]
+
+    cases: List[Dict[str, Any]] = [
+        {"kind": "import_time", "module": "quiz_generator_agent.main", "repeat": args.repeat},
+        {"kind": "import_time", "module": "quiz_generator_agent.batch", "repeat": args.repeat},
+        {"kind": "timer_audio", "style": "tick", "repeat": args.repeat},
+        {"kind": "timer_audio", "style": "rising", "repeat": args.repeat},
+        {"kind": "font_lookup", "cold": True, "repeat": args.repeat},
+        {"kind": "font_lookup", "cold": False, "repeat": args.repeat},
+    ]
+    for res in resolutions:
+        for cold in (True, False):
+            cases.append({"kind": "render_scene", "res": res, "cold": cold, "repeat": args.repeat})
+    for renderer in _parse_list(args.renderers):
+        for n in questions:
+            if renderer == "compose" and n not in compose_questions:
+                continue
+            for res in resolutions:
+                for fps in fps_values:
+                    cases.append({
+                        "kind": "render_video",
+                        "renderer": renderer,
+                        "questions": n,
+                        "res": res,
+                        "fps": fps,
+                        "repeat": args.render_repeat,
+                    })
+    # Encoder profiles set their own fps; compare them at one size and length.
+    profile_questions = [1] if args.quick else _parse_list(args.profile_questions, int)
+    for profile in _parse_list(args.profiles):
+        for renderer in _parse_list(args.renderers):
+            for n in profile_questions:
+                if renderer == "compose" and n not in compose_questions:
+                    continue
+                cases.append({
+                    "kind": "render_video",
+                    "renderer": renderer,
+                    "questions": n,
+                    "res": resolutions[0],
+                    "profile": profile,
+                    "repeat": args.render_repeat,
+                })
+    # One render producing several formats; compare with the single-format cases.
+    for n in profile_questions:
+        cases.append({
+            "kind": "render_video",
+            "renderer": "stream",
+            "questions": n,
+            "formats": args.formats,
+            "repeat": args.render_repeat,
+        })
+    # Stub TTS with a fixed per-request latency, one request per line vs batched.
+    for batch in (0, 8):
+        for n in [1] if args.quick else questions:
+            cases.append({
+                "kind": "tts_prefetch",
+                "batch": batch,
+                "questions": n,
+                "latency": args.tts_latency,
+                "repeat": args.render_repeat,
+            })
+    if args.only:
+        cases = [c for c in cases if args.only in _case_id(c)]
+    return cases
+
+
+def _run_case(case: Dict[str, Any]) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory(prefix="quiz_bench_") as tmp:
+        tmp_path = Path(tmp)
+        width, height = case.get("res", "1280x720").split("x")
+        env = {
+            **os.environ,
+            "GOOGLE_API_KEY": os.environ.get("GOOGLE_API_KEY", "offline-benchmark"),
+            "VIDEO_WIDTH": width,
+            "VIDEO_HEIGHT": height,
+            "VIDEO_FPS": str(case.get("fps", 24)),
+            "VIDEO_PROFILE": case.get("profile", "default"),
+            "AUDIO_CACHE_DIR": str(tmp_path / "audio_cache"),
+            "FRAME_CACHE_DIR": str(tmp_path / "frame_cache"),
+            "SEGMENT_CACHE_DIR": str(tmp_path / "segment_cache"),
+            "QUIZ_CACHE_DIR": str(tmp_path / "quiz_cache"),
+            "INCREMENTAL_RENDER": "0",
+            "METRICS": "0",
+        }
+        result_file = tmp_path / "result.json"
+        cmd = [sys.executable, str(Path(__file__).resolve()), "--child", json.dumps(case), str(result_file)]
+        proc = subprocess.run(cmd, cwd=tmp, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"benchmark {_case_id(case)} failed:\n{proc.stderr.strip()}")
+        return json.loads(result_file.read_text(encoding="utf-8"))
+
+
+def _machine() -> Dict[str, Any]:
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        moviepy_version = version("moviepy")
+    except PackageNotFoundError:
+        moviepy_version = None
+    return {
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "moviepy": moviepy_version,
+    }
+
+
+def compare(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    threshold: float,
+    min_delta: float,
+) -> List[str]:
+    """Return a description of every case slower than its baseline median."""
+    regressions = []
+    for case_id, result in results.items():
+        base = baseline.get(case_id)
+        if base is None:
+            continue
+        current, previous = result["median_sec"], base["median_sec"]
+        if current - previous > min_delta and current > previous * (1 + threshold):
+            regressions.append(f"{case_id}: {previous:.4f}s -> {current:.4f}s ({current / previous - 1:+.0%})")
+    return regressions
+
+
+def main() -> None:
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        _run_child(json.loads(sys.argv[2]), Path(sys.argv[3]))
+        return
+
+    parser = argparse.ArgumentParser(description="Benchmark the quiz video render and audio hot paths offline.")
+    parser.add_argument("--questions", default="1,10,50", help="question counts for full renders")
+    parser.add_argument("--resolutions", default="1280x720,854x480", help="WIDTHxHEIGHT list")
+    parser.add_argument("--fps", default="24,12", help="frame rates for full renders")
+    parser.add_argument("--renderers", default="still,stream,compose", help="renderers for full renders")
+    parser.add_argument("--compose-questions", default="1",
+                        help="question counts to run with the compose renderer (it is much slower)")
+    parser.add_argument("--profiles", default="default,fast-draft,archive,low-fps-still",
+                        help="encoder profiles to compare (time and output size)")
+    parser.add_argument("--profile-questions", default="10", help="question counts for profile comparisons")
+    parser.add_argument("--formats", default="720p+1080p+vertical",
+                        help="output formats rendered together in the multi-format case, joined by +")
+    parser.add_argument("--tts-latency", type=float, default=0.5,
+                        help="simulated seconds per stub TTS request in tts_prefetch cases")
+    parser.add_argument("--repeat", type=int, default=5, help="repeats for micro benchmarks")
+    parser.add_argument("--render-repeat", type=int, default=1, help="repeats for full renders")
+    parser.add_argument("--quick", action="store_true", help="1 question, first resolution and fps only")
+    parser.add_argument("--only", help="run only cases whose id contains this string")
+    parser.add_argument("--output", default="bench_results.json", help="where to write results JSON")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="write results to --baseline instead of comparing")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative slowdown")
+    parser.add_argument("--min-delta", type=float, default=0.01, help="ignore slowdowns below this many seconds")
+    args = parser.parse_args()
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for case in _build_matrix(args):
+        case_id = _case_id(case)
+        result = _run_case(case)
+        runs = result.pop("runs")
+        results[case_id] = {
+            "median_sec": statistics.median(runs),
+            "min_sec": min(runs),
+            "runs": runs,
+            **result,
+        }
+        size = f"  {result['output_bytes'] / 1e6:.2f} MB" if "output_bytes" in result else ""
+        print(f"{case_id:<80} median {results[case_id]['median_sec']:.4f}s  min {min(runs):.4f}s{size}", flush=True)
+
+    report = {"created_at": time.time(), "machine": _machine(), "results": results}
+    Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"Wrote {args.output}")
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        if baseline_path.exists():
+            # Keep baseline entries for cases this invocation did not run.
+            previous = json.loads(baseline_path.read_text(encoding="utf-8"))
+            report["results"] = {**previous.get("results", {}), **results}
+        baseline_path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"Saved baseline to {baseline_path}")
+        return
+
+    if not baseline_path.exists():
+        print(f"No baseline at {baseline_path}; run with --save-baseline to record one")
+        return
+
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    if baseline.get("machine") != report["machine"]:
+        print("Warning: baseline was recorded on a different machine or toolchain; comparisons may be noisy")
+    regressions = compare(results, baseline.get("results", {}), args.threshold, args.min_delta)
+    if regressions:
+        print("Regressions:")
+        for line in regressions:
+            print(f"  {line}")
+        raise SystemExit(1)
+    print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
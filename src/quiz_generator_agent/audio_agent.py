@@ -1,25 +1,44 @@
 
+import os
+import threading
+import time
 import wave
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
+from typing import Dict, Any, List, Tuple
 
 import quiz_generator_agent.config
 
-from google import genai
-from google.genai import types
-from google.adk.agents.llm_agent import Agent
 import logging
 
+from . import metrics
+from .audio_cache import get_audio_cache
+from .clients import generate_content, generate_content_stream, is_rate_limited
+from .procedural_audio import countdown, silence, write_wav
+from .limits import stage_slot
+from .tts_batch import batch_prompt, plan_batches, split_utterances
+
 logger = logging.getLogger(__name__)
-client = genai.Client()
 
-AUDIO_ROOT = Path("outputs/audio_cache")
+AUDIO_ROOT = quiz_generator_agent.config.AUDIO_CACHE_DIR
+
+# Gemini TTS returns 24 kHz mono 16-bit PCM.
+TTS_RATE = 24000
+
+# Placeholder narration written when TTS fails; never cached or reused.
+SILENT_FALLBACK_SUFFIX = ".silent.wav"
+
+
+class _NoStreamedAudio(Exception):
+    """The TTS stream failed or ended before its first audio chunk."""
 
 
 def _write_pcm_to_wav(
     filename: Path,
     pcm_data: bytes,
     channels: int = 1,
-    rate: int = 24000,
+    rate: int = TTS_RATE,
     sample_width: int = 2,
 ) -> str:
     filename.parent.mkdir(parents=True, exist_ok=True)
@@ -33,139 +52,380 @@ def _write_pcm_to_wav(
 
 def _create_silent_audio(filename: Path, duration: float = 2.0) -> str:
     """Create a silent WAV file with the specified duration."""
-    filename.parent.mkdir(parents=True, exist_ok=True)
+    return write_wav(filename, silence(duration))
 
-    # Audio parameters for silent WAV
-    sample_rate = 44100
-    channels = 1  # mono
-    sample_width = 2  # 16-bit
-    num_samples = int(sample_rate * duration)
 
-    # Create silent PCM data (all zeros)
-    silent_data = b'\x00\x00' * num_samples
+def is_silent_fallback(audio_path: str | None) -> bool:
+    """True if `audio_path` is the silent placeholder for a failed TTS request."""
+    return bool(audio_path) and str(audio_path).endswith(SILENT_FALLBACK_SUFFIX)
 
-    with wave.open(str(filename), "wb") as wf:
-        wf.setnchannels(channels)
-        wf.setsampwidth(sample_width)
-        wf.setframerate(sample_rate)
-        wf.writeframes(silent_data)
 
-    return str(filename)
+def _create_timer_audio(filename: Path, duration: float = 3.0, style: str = "tick") -> str:
+    """Create a simple timer sound effect with ticking/beeping."""
+    return write_wav(filename, countdown(duration, style=style))
 
 
-def _create_timer_audio(filename: Path, duration: float = 3.0) -> str:
-    """Create a simple timer sound effect with ticking/beeping."""
-    filename.parent.mkdir(parents=True, exist_ok=True)
+def _is_timer(text: str) -> bool:
+    return text.strip().upper() == "TIMER_COUNTDOWN"
 
-    # Audio parameters
-    sample_rate = 44100
-    channels = 1  # mono
-    sample_width = 2  # 16-bit
-
-    # Timer parameters
-    tick_duration = 0.1  # 100ms per tick
-    pause_duration = 0.9  # 900ms pause between ticks
-    ticks = max(1, int(duration / (tick_duration + pause_duration)))  # Number of ticks
-
-    import math
-
-    audio_data = []
-
-    for tick in range(ticks):
-        # Generate tick sound (short beep)
-        tick_samples = int(sample_rate * tick_duration)
-        for i in range(tick_samples):
-            # Create a 1000Hz sine wave for the tick
-            t = float(i) / sample_rate
-            # Fade in/out to avoid clicks
-            fade_samples = int(tick_samples * 0.1)
-            if i < fade_samples:
-                amplitude = i / fade_samples
-            elif i > tick_samples - fade_samples:
-                amplitude = (tick_samples - i) / fade_samples
-            else:
-                amplitude = 1.0
 
-            sample = int(amplitude * 32767 * 0.3 * math.sin(2 * math.pi * 1000 * t))
-            audio_data.append(sample.to_bytes(2, signed=True, byteorder='little'))
+def _tts_config(voice_name: str):
+    from google.genai import types
+
+    return types.GenerateContentConfig(
+        response_modalities=["AUDIO"],
+        speech_config=types.SpeechConfig(
+            voice_config=types.VoiceConfig(
+                prebuilt_voice_config=types.PrebuiltVoiceConfig(
+                    voice_name=voice_name
+                )
+            ),
+        ),
+    )
 
-        # Add pause (silence)
-        pause_samples = int(sample_rate * pause_duration)
-        for _ in range(pause_samples):
-            audio_data.append((0).to_bytes(2, signed=True, byteorder='little'))
 
-    # Write the WAV file
-    with wave.open(str(filename), "wb") as wf:
-        wf.setnchannels(channels)
-        wf.setsampwidth(sample_width)
-        wf.setframerate(sample_rate)
-        wf.writeframes(b''.join(audio_data))
+def _generate_tts_pcm(text: str, voice_name: str, tts_client=None) -> bytes:
+    """Call Gemini TTS and return raw PCM.
 
-    return str(filename)
+    Requests go through the TTS model's shared rate limiter; 429 responses
+    pause it and are retried up to TTS_MAX_RETRIES times.
+    """
+    cfg = quiz_generator_agent.config
+    with stage_slot("tts"), metrics.span("tts.request", chars=len(text)):
+        resp = generate_content(
+            model=cfg.TTS_MODEL,
+            contents=text,
+            config=_tts_config(voice_name),
+            client=tts_client,
+            max_retries=cfg.TTS_MAX_RETRIES,
+            backoff_base=cfg.TTS_BACKOFF_BASE_SEC,
+        )
 
+    # Check if TTS response is valid
+    if not resp.candidates or not resp.candidates[0] or not resp.candidates[0].content:
+        logger.warning(f"Gemini TTS returned invalid response for text: '{text}'")
+        raise ValueError("TTS model returned invalid response")
 
-def synthesize_audio(
+    return resp.candidates[0].content.parts[0].inline_data.data
+
+
+def _chunk_pcm(chunk) -> bytes:
+    if not chunk.candidates or not chunk.candidates[0].content or not chunk.candidates[0].content.parts:
+        return b""
+    return b"".join(
+        part.inline_data.data
+        for part in chunk.candidates[0].content.parts
+        if getattr(part, "inline_data", None) is not None and part.inline_data.data
+    )
+
+
+def _stream_tts_to_wav(
+    text: str,
+    voice_name: str,
+    wav_path: Path,
+    tts_client=None,
+) -> str:
+    """Stream Gemini TTS into `wav_path`, appending PCM chunks as they arrive.
+
+    Only one chunk is held in memory at a time. The WAV is written under a
+    temporary name and renamed to `wav_path` once the stream is complete.
+    Raises `_NoStreamedAudio` if no audio arrived, so the caller can retry
+    without streaming (some models and SDK versions cannot stream audio).
+
+    There is no partial-audio readiness signal: every consumer (segment
+    encode, soundtrack mix) reads a scene's narration in one ffmpeg pass and
+    needs the finished WAV. Pipelined renders instead queue each scene's
+    encode as soon as its WAV is complete (see pipeline.py).
+    """
+    cfg = quiz_generator_agent.config
+    tmp_path = wav_path.with_name(f".{wav_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    written = 0
+    started = time.perf_counter()
+    try:
+        with stage_slot("tts"), metrics.span("tts.request", chars=len(text), streaming=True) as span_attrs:
+            with open(tmp_path, "wb") as f, wave.open(f, "wb") as wf:
+                wf.setnchannels(1)
+                wf.setsampwidth(2)
+                wf.setframerate(TTS_RATE)
+                chunks = generate_content_stream(
+                    model=cfg.TTS_MODEL,
+                    contents=text,
+                    config=_tts_config(voice_name),
+                    client=tts_client,
+                    max_retries=cfg.TTS_MAX_RETRIES,
+                    backoff_base=cfg.TTS_BACKOFF_BASE_SEC,
+                )
+                for chunk in chunks:
+                    data = _chunk_pcm(chunk)
+                    if not data:
+                        continue
+                    if not written:
+                        span_attrs["first_audio_sec"] = round(time.perf_counter() - started, 4)
+                    wf.writeframes(data)
+                    written += len(data)
+        if not written:
+            raise _NoStreamedAudio("stream returned no audio")
+        metrics.incr("tts.streamed")
+        os.replace(tmp_path, wav_path)
+    except BaseException as e:
+        tmp_path.unlink(missing_ok=True)
+        # Retrying a rate-limited request without streaming would only add load.
+        if not written and isinstance(e, Exception) and not isinstance(e, _NoStreamedAudio) and not is_rate_limited(e):
+            raise _NoStreamedAudio(str(e)) from e
+        raise
+    return str(wav_path)
+
+
+def _synthesize_audio(
     text: str,
     output_dir: str,
     scene_id: str,
-    voice_name: str = "Kore",
+    voice_name: str | None = None,
+    tts_client=None,
+    check_cache: bool = True,
+) -> str:
+    voice_name = voice_name or quiz_generator_agent.config.TTS_VOICE
+    with metrics.span("synthesize_audio", scene_id=scene_id):
+        return _synthesize_audio_file(text, output_dir, scene_id, voice_name, tts_client, check_cache)
+
+
+def _synthesize_audio_file(
+    text: str,
+    output_dir: str,
+    scene_id: str,
+    voice_name: str,
+    tts_client,
+    check_cache: bool = True,
 ) -> str:
-    """Convert voiceover text to speech via Gemini 2.5 Flash Preview TTS and save as WAV. Uses timer sound effects for countdown."""
     output_dir = Path(output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    if text.strip().upper() == "TIMER_COUNTDOWN":
+    if _is_timer(text):
+        cfg = quiz_generator_agent.config
         AUDIO_ROOT.mkdir(parents=True, exist_ok=True)
-        shared_path = AUDIO_ROOT / "timer_countdown.wav"
+        shared_path = AUDIO_ROOT / f"timer_countdown_{cfg.COUNTDOWN_STYLE}_{cfg.COUNTDOWN_DURATION_SEC:g}s.wav"
         if shared_path.exists():
             return str(shared_path)
 
-        # Create timer sound effect instead of TTS voiceover
+        # Create timer sound effect instead of TTS voiceover. Write to a
+        # private temp file first: other workers may be reading the shared one.
         logger.info("Creating timer sound effect...")
-        return _create_timer_audio(shared_path, duration=3.0)
+        tmp_path = shared_path.with_name(f".{shared_path.stem}.{os.getpid()}.{threading.get_ident()}.tmp")
+        _create_timer_audio(tmp_path, duration=cfg.COUNTDOWN_DURATION_SEC, style=cfg.COUNTDOWN_STYLE)
+        os.replace(tmp_path, shared_path)
+        return str(shared_path)
 
     wav_path = output_dir / f"{scene_id}.wav"
     if wav_path.exists():
         return str(wav_path)
 
+    cache = get_audio_cache()
+    cache_key = cache.key(text, voice_name, quiz_generator_agent.config.TTS_MODEL)
+    # check_cache=False: the caller already looked this line up, and a second
+    # lookup would count the miss twice.
+    cached = cache.materialize(cache_key, wav_path) if check_cache else None
+    if cached:
+        return cached
+
     try:
-        resp = client.models.generate_content(
-            model="gemini-2.5-flash-preview-tts",
-            contents=text,
-            config=types.GenerateContentConfig(
-                response_modalities=["AUDIO"],
-                http_options=quiz_generator_agent.config.RETRY_CONFIG,
-                speech_config=types.SpeechConfig(
-                    voice_config=types.VoiceConfig(
-                        prebuilt_voice_config=types.PrebuiltVoiceConfig(
-                            voice_name=voice_name
-                        )
-                    ),
-                ),
-            ),
+        streamed = False
+        if quiz_generator_agent.config.TTS_STREAMING:
+            try:
+                streamed = bool(_stream_tts_to_wav(text, voice_name, wav_path, tts_client=tts_client))
+            except _NoStreamedAudio as e:
+                logger.warning(f"Streaming TTS gave no audio for text '{text}' ({e}), retrying without streaming")
+                metrics.incr("tts.stream_fallbacks")
+        if not streamed:
+            audio_bytes = _generate_tts_pcm(text, voice_name, tts_client=tts_client)
+            _write_pcm_to_wav(wav_path, audio_bytes)
+        cache.put(cache_key, wav_path)
+        return str(wav_path)
+    except Exception as e:
+        logger.warning(f"Gemini TTS failed for text '{text}' ({e}), falling back to silent audio")
+        metrics.incr("tts.silent_fallbacks")
+        # Fallback: Create silent audio file, named so it is never mistaken
+        # for real narration (see is_silent_fallback).
+        return _create_silent_audio(
+            output_dir / f"{scene_id}{SILENT_FALLBACK_SUFFIX}",
+            duration=max(2.0, len(text.split()) / 150 * 60),
         )
 
-        # Check if TTS response is valid
-        if not resp.candidates or not resp.candidates[0] or not resp.candidates[0].content:
-            logger.warning(f"Gemini TTS returned invalid response for text: '{text}'")
-            raise ValueError("TTS model returned invalid response")
 
-        audio_bytes = resp.candidates[0].content.parts[0].inline_data.data
-        return _write_pcm_to_wav(wav_path, audio_bytes)
-    except Exception as e:
-        logger.warning(f"Gemini TTS failed for text '{text}' ({e}), falling back to silent audio")
-        # Fallback: Create silent audio file
-        return _create_silent_audio(wav_path, duration=max(2.0, len(text.split()) / 150 * 60))
-
-
-audio_agent = Agent(
-    model="gemini-2.5-flash-lite",
-    name="audio_generation_agent",
-    description="Generates speech audio files from voiceover text using Gemini 2.5 Flash Preview TTS, with timer sound effects.",
-    instruction=(
-        "You only generate audio files from text.\n"
-        "When the 'synthesize_audio' tool is called, use it and return the file path.\n"
-        "If the text equals 'TIMER_COUNTDOWN', reuse a shared countdown audio file."
-    ),
-    tools=[synthesize_audio],
-)
+def synthesize_audio(
+    text: str,
+    output_dir: str,
+    scene_id: str,
+    voice_name: str | None = None,
+) -> str:
+    """Convert voiceover text to speech via Gemini 2.5 Flash Preview TTS and save as WAV (voice defaults to TTS_VOICE). Uses timer sound effects for countdown."""
+    return _synthesize_audio(text, output_dir, scene_id, voice_name=voice_name)
+
+
+def _existing_audio(text: str, output_dir: str, scene_id: str, voice_name: str) -> str | None:
+    """The voiceover's WAV if it is already in `output_dir` or the audio cache."""
+    wav_path = Path(output_dir) / f"{scene_id}.wav"
+    if wav_path.exists():
+        return str(wav_path)
+    cache = get_audio_cache()
+    return cache.materialize(cache.key(text, voice_name, quiz_generator_agent.config.TTS_MODEL), wav_path)
+
+
+def _synthesize_batch(
+    lines: List[Tuple[str, str]],
+    output_dir: str,
+    voice_name: str,
+    tts_client=None,
+) -> Dict[str, str] | None:
+    """Synthesize several (text, scene_id) lines with one TTS request.
+
+    Returns text -> WAV path, or None when the request fails or its audio
+    cannot be split unambiguously; the caller then synthesizes each line
+    on its own.
+    """
+    cfg = quiz_generator_agent.config
+    texts = [text for text, _ in lines]
+    with metrics.span("synthesize_audio_batch", lines=len(lines)):
+        try:
+            # Splitting needs the whole response, so batches are never streamed.
+            pcm = _generate_tts_pcm(batch_prompt(texts), voice_name, tts_client=tts_client)
+        except Exception as e:
+            logger.warning(f"Batched TTS request for {len(lines)} lines failed ({e}), retrying line by line")
+            metrics.incr("tts.batch_fallbacks")
+            return None
+
+        pieces = split_utterances(pcm, texts, TTS_RATE, cfg.TTS_BATCH_MIN_GAP_SEC)
+        if pieces is None:
+            logger.warning(f"Could not split batched TTS audio into {len(lines)} lines, retrying line by line")
+            metrics.incr("tts.batch_fallbacks")
+            return None
+
+        cache = get_audio_cache()
+        paths = {}
+        for (text, scene_id), piece in zip(lines, pieces):
+            with metrics.span("synthesize_audio", scene_id=scene_id, batched=True):
+                wav_path = Path(output_dir) / f"{scene_id}.wav"
+                paths[text] = _write_pcm_to_wav(wav_path, piece)
+                cache.put(cache.key(text, voice_name, cfg.TTS_MODEL), wav_path)
+        metrics.incr("tts.batches")
+        metrics.incr("tts.batched_lines", len(lines))
+        return paths
+
+
+def prefetch_audio(
+    scenes: List[Dict[str, Any]],
+    output_dir: str,
+    voice_name: str | None = None,
+    max_concurrency: int | None = None,
+    tts_client=None,
+    indices: List[int] | None = None,
+) -> Dict[int, str]:
+    """Synthesize every unique scene voiceover concurrently.
+
+    Returns a mapping of scene index -> WAV path. Scenes that share the same
+    voiceover text share one file, so each string costs at most one TTS
+    call, and short uncached strings are batched TTS_BATCH_SIZE to a call.
+    `indices` restricts synthesis to those scenes. `voice_name` defaults to
+    TTS_VOICE; use a separate `output_dir` per voice.
+    """
+    cfg = quiz_generator_agent.config
+    voice_name = voice_name or cfg.TTS_VOICE
+    if max_concurrency is None:
+        max_concurrency = cfg.TTS_MAX_CONCURRENCY
+
+    if indices is None:
+        indices = list(range(len(scenes)))
+
+    first_index_by_text: Dict[str, int] = {}
+    for idx in indices:
+        voiceover = scenes[idx].get("voiceover", "")
+        if voiceover:
+            first_index_by_text.setdefault(voiceover, idx)
+
+    if not first_index_by_text:
+        return {}
+
+    scene_ids = {text: f"scene_{idx:03d}" for text, idx in first_index_by_text.items()}
+    path_by_text: Dict[str, str] = {}
+    batches: List[List[str]] = []
+    singles = list(scene_ids)
+    cache = get_audio_cache()
+    before = cache.stats()
+    # Lines already looked up in the audio cache while planning batches.
+    checked = set()
+    if cfg.TTS_BATCH_SIZE > 1:
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        pending = []
+        for text in scene_ids:
+            if _is_timer(text):
+                continue
+            existing = _existing_audio(text, output_dir, scene_ids[text], voice_name)
+            checked.add(text)
+            if existing:
+                path_by_text[text] = existing
+            else:
+                pending.append(text)
+        batches = plan_batches(pending, cfg.TTS_BATCH_SIZE, cfg.TTS_BATCH_MAX_WORDS)
+        batched = {text for batch in batches for text in batch}
+        singles = [text for text in scene_ids if text not in path_by_text and text not in batched]
+
+    logger.info(
+        f"Prefetching {len(first_index_by_text)} voiceovers "
+        f"({len(batches)} batched requests) with concurrency {max_concurrency}"
+    )
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as pool:
+
+        def submit_line(text: str):
+            return metrics.submit(
+                pool, _synthesize_audio, text, output_dir, scene_ids[text], voice_name, tts_client, text not in checked
+            )
+
+        futures = {text: submit_line(text) for text in singles}
+        batch_futures = [
+            (batch, metrics.submit(
+                pool, _synthesize_batch, [(text, scene_ids[text]) for text in batch], output_dir, voice_name, tts_client
+            ))
+            for batch in batches
+        ]
+        for batch, fut in batch_futures:
+            paths = fut.result()
+            if paths is None:
+                futures.update({text: submit_line(text) for text in batch})
+            else:
+                path_by_text.update(paths)
+        path_by_text.update({text: fut.result() for text, fut in futures.items()})
+
+    after = cache.stats()
+    logger.info(
+        f"TTS cache: {after['hits'] - before['hits']} hits, "
+        f"{after['misses'] - before['misses']} misses"
+    )
+
+    return {
+        idx: path_by_text[scenes[idx]["voiceover"]]
+        for idx in indices
+        if scenes[idx].get("voiceover")
+    }
+
+
+@lru_cache(maxsize=None)
+def _build_audio_agent():
+    from google.adk.agents.llm_agent import Agent
+
+    return Agent(
+        model="gemini-2.5-flash-lite",
+        name="audio_generation_agent",
+        description="Generates speech audio files from voiceover text using Gemini 2.5 Flash Preview TTS, with timer sound effects.",
+        instruction=(
+            "You only generate audio files from text.\n"
+            "When the 'synthesize_audio' tool is called, use it and return the file path.\n"
+            "If the text equals 'TIMER_COUNTDOWN', reuse a shared countdown audio file."
+        ),
+        tools=[synthesize_audio],
+    )
+
+
+def __getattr__(name: str):
+    # The ADK agent is only built when the orchestrator path asks for it.
+    if name == "audio_agent":
+        return _build_audio_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,44 @@
+
+"""Content-addressed TTS cache shared across runs.
+
+Entries live under `AUDIO_CACHE_DIR/tts/<sha256>.wav`, keyed by the
+voiceover text, voice name and TTS model; storage, atomic writes and
+eviction come from `FileCache`.
+"""
+
+import hashlib
+import json
+import threading
+from pathlib import Path
+
+from .file_cache import FileCache
+
+
+class AudioCache(FileCache):
+    def __init__(self, root: Path, max_bytes: int, max_age_sec: float):
+        super().__init__(root, max_bytes, max_age_sec, suffix=".wav", name="tts")
+
+    @staticmethod
+    def key(text: str, voice_name: str, model: str) -> str:
+        payload = json.dumps([text, voice_name, model], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+_cache: AudioCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_audio_cache() -> AudioCache:
+    """Process-wide cache configured from `quiz_generator_agent.config`."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                import quiz_generator_agent.config as cfg
+
+                _cache = AudioCache(
+                    root=cfg.AUDIO_CACHE_DIR / "tts",
+                    max_bytes=int(cfg.AUDIO_CACHE_MAX_MB * 1024 * 1024),
+                    max_age_sec=cfg.AUDIO_CACHE_MAX_AGE_DAYS * 86400,
+                )
+    return _cache
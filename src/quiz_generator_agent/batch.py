@@ -0,0 +1,235 @@
+
+"""Batch quiz-video generation from a CSV or JSONL manifest.
+
+Each manifest row is one job with `topic`, `difficulty` and `num_questions`
+(and optionally `job_id`). Jobs run `orchestrate_quiz_video` in a bounded
+thread pool, while the LLM, TTS and render stages each get their own
+process-wide concurrency limit so API-bound and CPU-bound work from
+different jobs overlaps.
+
+Every finished job is appended (and fsynced) to a JSONL results manifest.
+Re-running with the same results file skips jobs that already succeeded, so
+a crashed batch resumes where it stopped.
+
+    python -m quiz_generator_agent.batch quizzes.csv --results results.jsonl --jobs 4
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+
+import quiz_generator_agent.config
+
+from .limits import set_rate_limit, set_stage_limit
+from .main import orchestrate_quiz_video
+from .quiz_agent import QUIZ_MODEL
+
+logger = logging.getLogger(__name__)
+
+
+def _job_id(topic: str, difficulty: str, num_questions: int, occurrence: int = 0) -> str:
+    # Derived from the row's content rather than its position, so inserting or
+    # reordering rows keeps each job's id; repeats of a row count up `occurrence`.
+    payload = f"{topic}\x1f{difficulty}\x1f{num_questions}"
+    if occurrence:
+        payload += f"\x1f{occurrence}"
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+
+def load_manifest(path: str | Path) -> List[Dict[str, Any]]:
+    """Read jobs from a .csv (with a header row) or .jsonl manifest."""
+    path = Path(path)
+    with path.open("r", encoding="utf-8", newline="") as f:
+        if path.suffix.lower() == ".csv":
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    jobs: List[Dict[str, Any]] = []
+    seen = set()
+    occurrences: Dict[tuple, int] = {}
+    for idx, row in enumerate(rows):
+        topic = str(row.get("topic") or "").strip()
+        if not topic:
+            raise ValueError(f"{path}: job {idx + 1} has no topic")
+        difficulty = str(row.get("difficulty") or "easy").strip().lower()
+        num_questions = int(row.get("num_questions") or 3)
+        job_id = row.get("job_id")
+        if not job_id:
+            content = (topic, difficulty, num_questions)
+            occurrence = occurrences.get(content, 0)
+            occurrences[content] = occurrence + 1
+            job_id = _job_id(topic, difficulty, num_questions, occurrence)
+        job_id = str(job_id)
+        if job_id in seen:
+            raise ValueError(f"{path}: duplicate job_id {job_id!r}")
+        seen.add(job_id)
+        jobs.append({
+            "job_id": job_id,
+            "topic": topic,
+            "difficulty": difficulty,
+            "num_questions": num_questions,
+        })
+    return jobs
+
+
+def load_results(path: str | Path) -> Dict[str, Dict[str, Any]]:
+    """Latest result record per job_id from a results manifest, if it exists."""
+    path = Path(path)
+    results: Dict[str, Dict[str, Any]] = {}
+    if not path.exists():
+        return results
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A crash mid-append can leave a truncated last line.
+                continue
+            results[record["job_id"]] = record
+    return results
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _run_job(job: Dict[str, Any], queued_at: float) -> Dict[str, Any]:
+    started = time.perf_counter()
+    record: Dict[str, Any] = {
+        **job,
+        "started_at": _now(),
+        "queued_sec": round(started - queued_at, 3),
+    }
+    try:
+        result = orchestrate_quiz_video(
+            topic=job["topic"],
+            difficulty=job["difficulty"],
+            num_questions=job["num_questions"],
+        )
+        record.update({
+            "status": "ok",
+            "final_video": result["final_video"],
+            "videos": result.get("videos"),
+            "voices": result.get("voices"),
+            "output_dir": result["output_dir"],
+            "timings": {k: round(v, 3) for k, v in result.get("timings", {}).items()},
+        })
+    except Exception as e:
+        logger.exception(f"Batch job {job['job_id']} ({job['topic']!r}) failed")
+        record.update({"status": "failed", "error": f"{type(e).__name__}: {e}"})
+
+    record["wall_sec"] = round(time.perf_counter() - started, 3)
+    record["finished_at"] = _now()
+    return record
+
+
+def run_batch(
+    manifest: str | Path,
+    results_path: str | Path,
+    jobs: int = 4,
+    llm_concurrency: int | None = 4,
+    tts_concurrency: int | None = None,
+    render_concurrency: int | None = 2,
+    retry_failed: bool = True,
+    llm_rpm: float | None = None,
+    tts_rpm: float | None = None,
+) -> Dict[str, Any]:
+    """Run every pending job in `manifest`, appending results to `results_path`.
+
+    Jobs already recorded as "ok" are skipped; failed ones are retried unless
+    `retry_failed` is False. Returns a summary with counts per status.
+    `llm_rpm` / `tts_rpm` override the LLM_RPM / TTS_RPM request quotas.
+    """
+    all_jobs = load_manifest(manifest)
+    results_path = Path(results_path)
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+
+    previous = load_results(results_path)
+    done_statuses = {"ok"} if retry_failed else {"ok", "failed"}
+    pending = [j for j in all_jobs if previous.get(j["job_id"], {}).get("status") not in done_statuses]
+    logger.info(f"Batch: {len(all_jobs)} jobs in manifest, {len(pending)} pending")
+
+    if tts_concurrency is None:
+        tts_concurrency = quiz_generator_agent.config.TTS_MAX_CONCURRENCY
+    set_stage_limit("llm", llm_concurrency)
+    set_stage_limit("tts", tts_concurrency)
+    set_stage_limit("render", render_concurrency)
+    set_rate_limit(QUIZ_MODEL, llm_rpm)
+    set_rate_limit(quiz_generator_agent.config.TTS_MODEL, tts_rpm)
+
+    write_lock = threading.Lock()
+    counts = {"ok": 0, "failed": 0, "skipped": len(all_jobs) - len(pending)}
+    started = time.perf_counter()
+    try:
+        with results_path.open("a", encoding="utf-8") as out, \
+                ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            queued_at = time.perf_counter()
+            futures = [pool.submit(_run_job, job, queued_at) for job in pending]
+            for fut in as_completed(futures):
+                record = fut.result()
+                counts[record["status"]] += 1
+                with write_lock:
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+                    os.fsync(out.fileno())
+                logger.info(
+                    f"Batch job {record['job_id']} {record['status']} in {record['wall_sec']:.1f}s "
+                    f"({counts['ok'] + counts['failed']}/{len(pending)})"
+                )
+    finally:
+        for stage in ("llm", "tts", "render"):
+            set_stage_limit(stage, None)
+        set_rate_limit(QUIZ_MODEL, None)
+        set_rate_limit(quiz_generator_agent.config.TTS_MODEL, None)
+
+    return {
+        "results": str(results_path),
+        "total": len(all_jobs),
+        **counts,
+        "wall_sec": round(time.perf_counter() - started, 3),
+    }
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Generate quiz videos from a CSV/JSONL manifest.")
+    parser.add_argument("manifest", help="CSV or JSONL file with topic, difficulty, num_questions")
+    parser.add_argument("--results", default=None, help="results JSONL (default: <manifest>.results.jsonl)")
+    parser.add_argument("--jobs", type=int, default=4, help="jobs in flight at once")
+    parser.add_argument("--llm-concurrency", type=int, default=4)
+    parser.add_argument("--tts-concurrency", type=int, default=None)
+    parser.add_argument("--render-concurrency", type=int, default=2)
+    parser.add_argument("--llm-rpm", type=float, default=None, help="quiz model requests per minute (default LLM_RPM)")
+    parser.add_argument("--tts-rpm", type=float, default=None, help="TTS requests per minute (default TTS_RPM)")
+    parser.add_argument("--skip-failed", action="store_true", help="do not retry jobs recorded as failed")
+    args = parser.parse_args(argv)
+
+    manifest = Path(args.manifest)
+    results = args.results or manifest.with_suffix(".results.jsonl")
+    summary = run_batch(
+        manifest,
+        results,
+        jobs=args.jobs,
+        llm_concurrency=args.llm_concurrency,
+        tts_concurrency=args.tts_concurrency,
+        render_concurrency=args.render_concurrency,
+        retry_failed=not args.skip_failed,
+        llm_rpm=args.llm_rpm,
+        tts_rpm=args.tts_rpm,
+    )
+    print("\n=== Batch Finished ===")
+    for key in ("total", "ok", "failed", "skipped", "wall_sec", "results"):
+        print(f"{key}: {summary[key]}")
+
+
+if __name__ == "__main__":
+    main()
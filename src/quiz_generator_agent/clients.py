@@ -0,0 +1,151 @@
+
+"""Shared Gemini client and rate-limited request helpers.
+
+Importing `google.genai` and constructing a client costs noticeable time,
+so nothing does it at import time; the quiz and audio agents call
+`get_client()` when they first talk to Gemini. There is one client per
+process, so every request reuses the same pool of HTTP connections.
+`set_client()` swaps in a different client (e.g. a stub for offline
+benchmarks).
+
+`generate_content()` sends a request through the model's token bucket
+(`limits.rate_limiter`). A 429 pauses that bucket for every caller and the
+request is retried, so parallel jobs settle at the quota instead of each
+backing off exponentially on its own. `generate_content_stream()` does the
+same for streamed responses, retrying only until the first chunk arrives.
+"""
+
+import logging
+import random
+import re
+import threading
+from typing import Any, Iterator
+
+import quiz_generator_agent.config
+
+from . import metrics
+from .limits import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_lock = threading.Lock()
+
+# Longest server-suggested retry delay we are willing to honour.
+_MAX_RETRY_DELAY_SEC = 60.0
+
+
+def get_client():
+    """Return the process-wide `genai.Client`, creating it on first call."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                import httpx
+                from google import genai
+                from google.genai import types
+
+                cfg = quiz_generator_agent.config
+                limits = httpx.Limits(
+                    max_connections=cfg.GEMINI_MAX_CONNECTIONS,
+                    max_keepalive_connections=cfg.GEMINI_MAX_CONNECTIONS,
+                )
+                _client = genai.Client(
+                    http_options=types.HttpOptions(
+                        retry_options=cfg.RETRY_CONFIG,
+                        client_args={"limits": limits},
+                        async_client_args={"limits": limits},
+                    )
+                )
+    return _client
+
+
+def set_client(client) -> None:
+    """Replace the shared client (None to recreate it lazily)."""
+    global _client
+    with _lock:
+        _client = client
+
+
+def is_rate_limited(exc: Exception) -> bool:
+    """True if a Gemini error is a 429 / RESOURCE_EXHAUSTED response."""
+    return getattr(exc, "code", None) == 429 or "RESOURCE_EXHAUSTED" in str(exc)
+
+
+def _retry_delay(exc: Exception, attempt: int, backoff_base: float) -> float:
+    # Prefer the server's RetryInfo hint ("retryDelay": "23s") when present.
+    match = re.search(r"retryDelay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s", str(exc))
+    if match:
+        return min(float(match.group(1)), _MAX_RETRY_DELAY_SEC)
+    return backoff_base * (2 ** attempt) + random.uniform(0, backoff_base)
+
+
+def _pause_for_retry(model: str, limiter, exc: Exception, attempt: int, backoff_base: float) -> None:
+    delay = _retry_delay(exc, attempt, backoff_base)
+    logger.warning(f"{model} rate limited, pausing its requests for {delay:.1f}s (attempt {attempt + 1})")
+    metrics.incr("gemini.retries")
+    limiter.pause(delay)
+
+
+def generate_content(
+    model: str,
+    contents: Any,
+    config: Any = None,
+    client=None,
+    max_retries: int | None = None,
+    backoff_base: float | None = None,
+):
+    """`client.models.generate_content` under `model`'s rate limit, retrying 429s."""
+    cfg = quiz_generator_agent.config
+    client = client or get_client()
+    max_retries = cfg.GEMINI_MAX_RETRIES if max_retries is None else max_retries
+    backoff_base = cfg.GEMINI_BACKOFF_BASE_SEC if backoff_base is None else backoff_base
+    limiter = rate_limiter(model)
+
+    attempt = 0
+    while True:
+        limiter.acquire()
+        metrics.incr("gemini.requests")
+        try:
+            return client.models.generate_content(model=model, contents=contents, config=config)
+        except Exception as e:
+            if not is_rate_limited(e) or attempt >= max_retries:
+                raise
+            _pause_for_retry(model, limiter, e, attempt, backoff_base)
+            attempt += 1
+
+
+def generate_content_stream(
+    model: str,
+    contents: Any,
+    config: Any = None,
+    client=None,
+    max_retries: int | None = None,
+    backoff_base: float | None = None,
+) -> Iterator[Any]:
+    """`client.models.generate_content_stream` under `model`'s rate limit.
+
+    A 429 is retried only before the first chunk arrives; once chunks have
+    been handed to the caller, errors are raised as-is.
+    """
+    cfg = quiz_generator_agent.config
+    client = client or get_client()
+    max_retries = cfg.GEMINI_MAX_RETRIES if max_retries is None else max_retries
+    backoff_base = cfg.GEMINI_BACKOFF_BASE_SEC if backoff_base is None else backoff_base
+    limiter = rate_limiter(model)
+
+    attempt = 0
+    while True:
+        limiter.acquire()
+        metrics.incr("gemini.requests")
+        received = False
+        try:
+            for chunk in client.models.generate_content_stream(model=model, contents=contents, config=config):
+                received = True
+                yield chunk
+            return
+        except Exception as e:
+            if received or not is_rate_limited(e) or attempt >= max_retries:
+                raise
+            _pause_for_retry(model, limiter, e, attempt, backoff_base)
+            attempt += 1
@@ -6,7 +6,6 @@ import json
 from pathlib import Path
 from dotenv import load_dotenv
 from .logging_utils import setup_logging
-from google.genai import types
 
 
 load_dotenv()
@@ -23,13 +22,154 @@ if CONFIG_JSON_PATH.exists():
         print(f"Warning: could not load config.json: {e}")
 
 
+# Every run gets its own directory under OUTPUT_DIR and a row in the run
+# index (SQLite), which `quiz-generator-runs` lists and garbage-collects.
+# The index and the caches below default to paths under OUTPUT_DIR.
+OUTPUT_DIR = Path(os.getenv("OUTPUT_DIR", "outputs"))
+RUN_INDEX_PATH = Path(os.getenv("RUN_INDEX_PATH", str(OUTPUT_DIR / "runs.sqlite")))
 
-RETRY_CONFIG = types.HttpRetryOptions(
-    attempts=5,
-    exp_base=7,
-    initial_delay=1,
-    http_status_codes=[429, 500, 503, 504],
-)
+
+# Gemini: one shared client with pooled HTTP connections. The SDK only
+# retries transient server errors; 429s are handled by the per-model token
+# buckets in limits.py, sized to our quota in requests per minute (0 = no
+# limit). Set RATE_LIMIT_STATE_DIR to share the buckets between processes.
+GEMINI_MAX_CONNECTIONS = int(os.getenv("GEMINI_MAX_CONNECTIONS", "16"))
+GEMINI_RETRY_ATTEMPTS = int(os.getenv("GEMINI_RETRY_ATTEMPTS", "3"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "4"))
+GEMINI_BACKOFF_BASE_SEC = float(os.getenv("GEMINI_BACKOFF_BASE_SEC", "2.0"))
+LLM_RPM = float(os.getenv("LLM_RPM", "0"))
+TTS_RPM = float(os.getenv("TTS_RPM", "0"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "4"))
+RATE_LIMIT_STATE_DIR = os.getenv("RATE_LIMIT_STATE_DIR") or None
+
+
+def __getattr__(name: str):
+    # Built on first use so importing config does not pull in google.genai.
+    if name == "RETRY_CONFIG":
+        from google.genai import types
+
+        global RETRY_CONFIG
+        RETRY_CONFIG = types.HttpRetryOptions(
+            attempts=GEMINI_RETRY_ATTEMPTS,
+            initial_delay=1,
+            max_delay=8,
+            exp_base=2,
+            jitter=1,
+            http_status_codes=[500, 502, 503, 504],
+        )
+        return RETRY_CONFIG
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# design_quiz: persistent cache of validated quizzes, and how many times a
+# malformed model response is sent back for repair before giving up.
+QUIZ_CACHE = os.getenv("QUIZ_CACHE", "1").lower() not in ("0", "false", "no")
+QUIZ_CACHE_DIR = Path(os.getenv("QUIZ_CACHE_DIR", str(OUTPUT_DIR / "quiz_cache")))
+QUIZ_CACHE_TTL_HOURS = float(os.getenv("QUIZ_CACHE_TTL_HOURS", "168"))
+QUIZ_CACHE_MAX_MB = float(os.getenv("QUIZ_CACHE_MAX_MB", "64"))
+QUIZ_MAX_REPAIRS = int(os.getenv("QUIZ_MAX_REPAIRS", "2"))
+
+# Quizzes larger than QUIZ_SHARD_SIZE questions are generated as parallel
+# per-subtopic requests and merged (0 disables sharding).
+QUIZ_SHARD_SIZE = int(os.getenv("QUIZ_SHARD_SIZE", "5"))
+QUIZ_SHARD_CONCURRENCY = int(os.getenv("QUIZ_SHARD_CONCURRENCY", "4"))
+
+# TTS prefetch: model and prebuilt voice, how many voiceovers are
+# synthesized at once, and how hard we back off when Gemini answers 429
+# RESOURCE_EXHAUSTED.
+TTS_MODEL = os.getenv("TTS_MODEL", "gemini-2.5-flash-preview-tts")
+TTS_VOICE = os.getenv("TTS_VOICE", "Kore")
+TTS_MAX_CONCURRENCY = int(os.getenv("TTS_MAX_CONCURRENCY", "4"))
+TTS_MAX_RETRIES = int(os.getenv("TTS_MAX_RETRIES", "4"))
+TTS_BACKOFF_BASE_SEC = float(os.getenv("TTS_BACKOFF_BASE_SEC", "2.0"))
+
+# Stream TTS audio to disk as it arrives instead of holding whole responses
+# in memory. A stream that fails before its first audio chunk is retried as
+# a single request.
+TTS_STREAMING = os.getenv("TTS_STREAMING", "1").lower() not in ("0", "false", "no")
+
+# Short voiceovers (at most TTS_BATCH_MAX_WORDS words) are packed up to
+# TTS_BATCH_SIZE per TTS request and split back apart at the pauses between
+# them; a batch that does not split cleanly is redone line by line.
+# TTS_BATCH_SIZE 0/1 (the default) gives one request per voiceover.
+TTS_BATCH_SIZE = int(os.getenv("TTS_BATCH_SIZE", "0"))
+TTS_BATCH_MAX_WORDS = int(os.getenv("TTS_BATCH_MAX_WORDS", "40"))
+TTS_BATCH_MIN_GAP_SEC = float(os.getenv("TTS_BATCH_MIN_GAP_SEC", "0.6"))
+
+# Countdown sound played under question_with_timer scenes
+# (styles: see procedural_audio.COUNTDOWN_STYLES).
+COUNTDOWN_STYLE = os.getenv("COUNTDOWN_STYLE", "tick")
+COUNTDOWN_DURATION_SEC = float(os.getenv("COUNTDOWN_DURATION_SEC", "3.0"))
+
+# Cross-run audio cache (timer clip + content-addressed TTS entries).
+AUDIO_CACHE_DIR = Path(os.getenv("AUDIO_CACHE_DIR", str(OUTPUT_DIR / "audio_cache")))
+AUDIO_CACHE_MAX_MB = float(os.getenv("AUDIO_CACHE_MAX_MB", "512"))
+AUDIO_CACHE_MAX_AGE_DAYS = float(os.getenv("AUDIO_CACHE_MAX_AGE_DAYS", "30"))
+
+# Video renderer: "compose" (MoviePy per-frame compositing), "still"
+# (rasterize each scene once, encode still segments, stream-copy concat) or
+# "stream" (pipe one scene at a time into a single encoder; flat memory).
+VIDEO_RENDERER = os.getenv("VIDEO_RENDERER", "compose")
+
+# Output frame size and frame rate.
+VIDEO_WIDTH = int(os.getenv("VIDEO_WIDTH", "1280"))
+VIDEO_HEIGHT = int(os.getenv("VIDEO_HEIGHT", "720"))
+VIDEO_FPS = int(os.getenv("VIDEO_FPS", "24"))
+
+# Per-scene segment encoding. RENDER_WORKERS > 1 encodes segments in a
+# process pool and joins them losslessly; 0/1 keeps everything in-process.
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "0"))
+VIDEO_CODEC = os.getenv("VIDEO_CODEC", "libx264")
+VIDEO_PRESET = os.getenv("VIDEO_PRESET", "medium")
+
+# Encoder profile (see encoding.py): default, fast-draft, archive or
+# low-fps-still. A profile's fps/preset take precedence over the settings
+# above. VIDEO_THREADS caps encoder threads (0 = encoder default, or split
+# between RENDER_WORKERS).
+VIDEO_PROFILE = os.getenv("VIDEO_PROFILE", "default")
+VIDEO_THREADS = int(os.getenv("VIDEO_THREADS", "0"))
+
+# Render several output formats in one pass, e.g. "720p,1080p,vertical"
+# (names from encoding.OUTPUT_FORMATS or WIDTHxHEIGHT). Empty renders one
+# VIDEO_WIDTH x VIDEO_HEIGHT video with VIDEO_RENDERER.
+VIDEO_FORMATS = [f.strip() for f in os.getenv("VIDEO_FORMATS", "").split(",") if f.strip()]
+
+# Narration variants, e.g. "Kore,Puck": the video is rendered once with the
+# first voice, and each other voice only gets TTS and an audio remux onto
+# the same video track. Empty renders TTS_VOICE only.
+VIDEO_VOICES = [v.strip() for v in os.getenv("VIDEO_VOICES", "").split(",") if v.strip()]
+
+# Incremental re-render: keep encoded per-scene segments keyed by a scene
+# fingerprint and only re-encode scenes that changed.
+INCREMENTAL_RENDER = os.getenv("INCREMENTAL_RENDER", "0").lower() in ("1", "true", "yes")
+SEGMENT_CACHE_DIR = Path(os.getenv("SEGMENT_CACHE_DIR", str(OUTPUT_DIR / "segment_cache")))
+SEGMENT_CACHE_MAX_MB = float(os.getenv("SEGMENT_CACHE_MAX_MB", "2048"))
+SEGMENT_CACHE_MAX_AGE_DAYS = float(os.getenv("SEGMENT_CACHE_MAX_AGE_DAYS", "30"))
+
+# Overlap quiz generation, TTS and per-scene encoding (see pipeline.py);
+# needs VIDEO_RENDERER "still" or "compose".
+PIPELINED = os.getenv("PIPELINED", "0").lower() in ("1", "true", "yes")
+
+# Caption font file; when unset the first working system font is used.
+VIDEO_FONT = os.getenv("VIDEO_FONT") or None
+
+# Rasterized scene frames, reused for repeated captions within and across runs.
+FRAME_CACHE_DIR = Path(os.getenv("FRAME_CACHE_DIR", str(OUTPUT_DIR / "frame_cache")))
+FRAME_CACHE_DISK = os.getenv("FRAME_CACHE_DISK", "1").lower() not in ("0", "false", "no")
+FRAME_CACHE_MEMORY_ENTRIES = int(os.getenv("FRAME_CACHE_MEMORY_ENTRIES", "64"))
+FRAME_CACHE_MAX_MB = float(os.getenv("FRAME_CACHE_MAX_MB", "256"))
+FRAME_CACHE_MAX_AGE_DAYS = float(os.getenv("FRAME_CACHE_MAX_AGE_DAYS", "30"))
+
+# Per-run stage timings written to metrics.json, plus an optional Chrome trace (trace.json).
+METRICS = os.getenv("METRICS", "1").lower() not in ("0", "false", "no")
+METRICS_TRACE = os.getenv("METRICS_TRACE", "0").lower() in ("1", "true", "yes")
+
+# Web UI: renders run on UI_WORKERS background threads with at most
+# UI_QUEUE_DEPTH requests waiting; finished videos are reused per request.
+UI_WORKERS = int(os.getenv("UI_WORKERS", "2"))
+UI_QUEUE_DEPTH = int(os.getenv("UI_QUEUE_DEPTH", "16"))
+UI_RESULT_CACHE_DIR = Path(os.getenv("UI_RESULT_CACHE_DIR", str(OUTPUT_DIR / "ui_result_cache")))
+UI_RESULT_CACHE_TTL_HOURS = float(os.getenv("UI_RESULT_CACHE_TTL_HOURS", "24"))
 
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 if not GOOGLE_API_KEY:
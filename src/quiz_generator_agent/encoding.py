@@ -0,0 +1,376 @@
+
+"""ffmpeg helpers for segment-based and streamed rendering.
+
+Scenes are encoded into self-contained MP4 segments that all share the same
+codec parameters, so they can be joined with the concat demuxer using a
+stream copy instead of a second full encode. `frame_pipe` instead feeds a
+whole video's frames to a single encoder process.
+
+Encoder settings come from a named profile (VIDEO_PROFILE). Quiz scenes are
+static slides held for several seconds, so the other profiles tune x264 for
+still images and can drop the frame rate and lengthen the GOP a long way
+without any visible difference:
+
+- "default": VIDEO_FPS / VIDEO_CODEC / VIDEO_PRESET with x264's default
+  quality and no tune, i.e. what MoviePy's `write_videofile` produces;
+- "fast-draft": 12 fps, ultrafast preset, lower quality, for previews;
+- "archive": 24 fps, slow preset, high quality, 2 s GOP for easy seeking;
+- "low-fps-still": 4 fps with a 10 s GOP, the smallest and fastest output
+  that still plays everywhere. Scene boundaries snap to 0.25 s.
+
+An output format (OUTPUT_FORMATS, or a "WIDTHxHEIGHT" string) adds a frame
+size and optional encoder overrides such as fps, crf or max_bitrate.
+`encode_slideshow` encodes several formats in one ffmpeg process from one
+still image per scene: each image is scaled once per output and then
+repeated at that output's frame rate inside the filter graph.
+"""
+
+import logging
+import subprocess
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from functools import lru_cache
+from typing import IO, Any, Dict, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Every segment is encoded with these audio parameters so concat can copy.
+SEGMENT_AUDIO_RATE = 44100
+SEGMENT_AUDIO_CHANNELS = 2
+
+# Overrides applied on top of the config defaults; see the module docstring.
+ENCODER_PROFILES: Dict[str, Dict[str, Any]] = {
+    "default": {},
+    "fast-draft": {
+        "fps": 12, "preset": "ultrafast", "tune": "stillimage", "crf": 30, "gop_sec": 10, "audio_bitrate": "96k",
+    },
+    "archive": {
+        "fps": 24, "preset": "slow", "tune": "stillimage", "crf": 18, "gop_sec": 2, "audio_bitrate": "192k",
+    },
+    "low-fps-still": {
+        "fps": 4, "preset": "veryfast", "tune": "stillimage", "crf": 23, "gop_sec": 10, "audio_bitrate": "96k",
+    },
+}
+
+
+# Named output formats: frame size plus encoder overrides for that output.
+OUTPUT_FORMATS: Dict[str, Dict[str, Any]] = {
+    "720p": {"size": (1280, 720)},
+    "1080p": {"size": (1920, 1080)},
+    "vertical": {"size": (1080, 1920)},
+}
+
+
+@lru_cache(maxsize=None)
+def ffmpeg_binary() -> str:
+    """The ffmpeg executable MoviePy is configured with, looked up on first use."""
+    from moviepy.config import FFMPEG_BINARY
+
+    return FFMPEG_BINARY
+
+
+def encoder_settings(profile: str | None = None, **overrides: Any) -> Dict[str, Any]:
+    """Encoder settings for `profile` (default VIDEO_PROFILE), with keyword overrides."""
+    import quiz_generator_agent.config as cfg
+
+    profile = profile or cfg.VIDEO_PROFILE
+    if profile not in ENCODER_PROFILES:
+        raise ValueError(f"Unknown encoder profile: {profile!r} (choose from {', '.join(ENCODER_PROFILES)})")
+
+    settings = {
+        "fps": cfg.VIDEO_FPS,
+        "codec": cfg.VIDEO_CODEC,
+        "preset": cfg.VIDEO_PRESET,
+        "tune": None,
+        "crf": None,
+        "gop_sec": None,
+        "threads": cfg.VIDEO_THREADS or None,
+        "max_bitrate": None,
+        "audio_bitrate": "128k",
+    }
+    settings.update(ENCODER_PROFILES[profile])
+    settings.update({k: v for k, v in overrides.items() if v is not None})
+    return settings
+
+
+def output_format(spec: str | Dict[str, Any]) -> Dict[str, Any]:
+    """Resolve an OUTPUT_FORMATS name, a "WIDTHxHEIGHT" string or a format dict.
+
+    The result always has "name" and "size" keys; anything else is an
+    encoder setting override (or "profile") for that output.
+    """
+    if isinstance(spec, dict):
+        fmt = dict(spec)
+        width, height = fmt["size"]
+        fmt.setdefault("name", f"{width}x{height}")
+    elif spec in OUTPUT_FORMATS:
+        fmt = {"name": spec, **OUTPUT_FORMATS[spec]}
+    else:
+        try:
+            width, height = (int(part) for part in spec.lower().split("x"))
+        except ValueError:
+            raise ValueError(
+                f"Unknown output format: {spec!r} (choose from {', '.join(OUTPUT_FORMATS)} or WIDTHxHEIGHT)"
+            ) from None
+        fmt = {"name": spec, "size": (width, height)}
+    width, height = fmt["size"]
+    if width % 2 or height % 2:
+        # yuv420p needs even dimensions.
+        raise ValueError(f"Output format {fmt['name']!r} needs an even width and height, got {width}x{height}")
+    fmt["size"] = (width, height)
+    return fmt
+
+
+def format_settings(fmt: Dict[str, Any], profile: str | None = None) -> Dict[str, Any]:
+    """Encoder settings for an output format: its profile (or `profile`) plus its overrides."""
+    overrides = {k: v for k, v in fmt.items() if k not in ("name", "size", "profile")}
+    return encoder_settings(fmt.get("profile", profile), **overrides)
+
+
+def codec_params(settings: Dict[str, Any]) -> List[str]:
+    """ffmpeg options for tune, quality, bitrate cap, GOP length and threads (not codec/preset)."""
+    args = []
+    # -tune stillimage is specific to x264.
+    if settings.get("tune") and settings["codec"] == "libx264":
+        args += ["-tune", settings["tune"]]
+    if settings.get("crf") is not None:
+        args += ["-crf", str(settings["crf"])]
+    if settings.get("max_bitrate"):
+        # Cap the bitrate on top of the quality target, e.g. for upload limits.
+        args += ["-maxrate", settings["max_bitrate"], "-bufsize", settings["max_bitrate"]]
+    if settings.get("gop_sec"):
+        args += ["-g", str(max(1, round(settings["gop_sec"] * settings["fps"])))]
+    if settings.get("threads"):
+        args += ["-threads", str(settings["threads"])]
+    return args
+
+
+def _video_args(settings: Dict[str, Any]) -> List[str]:
+    return ["-c:v", settings["codec"], "-preset", settings["preset"], *codec_params(settings), "-pix_fmt", "yuv420p"]
+
+
+def moviepy_write_args(settings: Dict[str, Any]) -> Dict[str, Any]:
+    """The same settings as keyword arguments for MoviePy's `write_videofile`."""
+    return {
+        "fps": settings["fps"],
+        "codec": settings["codec"],
+        "preset": settings["preset"],
+        "audio_bitrate": settings["audio_bitrate"],
+        "ffmpeg_params": codec_params(settings),
+    }
+
+
+def _audio_args(settings: Dict[str, Any]) -> List[str]:
+    # Pad with silence, then let the caller's -t trim to the scene length.
+    return [
+        "-af", "apad",
+        "-c:a", "aac", "-b:a", settings["audio_bitrate"],
+        "-ar", str(SEGMENT_AUDIO_RATE), "-ac", str(SEGMENT_AUDIO_CHANNELS),
+    ]
+
+
+def _audio_input_args(audio_path: str | None) -> List[str]:
+    if audio_path:
+        return ["-i", str(audio_path)]
+    return ["-f", "lavfi", "-i", f"anullsrc=r={SEGMENT_AUDIO_RATE}:cl=stereo"]
+
+
+def _run_ffmpeg(args: List[str]) -> None:
+    cmd = [ffmpeg_binary(), "-hide_banner", "-loglevel", "error", "-y", *args]
+    logger.debug(f"ffmpeg: {' '.join(cmd)}")
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed ({proc.returncode}): {proc.stderr.strip()}")
+
+
+def decode_audio(
+    audio_path: str,
+    duration: float | None = None,
+    rate: int = SEGMENT_AUDIO_RATE,
+    channels: int = SEGMENT_AUDIO_CHANNELS,
+) -> bytes:
+    """Decode an audio file to interleaved 16-bit PCM (segment rate and layout by default)."""
+    args = ["-i", str(audio_path)]
+    if duration is not None:
+        args += ["-t", f"{duration:.6f}"]
+    cmd = [
+        ffmpeg_binary(), "-hide_banner", "-loglevel", "error", *args,
+        "-f", "s16le", "-ar", str(rate), "-ac", str(channels), "-",
+    ]
+    proc = subprocess.run(cmd, capture_output=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed ({proc.returncode}): {proc.stderr.decode('utf-8', 'replace').strip()}")
+    return proc.stdout
+
+
+def encode_still_segment(
+    frame_path: Path,
+    audio_path: str | None,
+    duration: float,
+    output_path: Path,
+    settings: Dict[str, Any] | None = None,
+) -> Path:
+    """Encode a single still image plus optional audio into an MP4 segment.
+
+    Audio is padded with silence or truncated to exactly `duration`; scenes
+    without audio get a silent track so every segment has the same streams.
+    """
+    settings = settings or encoder_settings()
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    fps = str(settings["fps"])
+
+    _run_ffmpeg([
+        "-loop", "1", "-framerate", fps, "-i", str(frame_path),
+        *_audio_input_args(audio_path),
+        "-map", "0:v:0", "-map", "1:a:0",
+        "-t", f"{duration:.3f}",
+        *_video_args(settings), "-r", fps,
+        *_audio_args(settings),
+        str(output_path),
+    ])
+    return output_path
+
+
+def mux_segment_audio(
+    video_path: Path,
+    audio_path: str | None,
+    duration: float,
+    output_path: Path,
+    settings: Dict[str, Any] | None = None,
+) -> Path:
+    """Attach scene audio to a silent video segment without re-encoding video."""
+    settings = settings or encoder_settings()
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    _run_ffmpeg([
+        "-i", str(video_path),
+        *_audio_input_args(audio_path),
+        "-map", "0:v:0", "-map", "1:a:0",
+        "-t", f"{duration:.3f}",
+        "-c:v", "copy",
+        *_audio_args(settings),
+        "-movflags", "+faststart",
+        str(output_path),
+    ])
+    return output_path
+
+
+def concat_segments(segment_paths: List[Path], output_path: Path) -> Path:
+    """Join segments with identical codec parameters using a stream copy."""
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    list_path = output_path.with_suffix(".concat.txt")
+    lines = []
+    for seg in segment_paths:
+        escaped = str(Path(seg).resolve()).replace("'", "'\\''")
+        lines.append(f"file '{escaped}'")
+    list_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    try:
+        _run_ffmpeg([
+            "-f", "concat", "-safe", "0", "-i", str(list_path),
+            "-c", "copy", "-movflags", "+faststart",
+            str(output_path),
+        ])
+    finally:
+        list_path.unlink(missing_ok=True)
+    return output_path
+
+
+def encode_slideshow(
+    frames: List[Tuple[Path, float]],
+    audio_path: Path,
+    outputs: List[Tuple[Path, Tuple[int, int], Dict[str, Any]]],
+) -> List[Path]:
+    """Encode a sequence of (image, duration) stills into one or more videos.
+
+    A single ffmpeg process reads every image once (concat demuxer) and
+    writes each of `outputs` (path, size, settings): images are scaled to
+    the output size once per image and only then repeated at the output's
+    frame rate, so extra outputs cost little more than their encode.
+    """
+    list_path = Path(outputs[0][0]).with_suffix(".frames.txt")
+    lines = ["ffconcat version 1.0"]
+    for image, duration in frames:
+        escaped = str(Path(image).resolve()).replace("'", "'\\''")
+        lines += [f"file '{escaped}'", f"duration {duration:.6f}"]
+    # The concat demuxer ignores the last entry's duration unless the file is repeated.
+    lines.append(lines[-2])
+    list_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    labels = "".join(f"[s{i}]" for i in range(len(outputs)))
+    graph = [f"[0:v]split={len(outputs)}{labels}"]
+    for i, (_, (width, height), settings) in enumerate(outputs):
+        graph.append(f"[s{i}]scale={width}:{height}:flags=lanczos,fps={settings['fps']}[v{i}]")
+
+    args = ["-f", "concat", "-safe", "0", "-i", str(list_path), "-i", str(audio_path), "-filter_complex", ";".join(graph)]
+    total = sum(duration for _, duration in frames)
+    for i, (output_path, _, settings) in enumerate(outputs):
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        args += [
+            "-map", f"[v{i}]", "-map", "1:a:0",
+            "-t", f"{total:.3f}",
+            *_video_args(settings),
+            "-c:a", "aac", "-b:a", settings["audio_bitrate"],
+            "-ar", str(SEGMENT_AUDIO_RATE), "-ac", str(SEGMENT_AUDIO_CHANNELS),
+            "-movflags", "+faststart",
+            str(output_path),
+        ]
+    try:
+        _run_ffmpeg(args)
+    finally:
+        list_path.unlink(missing_ok=True)
+    return [Path(output_path) for output_path, _, _ in outputs]
+
+
+@contextmanager
+def frame_pipe(
+    size: Tuple[int, int],
+    audio_path: Path,
+    output_path: Path,
+    settings: Dict[str, Any] | None = None,
+) -> Iterator[IO[bytes]]:
+    """Run one encoder fed with raw RGB24 frames written to the yielded pipe.
+
+    The finished soundtrack at `audio_path` is muxed in by the same process,
+    so a whole video is encoded without holding more than one frame.
+    """
+    settings = settings or encoder_settings()
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    width, height = size
+
+    cmd = [
+        ffmpeg_binary(), "-hide_banner", "-loglevel", "error", "-y",
+        "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}",
+        "-r", str(settings["fps"]), "-i", "-",
+        "-i", str(audio_path),
+        "-map", "0:v:0", "-map", "1:a:0",
+        *_video_args(settings),
+        "-c:a", "aac", "-b:a", settings["audio_bitrate"],
+        "-ar", str(SEGMENT_AUDIO_RATE), "-ac", str(SEGMENT_AUDIO_CHANNELS),
+        "-movflags", "+faststart",
+        str(output_path),
+    ]
+    logger.debug(f"ffmpeg: {' '.join(cmd)}")
+    # stderr goes to a file: a chatty encoder must never block our writes.
+    with tempfile.TemporaryFile() as stderr:
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=stderr)
+        try:
+            yield proc.stdin
+        except BrokenPipeError:
+            # The encoder exited early; its stderr explains why.
+            pass
+        except BaseException:
+            proc.kill()
+            proc.wait()
+            raise
+        finally:
+            try:
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+        returncode = proc.wait()
+        if returncode != 0:
+            stderr.seek(0)
+            message = stderr.read().decode("utf-8", "replace").strip()
+            raise RuntimeError(f"ffmpeg failed ({returncode}): {message}")
@@ -0,0 +1,171 @@
+
+"""Content-addressed file cache shared across runs and processes.
+
+Entries are `<root>/<key><suffix>`. Writes go through a temp file and
+`os.replace`, so several workers (threads or processes) can share one cache
+directory. Eviction is LRU on file mtime, bounded by total size and age.
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Run an eviction pass after this many writes.
+_EVICT_EVERY_PUTS = 32
+# Temp files older than this are leftovers from crashed writers.
+_STALE_TMP_SEC = 3600
+
+
+class FileCache:
+    def __init__(
+        self,
+        root: Path,
+        max_bytes: int,
+        max_age_sec: float,
+        suffix: str,
+        touch_on_hit: bool = True,
+        name: str = "cache",
+    ):
+        # touch_on_hit=False turns max_age_sec into a TTL from write time
+        # rather than an idle timeout.
+        self.root = Path(root)
+        self.name = name
+        self.suffix = suffix
+        self.touch_on_hit = touch_on_hit
+        self.max_bytes = max_bytes
+        self.max_age_sec = max_age_sec
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._puts_since_evict = 0
+        self._lock = threading.Lock()
+
+    def path_for(self, key: str) -> Path:
+        return self.root / f"{key}{self.suffix}"
+
+    def get(self, key: str) -> Path | None:
+        """Return the cached file for `key`, or None on a miss."""
+        path = self.path_for(key)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            stat = None
+
+        if stat is not None and time.time() - stat.st_mtime <= self.max_age_sec:
+            try:
+                # Touch the entry so eviction treats it as recently used.
+                if self.touch_on_hit:
+                    os.utime(path)
+            except FileNotFoundError:
+                stat = None
+            else:
+                with self._lock:
+                    self.hits += 1
+                metrics.incr(f"{self.name}_cache.hits")
+                return path
+
+        with self._lock:
+            self.misses += 1
+        metrics.incr(f"{self.name}_cache.misses")
+        return None
+
+    def _store(self, key: str, write) -> Path:
+        self.root.mkdir(parents=True, exist_ok=True)
+        dest = self.path_for(key)
+        fd, tmp_name = tempfile.mkstemp(dir=self.root, prefix=f".{key[:16]}.", suffix=".tmp")
+        os.close(fd)
+        try:
+            write(tmp_name)
+            os.replace(tmp_name, dest)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+        with self._lock:
+            self._puts_since_evict += 1
+            run_evict = self._puts_since_evict >= _EVICT_EVERY_PUTS
+            if run_evict:
+                self._puts_since_evict = 0
+        if run_evict:
+            self.evict()
+        return dest
+
+    def put(self, key: str, src: Path) -> Path:
+        """Atomically copy the file at `src` into the cache under `key`."""
+        return self._store(key, lambda tmp: shutil.copyfile(src, tmp))
+
+    def put_bytes(self, key: str, data: bytes) -> Path:
+        """Atomically write `data` into the cache under `key`."""
+        return self._store(key, lambda tmp: Path(tmp).write_bytes(data))
+
+    def materialize(self, key: str, dest: Path) -> str | None:
+        """Place the cached entry for `key` at `dest` (hard link, else copy)."""
+        cached = self.get(key)
+        if cached is None:
+            return None
+
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(cached, dest)
+        except FileExistsError:
+            pass
+        except OSError:
+            try:
+                shutil.copyfile(cached, dest)
+            except FileNotFoundError:
+                # Evicted between get() and copy; treat as a miss.
+                return None
+        return str(dest)
+
+    def evict(self) -> int:
+        """Drop expired entries, then least-recently-used ones over the size cap."""
+        if not self.root.exists():
+            return 0
+
+        now = time.time()
+        entries = []
+        for path in self.root.iterdir():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if path.suffix == ".tmp":
+                if now - stat.st_mtime > _STALE_TMP_SEC:
+                    path.unlink(missing_ok=True)
+                continue
+            if path.suffix == self.suffix:
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, path in entries:
+            if now - mtime <= self.max_age_sec and total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+
+        if removed:
+            with self._lock:
+                self.evictions += removed
+            metrics.incr(f"{self.name}_cache.evictions", removed)
+            logger.info(f"Evicted {removed} cache entries from {self.root}")
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,76 @@
+
+"""Process-wide font registry.
+
+The caption font is resolved once per process (lazily, on first use) instead
+of once per scene. Set VIDEO_FONT to a font file to skip discovery entirely.
+"""
+
+import logging
+import os
+import threading
+
+from PIL import ImageFont
+
+logger = logging.getLogger(__name__)
+
+# Try different font options in order of preference
+FONT_CANDIDATES = [
+    # macOS fonts
+    "/System/Library/Fonts/Helvetica.ttc",
+    "/System/Library/Fonts/Arial.ttf",
+    "/Library/Fonts/Arial.ttf",
+    # Linux fonts (common)
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
+    "/usr/share/fonts/truetype/freefont/FreeSans.ttf",
+    # Windows fonts
+    "C:\\Windows\\Fonts\\arial.ttf",
+    "C:\\Windows\\Fonts\\calibri.ttf",
+]
+
+_UNRESOLVED = object()
+_resolved: object = _UNRESOLVED
+_lock = threading.Lock()
+
+
+def _loads(font: str) -> bool:
+    # Same check MoviePy's TextClip performs on its `font` argument.
+    try:
+        ImageFont.truetype(font)
+        return True
+    except OSError:
+        return False
+
+
+def _discover_font() -> str | None:
+    import quiz_generator_agent.config as cfg
+
+    if cfg.VIDEO_FONT:
+        if _loads(cfg.VIDEO_FONT):
+            return cfg.VIDEO_FONT
+        logger.warning(f"VIDEO_FONT={cfg.VIDEO_FONT!r} could not be loaded, falling back to discovery")
+
+    for font in FONT_CANDIDATES:
+        if os.path.exists(font) and _loads(font):
+            return font
+
+    # If nothing works, return None and let MoviePy use PIL's default font
+    return None
+
+
+def resolve_font() -> str | None:
+    """Return the caption font path, discovering it on first call."""
+    global _resolved
+    if _resolved is _UNRESOLVED:
+        with _lock:
+            if _resolved is _UNRESOLVED:
+                _resolved = _discover_font()
+                logger.info(f"Resolved caption font: {_resolved or 'PIL default'}")
+    return _resolved
+
+
+def reset_font_registry() -> None:
+    """Forget the resolved font (e.g. after changing VIDEO_FONT)."""
+    global _resolved
+    with _lock:
+        _resolved = _UNRESOLVED
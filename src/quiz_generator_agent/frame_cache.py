@@ -0,0 +1,139 @@
+
+"""Cache of rendered caption layers.
+
+Laying out a `method="caption"` TextClip is the slowest part of building a
+scene, and storyboards repeat captions (`question` and `question_with_timer`
+share their text). Rendered RGBA layers are keyed by everything that affects
+the pixels (text, font, font size, caption size, colors) and kept in a small
+in-memory LRU, backed by PNGs in a `FileCache` so repeated captions are
+also free across runs; the disk tier is bounded by FRAME_CACHE_MAX_MB and
+FRAME_CACHE_MAX_AGE_DAYS like the other caches.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict
+
+import numpy as np
+from PIL import Image
+
+from . import metrics
+from .file_cache import FileCache
+
+logger = logging.getLogger(__name__)
+
+_STAT_NAMES = ("memory_hits", "disk_hits", "misses")
+
+
+class FrameCache:
+    def __init__(self, disk: FileCache | None, max_memory_entries: int = 64):
+        self.disk = disk
+        self.max_memory_entries = max_memory_entries
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._counts = dict.fromkeys(_STAT_NAMES, 0)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(**parts: Any) -> str:
+        payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, frame: np.ndarray) -> None:
+        with self._lock:
+            self._memory[key] = frame
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key: str) -> np.ndarray | None:
+        with self._lock:
+            frame = self._memory.get(key)
+            if frame is not None:
+                self._memory.move_to_end(key)
+                self._counts["memory_hits"] += 1
+                metrics.incr("frame_cache.memory_hits")
+                return frame
+
+        path = self.disk.get(key) if self.disk is not None else None
+        if path is not None:
+            try:
+                with Image.open(path) as img:
+                    frame = np.array(img)
+            except OSError:
+                # Evicted or truncated since get(); treat as a miss.
+                frame = None
+            if frame is not None:
+                self._remember(key, frame)
+                with self._lock:
+                    self._counts["disk_hits"] += 1
+                metrics.incr("frame_cache.disk_hits")
+                return frame
+
+        with self._lock:
+            self._counts["misses"] += 1
+        metrics.incr("frame_cache.misses")
+        return None
+
+    def put(self, key: str, frame: np.ndarray) -> None:
+        self._remember(key, frame)
+        if self.disk is None:
+            return
+
+        buf = io.BytesIO()
+        Image.fromarray(frame).save(buf, format="PNG")
+        try:
+            self.disk.put_bytes(key, buf.getvalue())
+        except OSError as e:
+            logger.warning(f"Could not write frame cache entry {key[:12]}: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+    def record(self, counts: Dict[str, int]) -> None:
+        """Fold in counters collected elsewhere (e.g. in a worker process)."""
+        with self._lock:
+            for name in _STAT_NAMES:
+                self._counts[name] += counts.get(name, 0)
+        for name in _STAT_NAMES:
+            if counts.get(name):
+                metrics.incr(f"frame_cache.{name}", counts[name])
+
+
+_cache: FrameCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_frame_cache() -> FrameCache:
+    """Process-wide frame cache configured from `quiz_generator_agent.config`."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                import quiz_generator_agent.config as cfg
+
+                disk = None
+                if cfg.FRAME_CACHE_DISK:
+                    disk = FileCache(
+                        cfg.FRAME_CACHE_DIR,
+                        max_bytes=int(cfg.FRAME_CACHE_MAX_MB * 1024 * 1024),
+                        max_age_sec=cfg.FRAME_CACHE_MAX_AGE_DAYS * 86400,
+                        suffix=".png",
+                        name="frame_disk",
+                    )
+                _cache = FrameCache(
+                    disk=disk,
+                    max_memory_entries=cfg.FRAME_CACHE_MEMORY_ENTRIES,
+                )
+    return _cache
+
+
+def hit_rate(counts: Dict[str, int]) -> float:
+    total = sum(counts.get(name, 0) for name in _STAT_NAMES)
+    if not total:
+        return 0.0
+    return (counts.get("memory_hits", 0) + counts.get("disk_hits", 0)) / total
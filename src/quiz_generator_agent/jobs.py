@@ -0,0 +1,248 @@
+
+"""Background render jobs for the web UI.
+
+A request handler submits a job and then only watches its progress, so a
+minutes-long render never holds a web worker. Jobs run on a small thread
+pool (UI_WORKERS) with at most UI_QUEUE_DEPTH waiting; beyond that new
+requests are refused instead of piling up.
+
+Requests are keyed on the normalized topic, difficulty and question count
+plus the quiz, narration and video settings. A request identical to one
+still in flight joins that job, and one identical to a finished job is
+answered from the result cache as long as its video is still on disk.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict
+
+import quiz_generator_agent.config
+
+from .file_cache import FileCache
+from .main import orchestrate_quiz_video
+from .quiz_cache import normalize_topic
+
+logger = logging.getLogger(__name__)
+
+# Result entries only hold paths and the storyboard, so a small cap is plenty.
+_RESULT_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+# Spans that mark a new stage when they start, and the label shown for it.
+_STAGE_LABELS = {
+    "design_quiz": "Designing quiz questions",
+    "build_storyboard": "Building storyboard",
+    "prefetch_audio": "Generating narration",
+    "render_scene": "Rendering scenes",
+    "encode_segment": "Encoding scenes",
+    "stream_scene": "Encoding scenes",
+    "build_soundtrack": "Mixing soundtrack",
+    "concat_segments": "Joining scene segments",
+    "concatenate_videoclips": "Assembling final video",
+    "write_videofile": "Writing final video",
+    "encode_formats": "Encoding output formats",
+    "mux_soundtrack": "Adding narration",
+}
+
+# Spans counted as they finish, one per scene.
+_SCENE_COUNTERS = {
+    "synthesize_audio": "narration clips",
+    "render_scene": "scenes rendered",
+    "encode_segment": "scenes encoded",
+    "stream_scene": "scenes encoded",
+}
+
+
+class QueueFull(RuntimeError):
+    pass
+
+
+class Job:
+    """One render request; its fields are updated by the worker thread."""
+
+    def __init__(self, key: str, topic: str, difficulty: str, num_questions: int):
+        self.key = key
+        self.topic = topic
+        self.difficulty = difficulty
+        self.num_questions = num_questions
+        self.status = "queued"
+        self.stage = "Waiting for a free worker"
+        self.counts: Dict[str, int] = {}
+        self.result: Dict[str, Any] | None = None
+        self.error: str | None = None
+        self.cached = False
+        self.submitted_at = time.time()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        # Bumped on every change so watchers can tell when to redraw.
+        self.version = 0
+        self._lock = threading.Lock()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def _update(self, **fields: Any) -> None:
+        with self._lock:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.version += 1
+
+    def on_span(self, event: str, name: str, attrs: Dict[str, Any]) -> None:
+        if event == "start" and name in _STAGE_LABELS:
+            self._update(stage=_STAGE_LABELS[name])
+        elif event == "end" and name in _SCENE_COUNTERS:
+            with self._lock:
+                label = _SCENE_COUNTERS[name]
+                self.counts[label] = self.counts.get(label, 0) + 1
+                self.version += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            now = self.finished_at or time.time()
+            return {
+                "status": self.status,
+                "stage": self.stage,
+                "counts": dict(self.counts),
+                "cached": self.cached,
+                "error": self.error,
+                "elapsed_sec": now - (self.started_at or self.submitted_at),
+                "version": self.version,
+            }
+
+
+def request_key(topic: str, difficulty: str, num_questions: int) -> str:
+    # Every setting that changes the finished video belongs in the key, so a
+    # config change never serves a video rendered under the old settings.
+    cfg = quiz_generator_agent.config
+    payload = json.dumps(
+        [
+            normalize_topic(topic),
+            difficulty.strip().lower(),
+            int(num_questions),
+            cfg.QUIZ_CACHE,
+            cfg.QUIZ_MAX_REPAIRS,
+            cfg.QUIZ_SHARD_SIZE,
+            cfg.PIPELINED,
+            cfg.COUNTDOWN_STYLE,
+            cfg.COUNTDOWN_DURATION_SEC,
+            cfg.VIDEO_RENDERER,
+            cfg.VIDEO_WIDTH,
+            cfg.VIDEO_HEIGHT,
+            cfg.VIDEO_FPS,
+            cfg.VIDEO_PROFILE,
+            cfg.VIDEO_FORMATS,
+            cfg.TTS_MODEL,
+            cfg.TTS_VOICE,
+            cfg.VIDEO_VOICES,
+        ],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class JobManager:
+    def __init__(self, workers: int, max_queued: int, result_cache: FileCache | None = None):
+        self.max_queued = max_queued
+        self.result_cache = result_cache
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ui-job")
+        self._active: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, topic: str, difficulty: str, num_questions: int) -> Job:
+        """Start (or join, or answer from cache) a render for this request."""
+        key = request_key(topic, difficulty, num_questions)
+        with self._lock:
+            job = self._active.get(key)
+            if job is not None:
+                logger.info(f"Joining in-flight job for {topic!r} ({difficulty}, {num_questions} questions)")
+                return job
+
+            job = Job(key, topic, difficulty, num_questions)
+            cached = self._load_result(key)
+            if cached is not None:
+                logger.info(f"Reusing finished video for {topic!r} ({difficulty}, {num_questions} questions)")
+                job._update(status="done", stage="Done", result=cached, cached=True, finished_at=time.time())
+                return job
+
+            queued = sum(1 for j in self._active.values() if j.status == "queued")
+            if queued >= self.max_queued:
+                raise QueueFull(f"{queued} requests are already waiting")
+
+            self._active[key] = job
+            self._pool.submit(self._run, job)
+        return job
+
+    def _run(self, job: Job) -> None:
+        job._update(status="running", stage="Starting", started_at=time.time())
+        try:
+            result = orchestrate_quiz_video(
+                topic=job.topic,
+                difficulty=job.difficulty,
+                num_questions=job.num_questions,
+                debug=True,
+                progress=job.on_span,
+            )
+        except Exception as e:
+            logger.exception(f"UI job for {job.topic!r} failed")
+            job._update(status="failed", stage="Failed", error=str(e), finished_at=time.time())
+        else:
+            self._store_result(job.key, result)
+            job._update(status="done", stage="Done", result=result, finished_at=time.time())
+        finally:
+            with self._lock:
+                self._active.pop(job.key, None)
+
+    def _load_result(self, key: str) -> Dict[str, Any] | None:
+        if self.result_cache is None:
+            return None
+        path = self.result_cache.get(key)
+        if path is None:
+            return None
+        try:
+            result = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            return None
+        # The run directory may have been cleaned up since.
+        if not Path(result.get("final_video", "")).is_file():
+            return None
+        return result
+
+    def _store_result(self, key: str, result: Dict[str, Any]) -> None:
+        if self.result_cache is None:
+            return
+        entry = {
+            name: result[name]
+            for name in ("topic", "difficulty", "num_questions", "storyboard", "final_video", "output_dir")
+        }
+        try:
+            self.result_cache.put_bytes(key, json.dumps(entry, ensure_ascii=False).encode("utf-8"))
+        except OSError as e:
+            logger.warning(f"Could not cache UI result: {e}")
+
+
+_manager: JobManager | None = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """Process-wide job manager configured from `quiz_generator_agent.config`."""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                cfg = quiz_generator_agent.config
+                result_cache = FileCache(
+                    root=cfg.UI_RESULT_CACHE_DIR,
+                    max_bytes=_RESULT_CACHE_MAX_BYTES,
+                    max_age_sec=cfg.UI_RESULT_CACHE_TTL_HOURS * 3600,
+                    suffix=".json",
+                    touch_on_hit=False,
+                    name="ui_result",
+                )
+                _manager = JobManager(cfg.UI_WORKERS, cfg.UI_QUEUE_DEPTH, result_cache)
+    return _manager
@@ -0,0 +1,159 @@
+
+"""Process-wide concurrency limits per pipeline stage, and API rate limits.
+
+Stages ("llm", "tts", "render") wrap their expensive section in
+`stage_slot(stage)`. Limits are unset by default, so single runs are not
+throttled; batch mode sets them so API-bound and CPU-bound stages of
+different jobs overlap without oversubscribing either.
+
+Gemini requests additionally go through a token bucket per model
+(`rate_limiter(model)`), which spaces requests out to the configured quota
+and, after a 429, holds back every caller of that model at once. With
+RATE_LIMIT_STATE_DIR set, buckets live in flock-protected files so separate
+processes share one quota.
+"""
+
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator
+
+from . import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: buckets stay per-process.
+    fcntl = None
+
+STAGES = ("llm", "tts", "render")
+
+_limits: Dict[str, threading.BoundedSemaphore] = {}
+_lock = threading.Lock()
+
+
+def set_stage_limit(stage: str, limit: int | None) -> None:
+    """Allow at most `limit` concurrent holders of `stage` (None = unlimited)."""
+    if stage not in STAGES:
+        raise ValueError(f"Unknown stage: {stage!r} (choose from {STAGES})")
+    with _lock:
+        if limit is None or limit <= 0:
+            _limits.pop(stage, None)
+        else:
+            _limits[stage] = threading.BoundedSemaphore(limit)
+
+
+@contextmanager
+def stage_slot(stage: str) -> Iterator[None]:
+    sem = _limits.get(stage)
+    if sem is None:
+        yield
+        return
+    with sem:
+        yield
+
+
+class RateLimiter:
+    """Token bucket allowing `rate_per_min` requests with bursts of `burst`.
+
+    `acquire()` reserves the next token and sleeps until it is due, so
+    concurrent callers are spread out rather than all failing and backing off
+    together. `pause(seconds)` holds back every caller, e.g. after a 429.
+    """
+
+    def __init__(self, rate_per_min: float, burst: int = 1, state_path: Path | None = None):
+        self.rate_per_min = rate_per_min
+        self.burst = max(1, burst)
+        self.state_path = state_path if fcntl is not None else None
+        self._lock = threading.Lock()
+        self._state = self._fresh_state()
+
+    def _fresh_state(self) -> Dict[str, float]:
+        return {"tokens": float(self.burst), "updated": time.time(), "paused_until": 0.0}
+
+    def _with_state(self, update: Callable[[Dict[str, float]], Any]) -> Any:
+        with self._lock:
+            if self.state_path is None:
+                return update(self._state)
+
+            self.state_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.state_path, "a+", encoding="utf-8") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                f.seek(0)
+                try:
+                    state = json.loads(f.read() or "null") or self._fresh_state()
+                except json.JSONDecodeError:
+                    state = self._fresh_state()
+                result = update(state)
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+            return result
+
+    def _reserve(self, state: Dict[str, float]) -> float:
+        now = time.time()
+        wait = 0.0
+        if self.rate_per_min > 0:
+            per_sec = self.rate_per_min / 60
+            tokens = min(self.burst, state["tokens"] + (now - state["updated"]) * per_sec) - 1
+            state["tokens"], state["updated"] = tokens, now
+            if tokens < 0:
+                wait = -tokens / per_sec
+        return max(wait, state["paused_until"] - now)
+
+    def acquire(self) -> float:
+        """Block until a request may be sent; return the seconds waited."""
+        wait = self._with_state(self._reserve)
+        if wait > 0:
+            with metrics.span("rate_limit.wait"):
+                time.sleep(wait)
+        return wait
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every caller of this bucket for `seconds`."""
+        def update(state: Dict[str, float]) -> None:
+            state["paused_until"] = max(state["paused_until"], time.time() + seconds)
+
+        self._with_state(update)
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_rate_overrides: Dict[str, float] = {}
+
+
+def _model_rpm(model: str) -> float:
+    import quiz_generator_agent.config as cfg
+
+    if model in _rate_overrides:
+        return _rate_overrides[model]
+    return cfg.TTS_RPM if model == cfg.TTS_MODEL else cfg.LLM_RPM
+
+
+def rate_limiter(model: str) -> RateLimiter:
+    """The shared token bucket for `model`, configured from LLM_RPM / TTS_RPM."""
+    limiter = _limiters.get(model)
+    if limiter is None:
+        import quiz_generator_agent.config as cfg
+
+        with _lock:
+            limiter = _limiters.get(model)
+            if limiter is None:
+                state_path = None
+                if cfg.RATE_LIMIT_STATE_DIR:
+                    state_path = Path(cfg.RATE_LIMIT_STATE_DIR) / (re.sub(r"[^\w.-]+", "_", model) + ".json")
+                rpm = _model_rpm(model)
+                limiter = RateLimiter(rpm, burst=min(cfg.RATE_LIMIT_BURST, max(1, int(rpm))), state_path=state_path)
+                _limiters[model] = limiter
+    return limiter
+
+
+def set_rate_limit(model: str, rate_per_min: float | None) -> None:
+    """Override the requests-per-minute quota for `model` (None = back to config)."""
+    with _lock:
+        if rate_per_min is None:
+            _rate_overrides.pop(model, None)
+        else:
+            _rate_overrides[model] = rate_per_min
+        _limiters.pop(model, None)
@@ -3,57 +3,97 @@ import logging
 logger = logging.getLogger(__name__)
 
 import json
-import re
-from datetime import datetime
+import time
 from pathlib import Path
 from typing import Dict, Any
 
 import quiz_generator_agent.config
 
+from . import metrics
+from .runs import RunContext, start_run
 from .quiz_agent import design_quiz
 from .storyboard_agent import build_storyboard
 from .video_agent import render_video_from_storyboard
+from .pipeline import PIPELINED_RENDERERS, render_quiz_pipelined
 
 
-def _slugify(text: str) -> str:
-    slug = re.sub(r"[^a-zA-Z0-9]+", "_", text.strip().lower())
-    return slug.strip("_") or "quiz"
+def _write_metrics(run_metrics: metrics.RunMetrics, run: RunContext) -> None:
+    """Save metrics.json (and trace.json with METRICS_TRACE) next to quiz.json."""
+    try:
+        path = run.write_json("metrics.json", run_metrics.to_dict())
+        if quiz_generator_agent.config.METRICS_TRACE:
+            run_metrics.write_chrome_trace(run.path("trace.json"))
+    except OSError as e:
+        logger.warning(f"Could not write run metrics to {run.run_dir}: {e}")
+        return
 
+    slowest = sorted(run_metrics.summary().items(), key=lambda kv: kv[1]["wall_sec"], reverse=True)[:5]
+    logger.info(
+        f"Run metrics saved to {path}; slowest stages: "
+        + ", ".join(f"{name} {t['wall_sec']:.1f}s" for name, t in slowest)
+    )
 
-def orchestrate_quiz_video(
+
+def _orchestrate_pipelined(
     topic: str,
-    difficulty: str = "easy",
-    num_questions: int = 3,
-    debug: bool = False,
+    difficulty: str,
+    num_questions: int,
+    run: RunContext,
+    debug: bool,
 ) -> Dict[str, Any]:
-    base_output = Path("outputs")
-    base_output.mkdir(exist_ok=True)
-
-    run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
-    topic_slug = _slugify(topic)
-    run_dir = base_output / f"{topic_slug}_{run_id}"
-    run_dir.mkdir(parents=True, exist_ok=True)
+    rendered = render_quiz_pipelined(topic, difficulty, num_questions, run.run_dir)
+    quiz = rendered["quiz"]
+    storyboard = rendered["storyboard"]
 
+    run.write_json("quiz.json", quiz)
+    run.write_json("storyboard.json", storyboard)
     if debug:
-        logger.info(f"Created output directory: {run_dir}")
+        logger.info(f"Saved quiz and storyboard to: {run.run_dir}")
+
+    return {
+        "topic": topic,
+        "difficulty": difficulty,
+        "num_questions": len(quiz["questions"]),
+        "quiz": quiz,
+        "storyboard": storyboard,
+        "final_video": rendered["final_video"],
+        "output_dir": str(run.run_dir),
+        "timings": rendered["timings"],
+    }
+
 
-    quiz = design_quiz(topic=topic, difficulty=difficulty, num_questions=num_questions)
+def _orchestrate_sequential(
+    topic: str,
+    difficulty: str,
+    num_questions: int,
+    run: RunContext,
+    debug: bool,
+) -> Dict[str, Any]:
+    timings: Dict[str, float] = {}
+    t0 = time.perf_counter()
+    with metrics.span("design_quiz"):
+        quiz = design_quiz(topic=topic, difficulty=difficulty, num_questions=num_questions)
+    timings["design_quiz"] = time.perf_counter() - t0
 
     # Always save quiz.json file
-    quiz_file = run_dir / "quiz.json"
-    quiz_file.write_text(json.dumps(quiz, indent=2, ensure_ascii=False), encoding="utf-8")
+    quiz_file = run.write_json("quiz.json", quiz)
     if debug:
         logger.info(f"Saved quiz to: {quiz_file}")
 
-    storyboard = build_storyboard(quiz)
+    t0 = time.perf_counter()
+    with metrics.span("build_storyboard"):
+        storyboard = build_storyboard(quiz)
+    timings["build_storyboard"] = time.perf_counter() - t0
 
     # Always save storyboard.json file
-    storyboard_file = run_dir / "storyboard.json"
-    storyboard_file.write_text(json.dumps(storyboard, indent=2, ensure_ascii=False), encoding="utf-8")
+    storyboard_file = run.write_json("storyboard.json", storyboard)
     if debug:
         logger.info(f"Saved storyboard to: {storyboard_file}")
 
-    video_result = render_video_from_storyboard(storyboard)
+    t0 = time.perf_counter()
+    with metrics.span("render_video"):
+        video_result = render_video_from_storyboard(storyboard)
+    timings["render_video"] = time.perf_counter() - t0
 
     result = {
         "topic": topic,
@@ -63,10 +103,76 @@ def orchestrate_quiz_video(
         "storyboard": storyboard,
         "final_video": video_result["final_video"],
         "output_dir": video_result["output_dir"],
+        "timings": timings,
     }
+    for key in ("videos", "voices"):
+        if key in video_result:
+            result[key] = video_result[key]
     return result
 
 
+def orchestrate_quiz_video(
+    topic: str,
+    difficulty: str = "easy",
+    num_questions: int = 3,
+    debug: bool = False,
+    pipelined: bool | None = None,
+    progress: metrics.SpanListener | None = None,
+) -> Dict[str, Any]:
+    """Design, storyboard, voice and render one quiz video into a new run directory.
+
+    Every artifact of the run goes into that one directory, and the run is
+    recorded in the run index (see runs.py).
+    `progress(event, name, attrs)` is called as each stage span starts and ends.
+    """
+    cfg = quiz_generator_agent.config
+    if pipelined is None:
+        # The pipelined renderer writes a single format with a single voice,
+        # and cannot use the "stream" renderer.
+        pipelined = (
+            cfg.PIPELINED
+            and cfg.VIDEO_RENDERER in PIPELINED_RENDERERS
+            and not cfg.VIDEO_FORMATS
+            and len(cfg.VIDEO_VOICES) <= 1
+        )
+    orchestrate = _orchestrate_pipelined if pipelined else _orchestrate_sequential
+
+    with start_run(topic, difficulty, num_questions) as run:
+        if debug:
+            logger.info(f"Created output directory: {run.run_dir}")
+
+        # Stage spans are recorded for every run; metrics.json is written even
+        # when a stage fails, so slow or failing runs can be diagnosed.
+        with metrics.collect(run.run_id, on_span=progress) as run_metrics:
+            try:
+                result = orchestrate(topic, difficulty, num_questions, run, debug)
+                run.final_video = result["final_video"]
+            finally:
+                if cfg.METRICS:
+                    _write_metrics(run_metrics, run)
+
+    result["run_id"] = run.run_id
+    if cfg.METRICS:
+        result["metrics"] = str(run.path("metrics.json"))
+    return result
+
+
+def rerender_storyboard(storyboard_path: str) -> Dict[str, Any]:
+    """Re-render an edited storyboard.json, re-encoding only the scenes that changed."""
+    storyboard = json.loads(Path(storyboard_path).read_text(encoding="utf-8"))
+    return render_video_from_storyboard(storyboard, incremental=True)
+
+
+def rerender_main() -> None:
+    import sys
+
+    if len(sys.argv) != 2:
+        raise SystemExit("usage: quiz-generator-rerender <storyboard.json>")
+    res = rerender_storyboard(sys.argv[1])
+    print("Output dir:", res["output_dir"])
+    print("Final video:", res["final_video"])
+
+
 def main(debug: bool = False) -> None:
     topic = input("Enter quiz topic: ")
     difficulty = input("Difficulty (easy/medium/hard, default easy): ") or "easy"
@@ -0,0 +1,200 @@
+
+"""Per-run timing and resource instrumentation.
+
+`collect(run_id)` activates a `RunMetrics` for the current context; inside
+it, `span(name)` records wall time, thread CPU time and peak RSS for a
+block, and `incr(name)` bumps integer counters such as cache hits or API
+retries. Other measurements (e.g. time to first audio) go into the span's
+attributes: `span` yields its attrs dict, which is recorded when it ends.
+Outside of `collect` both are no-ops, so instrumented code costs nothing
+when nobody is listening.
+
+The active run is held in a ContextVar. Work handed to thread pools must be
+submitted with `submit()` so it is recorded against the same run; worker
+processes collect their own spans with `collect_spans()` and return them for
+`RunMetrics.merge_spans()`.
+
+An `on_span(event, name, attrs)` callback passed to `collect` is told when
+spans start and end ("start" / "end"), e.g. to stream progress to the web UI.
+Spans merged from worker processes only report "end".
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS is reported as 0.
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+SpanListener = Callable[[str, str, Dict[str, Any]], None]
+
+_current: ContextVar["RunMetrics | None"] = ContextVar("quiz_run_metrics", default=None)
+
+
+def _peak_rss_mb(children: bool = False) -> float:
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes on Linux.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class RunMetrics:
+    def __init__(self, run_id: str, on_span: SpanListener | None = None):
+        self.run_id = run_id
+        self.on_span = on_span
+        self.started_at = time.time()
+        self.t0 = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.counters: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def notify(self, event: str, name: str, attrs: Dict[str, Any]) -> None:
+        if self.on_span is None:
+            return
+        try:
+            self.on_span(event, name, attrs)
+        except Exception as e:
+            # A broken listener must never fail the run it is watching.
+            logger.warning(f"Span listener failed on {event} {name}: {e}")
+
+    def add_span(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self.spans.append(record)
+        self.notify("end", record["name"], record["attrs"])
+
+    def merge_spans(self, records: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self.spans.extend(records)
+        for record in records:
+            self.notify("end", record["name"], record.get("attrs", {}))
+
+    def incr(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += n
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Totals per span name: count, wall and CPU seconds."""
+        totals: Dict[str, Dict[str, float]] = {}
+        with self._lock:
+            spans = list(self.spans)
+        for s in spans:
+            t = totals.setdefault(s["name"], {"count": 0, "wall_sec": 0.0, "cpu_sec": 0.0})
+            t["count"] += 1
+            t["wall_sec"] += s["wall_sec"]
+            t["cpu_sec"] += s["cpu_sec"]
+        return {name: {k: round(v, 4) for k, v in t.items()} for name, t in totals.items()}
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start"])
+            counters = dict(self.counters)
+        return {
+            "run_id": self.run_id,
+            "started_at": self.started_at,
+            "wall_sec": round(time.perf_counter() - self.t0, 4),
+            "peak_rss_mb": round(_peak_rss_mb(), 1),
+            "peak_child_rss_mb": round(_peak_rss_mb(children=True), 1),
+            "counters": counters,
+            "summary": self.summary(),
+            "spans": [
+                {**s, "start": round(s["start"] - self.t0, 6), "wall_sec": round(s["wall_sec"], 6),
+                 "cpu_sec": round(s["cpu_sec"], 6)}
+                for s in spans
+            ],
+        }
+
+    def write_chrome_trace(self, path: Path) -> Path:
+        """Export spans in Chrome trace-event format (chrome://tracing, Perfetto)."""
+        with self._lock:
+            spans = list(self.spans)
+        events = [
+            {
+                "name": s["name"],
+                "ph": "X",
+                "ts": (s["start"] - self.t0) * 1e6,
+                "dur": s["wall_sec"] * 1e6,
+                "pid": s["pid"],
+                "tid": s["tid"],
+                "args": {**s.get("attrs", {}), "cpu_sec": s["cpu_sec"], "peak_rss_mb": s["peak_rss_mb"]},
+            }
+            for s in spans
+        ]
+        path.write_text(json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}), encoding="utf-8")
+        return path
+
+
+def current() -> RunMetrics | None:
+    return _current.get()
+
+
+@contextmanager
+def collect(run_id: str, on_span: SpanListener | None = None) -> Iterator[RunMetrics]:
+    """Record spans and counters from this context into a new RunMetrics."""
+    metrics = RunMetrics(run_id, on_span)
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def collect_spans(enabled: bool = True) -> Iterator[List[Dict[str, Any]]]:
+    """Collect raw span records in a worker process, for merging by the parent."""
+    records: List[Dict[str, Any]] = []
+    if not enabled:
+        yield records
+        return
+    with collect("worker") as metrics:
+        yield records
+    records.extend(metrics.spans)
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+    metrics = _current.get()
+    if metrics is None:
+        yield attrs
+        return
+
+    metrics.notify("start", name, attrs)
+    start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        yield attrs
+    finally:
+        metrics.add_span({
+            "name": name,
+            "attrs": attrs,
+            "start": start,
+            "wall_sec": time.perf_counter() - start,
+            "cpu_sec": time.thread_time() - cpu_start,
+            "peak_rss_mb": round(_peak_rss_mb(), 1),
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+        })
+
+
+def incr(name: str, n: int = 1) -> None:
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.incr(name, n)
+
+
+def submit(pool: Executor, fn, *args: Any, **kwargs: Any) -> Future:
+    """`pool.submit` that runs `fn` in a copy of the caller's context."""
+    return pool.submit(copy_context().run, fn, *args, **kwargs)
@@ -0,0 +1,183 @@
+
+"""Pipelined quiz-video generation.
+
+The sequential path runs design_quiz -> build_storyboard -> render, and the
+render waits for every voiceover before encoding anything. Here each scene
+is rendered as soon as its inputs exist:
+
+- the intro and outro only need the topic, so their TTS and encoding start
+  while the quiz LLM call is still in flight;
+- each question's voiceovers are requested as soon as the quiz arrives,
+  through `prefetch_audio`, so they share its cache and TTS batching;
+- a scene is queued for encoding once its voiceover is on disk, so render
+  threads never wait on TTS, and each encode holds a "render" stage slot;
+- finished segments are consumed in storyboard order and joined by stream
+  copy, so time-to-video approaches the slowest stage rather than the sum.
+
+Only the "still" and "compose" renderers encode per-scene segments; the
+"stream" renderer needs the whole storyboard up front.
+"""
+
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import quiz_generator_agent.config
+
+from . import metrics
+from .audio_agent import prefetch_audio
+from .encoding import concat_segments, encoder_settings
+from .limits import stage_slot
+from .quiz_agent import design_quiz
+from .storyboard_agent import intro_scenes, question_scenes, outro_scenes
+from .video_agent import _render_scene_composed, _render_scene_still
+
+logger = logging.getLogger(__name__)
+
+PIPELINED_RENDERERS = ("still", "compose")
+
+
+def render_quiz_pipelined(
+    topic: str,
+    difficulty: str,
+    num_questions: int,
+    run_dir: Path,
+    renderer: str | None = None,
+    render_workers: int | None = None,
+    tts_concurrency: int | None = None,
+    profile: str | None = None,
+) -> Dict[str, Any]:
+    """Generate the quiz and render its video with overlapping stages.
+
+    Returns the quiz, the storyboard that was rendered, the final video path
+    and stage timings. The storyboard topic is the requested `topic`, since
+    the intro is rendered before the model returns its own topic string.
+    """
+    cfg = quiz_generator_agent.config
+    renderer = renderer or cfg.VIDEO_RENDERER
+    if renderer not in PIPELINED_RENDERERS:
+        raise ValueError(
+            f"The pipelined renderer supports {', '.join(PIPELINED_RENDERERS)}, not {renderer!r}"
+        )
+    render = _render_scene_still if renderer == "still" else _render_scene_composed
+    if render_workers is None:
+        render_workers = max(2, cfg.RENDER_WORKERS)
+    if tts_concurrency is None:
+        tts_concurrency = cfg.TTS_MAX_CONCURRENCY
+
+    audio_dir = run_dir / "audio"
+    segment_dir = run_dir / "segments"
+    settings = encoder_settings(profile)
+    if not settings["threads"]:
+        # Parallel encoders share the CPUs instead of each starting one thread per core.
+        settings["threads"] = max(1, (os.cpu_count() or 1) // render_workers)
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+
+    # Every scene in the order it was queued (intro, outro, then questions),
+    # its segment name, and its segment future once it has been submitted.
+    scenes: List[Dict[str, Any]] = []
+    scene_ids: List[str] = []
+    segments_by_index: Dict[int, Future] = {}
+    # Voiceovers already requested by some group, and their WAVs once written.
+    requested: set = set()
+    path_by_text: Dict[str, str] = {}
+    # The quiz and every outstanding group of voiceovers.
+    pending: set = set()
+
+    quiz_pool = ThreadPoolExecutor(max_workers=1)
+    # One group (intro/outro or a question) per worker, its lines one at a
+    # time, so at most tts_concurrency requests are in flight.
+    tts_pool = ThreadPoolExecutor(max_workers=max(1, tts_concurrency))
+    render_pool = ThreadPoolExecutor(max_workers=max(1, render_workers))
+
+    def render_scene(scene: Dict[str, Any], scene_id: str, audio_path: str | None) -> Path:
+        with stage_slot("render"):
+            return render(scene, scene_id=scene_id, segment_dir=segment_dir, audio_path=audio_path, settings=settings)
+
+    def queue_group(group: List[Tuple[Dict[str, Any], str]]) -> List[int]:
+        first = len(scenes)
+        for scene, scene_id in group:
+            scenes.append(scene)
+            scene_ids.append(scene_id)
+        indices = list(range(first, len(scenes)))
+        # Identical voiceovers share one TTS call, even across groups.
+        new = [idx for idx in indices if scenes[idx].get("voiceover") and scenes[idx]["voiceover"] not in requested]
+        requested.update(scenes[idx]["voiceover"] for idx in new)
+        if new:
+            pending.add(metrics.submit(
+                tts_pool, prefetch_audio, list(scenes), str(audio_dir), max_concurrency=1, indices=new
+            ))
+        return indices
+
+    def submit_ready() -> None:
+        for idx, scene in enumerate(scenes):
+            voiceover = scene.get("voiceover", "")
+            if idx in segments_by_index or (voiceover and voiceover not in path_by_text):
+                continue
+            segments_by_index[idx] = metrics.submit(
+                render_pool, render_scene, scene, scene_ids[idx], path_by_text.get(voiceover)
+            )
+
+    def timed_design_quiz() -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        with metrics.span("design_quiz"):
+            quiz = design_quiz(topic=topic, difficulty=difficulty, num_questions=num_questions)
+        timings["design_quiz"] = time.perf_counter() - t0
+        return quiz
+
+    ok = False
+    try:
+        quiz_future = metrics.submit(quiz_pool, timed_design_quiz)
+        pending.add(quiz_future)
+
+        head = intro_scenes(topic)
+        tail = outro_scenes()
+        head_indices = queue_group([(s, f"intro_{i:02d}") for i, s in enumerate(head)])
+        tail_indices = queue_group([(s, f"outro_{i:02d}") for i, s in enumerate(tail)])
+        submit_ready()
+
+        quiz = None
+        body: List[Dict[str, Any]] = []
+        body_indices: List[int] = []
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            pending -= done
+            for fut in done:
+                if fut is quiz_future:
+                    quiz = fut.result()
+                    for number, q in enumerate(quiz["questions"], start=1):
+                        group = [(scene, f"q{number:03d}_{j}") for j, scene in enumerate(question_scenes(number, q))]
+                        body += [scene for scene, _ in group]
+                        body_indices += queue_group(group)
+                else:
+                    for idx, path in fut.result().items():
+                        path_by_text[scenes[idx]["voiceover"]] = path
+            submit_ready()
+
+        # Consume segments in storyboard order as they finish.
+        segments = [segments_by_index[idx].result() for idx in head_indices + body_indices + tail_indices]
+        timings["segments"] = time.perf_counter() - started
+
+        final_video_path = run_dir / "quiz_video_local.mp4"
+        t0 = time.perf_counter()
+        with metrics.span("concat_segments", segments=len(segments)):
+            concat_segments(segments, final_video_path)
+        timings["concat"] = time.perf_counter() - t0
+        ok = True
+    finally:
+        for pool in (quiz_pool, tts_pool, render_pool):
+            pool.shutdown(wait=True, cancel_futures=not ok)
+
+    timings["total"] = time.perf_counter() - started
+    logger.info(f"Pipelined render finished in {timings['total']:.1f}s ({len(segments)} segments)")
+
+    return {
+        "quiz": quiz,
+        "storyboard": {"topic": topic, "scenes": head + body + tail},
+        "final_video": str(final_video_path),
+        "timings": timings,
+    }
@@ -0,0 +1,87 @@
+
+"""Procedural audio buffers (countdown tones, silence) built with NumPy.
+
+Everything is generated as 16-bit mono PCM at the Gemini TTS output rate, so
+timer clips, silent fallbacks and voiceovers can be mixed without
+resampling.
+"""
+
+import wave
+from pathlib import Path
+from typing import Any, Dict
+
+import numpy as np
+
+# Gemini TTS returns 24 kHz 16-bit mono PCM.
+SAMPLE_RATE = 24000
+
+COUNTDOWN_STYLES: Dict[str, Dict[str, Any]] = {
+    # Short 1 kHz tick once per second (the original countdown sound).
+    "tick": {"tick_sec": 0.1, "period_sec": 1.0, "freq": 1000.0, "freq_step": 0.0, "amplitude": 0.3},
+    # Longer, softer beep once per second.
+    "beep": {"tick_sec": 0.25, "period_sec": 1.0, "freq": 880.0, "freq_step": 0.0, "amplitude": 0.25},
+    # Ticks that rise in pitch as time runs out.
+    "rising": {"tick_sec": 0.15, "period_sec": 1.0, "freq": 660.0, "freq_step": 110.0, "amplitude": 0.3},
+    # Fast ticks twice per second.
+    "fast": {"tick_sec": 0.06, "period_sec": 0.5, "freq": 1200.0, "freq_step": 0.0, "amplitude": 0.25},
+}
+
+
+def _to_pcm16(signal: np.ndarray) -> np.ndarray:
+    return np.clip(np.round(signal * 32767), -32768, 32767).astype(np.int16)
+
+
+def silence(duration: float, rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Return `duration` seconds of 16-bit silence."""
+    return np.zeros(max(0, int(rate * duration)), dtype=np.int16)
+
+
+def fade_envelope(num_samples: int, fade_fraction: float = 0.1) -> np.ndarray:
+    """Linear fade-in/fade-out envelope to avoid clicks at tone edges."""
+    envelope = np.ones(num_samples, dtype=np.float64)
+    fade = int(num_samples * fade_fraction)
+    if fade > 0:
+        ramp = np.arange(fade, dtype=np.float64) / fade
+        envelope[:fade] = ramp
+        envelope[num_samples - fade:] = ramp[::-1] + 1.0 / fade
+        np.minimum(envelope, 1.0, out=envelope)
+    return envelope
+
+
+def countdown(
+    duration: float = 3.0,
+    style: str = "tick",
+    rate: int = SAMPLE_RATE,
+) -> np.ndarray:
+    """Return a countdown clip: one faded tone at the start of every period.
+
+    All ticks are synthesized in one broadcast over a (ticks, samples) grid,
+    so cost does not grow with Python-level loops over samples or ticks.
+    """
+    if style not in COUNTDOWN_STYLES:
+        raise ValueError(f"Unknown countdown style: {style!r} (choose from {sorted(COUNTDOWN_STYLES)})")
+    spec = COUNTDOWN_STYLES[style]
+
+    period = int(rate * spec["period_sec"])
+    tick_len = min(int(rate * spec["tick_sec"]), period)
+    ticks = max(1, int(duration / spec["period_sec"]))
+
+    t = np.arange(tick_len, dtype=np.float64) / rate
+    freqs = spec["freq"] + spec["freq_step"] * np.arange(ticks, dtype=np.float64)
+    bursts = np.sin(2 * np.pi * freqs[:, None] * t[None, :])
+    bursts *= spec["amplitude"] * fade_envelope(tick_len)[None, :]
+
+    grid = np.zeros((ticks, period), dtype=np.int16)
+    grid[:, :tick_len] = _to_pcm16(bursts)
+    return grid.reshape(-1)
+
+
+def write_wav(filename: Path, samples: np.ndarray, rate: int = SAMPLE_RATE) -> str:
+    """Write mono 16-bit samples to a WAV file."""
+    filename.parent.mkdir(parents=True, exist_ok=True)
+    with wave.open(str(filename), "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(np.ascontiguousarray(samples, dtype="<i2").tobytes())
+    return str(filename)
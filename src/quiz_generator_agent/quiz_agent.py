@@ -1,24 +1,35 @@
 
 import json
-from typing import Dict, Any
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Any, List
 
 import quiz_generator_agent.config
 
-from google import genai
-from google.genai import types
-from google.adk.agents.llm_agent import Agent
 import logging
 
+from . import metrics
+from .clients import generate_content
+from .limits import stage_slot
+from .quiz_cache import get_quiz_cache, load_cached_quiz, quiz_cache_key
+from .quiz_schema import QuizValidationError, normalize_quiz, validate_quiz
+
 logger = logging.getLogger(__name__)
-client = genai.Client()
 
 
-def design_quiz(
+# Bump when the prompt or schema changes so cached quizzes are not reused.
+PROMPT_VERSION = 1
+QUIZ_MODEL = "gemini-2.5-flash-lite"
+
+
+def _quiz_prompt(
     topic: str,
-    difficulty: str = "easy",
-    num_questions: int = 3,
-) -> Dict[str, Any]:
-    """Create a multiple-choice quiz as strict JSON."""
+    difficulty: str,
+    num_questions: int,
+    subtopic: str | None = None,
+    avoid: List[str] | None = None,
+) -> str:
     prompt = f"""
 You are an educational quiz designer.
 
@@ -45,25 +56,212 @@ Do NOT include any extra text outside JSON.
 TOPIC: {topic}
 DIFFICULTY: {difficulty}
 """
+    if subtopic:
+        prompt += f"FOCUS SUBTOPIC: {subtopic}\nOnly ask about this subtopic.\n"
+    if avoid:
+        listed = "\n".join(f"- {q}" for q in avoid)
+        prompt += f"Do NOT repeat or rephrase any of these questions:\n{listed}\n"
+    return prompt
+
+
+def _repair_prompt(errors: List[str]) -> str:
+    problems = "\n".join(f"- {e}" for e in errors)
+    return (
+        "Your previous response did not match the required schema:\n"
+        f"{problems}\n"
+        "Return the corrected quiz as STRICT JSON only, following the same schema."
+    )
+
+
+def _generate_quiz(
+    topic: str,
+    difficulty: str,
+    num_questions: int,
+    subtopic: str | None = None,
+    avoid: List[str] | None = None,
+) -> Dict[str, Any]:
+    """Ask the model for a quiz, feeding schema errors back for a bounded number of repairs."""
+    from google.genai import types
+
+    max_repairs = quiz_generator_agent.config.QUIZ_MAX_REPAIRS
+    prompt = _quiz_prompt(topic, difficulty, num_questions, subtopic=subtopic, avoid=avoid)
+    contents = [types.Content(role="user", parts=[types.Part(text=prompt)])]
+
+    for attempt in range(max_repairs + 1):
+        with stage_slot("llm"), metrics.span("llm.generate_quiz", questions=num_questions, attempt=attempt):
+            resp = generate_content(
+                model=QUIZ_MODEL,
+                contents=contents,
+                config=types.GenerateContentConfig(response_mime_type="application/json"),
+            )
+        text = resp.text or ""
+
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError as e:
+            errors = [f"response is not valid JSON ({e})"]
+        else:
+            errors = validate_quiz(data, num_questions)
+
+        if not errors:
+            return normalize_quiz(data, topic, difficulty, num_questions)
+
+        logger.warning(f"Quiz for {topic!r} failed validation (attempt {attempt + 1}): {errors}")
+        metrics.incr("quiz.validation_failures")
+        contents = contents + [
+            types.Content(role="model", parts=[types.Part(text=text)]),
+            types.Content(role="user", parts=[types.Part(text=_repair_prompt(errors))]),
+        ]
+
+    raise QuizValidationError(errors)
+
+
+# Up to this many shards get fixed subtopic hints instead of a planning
+# request, which would add a serial LLM round trip before any shard starts.
+_FIXED_HINT_SHARDS = 2
+_FIXED_HINTS = ("core concepts, terms and how things work", "history, people, places and notable facts")
+
+
+def _fixed_subtopics(topic: str, count: int) -> List[str]:
+    return [f"{topic}: {hint}" for hint in _FIXED_HINTS[:count]]
+
 
-    resp = client.models.generate_content(
-        model="gemini-2.5-flash-lite",
-        contents=[types.Content(role="user", parts=[types.Part(text=prompt)])],
-        config=types.GenerateContentConfig(response_mime_type="application/json",
-            http_options=quiz_generator_agent.config.RETRY_CONFIG),
+def _plan_subtopics(topic: str, difficulty: str, count: int) -> List[str]:
+    """Ask for `count` distinct subtopics; pad with generic parts if that fails."""
+    from google.genai import types
+
+    prompt = (
+        f"List {count} distinct, non-overlapping subtopics of the TOPIC that are suitable "
+        f"for {difficulty} multiple-choice quiz questions.\n"
+        'Return STRICT JSON: {"subtopics": ["<subtopic>", ...]}\n\n'
+        f"TOPIC: {topic}\n"
     )
+    subtopics: List[str] = []
+    try:
+        with stage_slot("llm"), metrics.span("llm.plan_subtopics"):
+            resp = generate_content(
+                model=QUIZ_MODEL,
+                contents=[types.Content(role="user", parts=[types.Part(text=prompt)])],
+                config=types.GenerateContentConfig(response_mime_type="application/json"),
+            )
+        for item in json.loads(resp.text).get("subtopics", []):
+            if isinstance(item, str) and item.strip() and item.strip() not in subtopics:
+                subtopics.append(item.strip())
+    except Exception as e:
+        logger.warning(f"Subtopic planning for {topic!r} failed ({e}), using generic shards")
+
+    while len(subtopics) < count:
+        subtopics.append(f"{topic} (part {len(subtopics) + 1} of {count})")
+    return subtopics[:count]
+
+
+def _question_key(question: Dict[str, Any]) -> str:
+    return re.sub(r"[^0-9a-z]+", " ", question["question"].casefold()).strip()
+
+
+def _generate_sharded_quiz(topic: str, difficulty: str, num_questions: int) -> Dict[str, Any]:
+    """Split a large quiz into parallel per-subtopic requests and merge the results."""
+    cfg = quiz_generator_agent.config
+    shard_size = cfg.QUIZ_SHARD_SIZE
+    num_shards = -(-num_questions // shard_size)
+    sizes = [shard_size] * (num_shards - 1) + [num_questions - shard_size * (num_shards - 1)]
+    if num_shards <= _FIXED_HINT_SHARDS:
+        subtopics = _fixed_subtopics(topic, num_shards)
+    else:
+        subtopics = _plan_subtopics(topic, difficulty, num_shards)
+    logger.info(f"Generating {num_questions} questions on {topic!r} in {num_shards} shards")
+
+    with ThreadPoolExecutor(max_workers=max(1, min(num_shards, cfg.QUIZ_SHARD_CONCURRENCY))) as pool:
+        futures = [
+            metrics.submit(pool, _generate_quiz, topic, difficulty, size, subtopic)
+            for size, subtopic in zip(sizes, subtopics)
+        ]
+        shards = []
+        for subtopic, fut in zip(subtopics, futures):
+            try:
+                shards.append(fut.result())
+            except QuizValidationError as e:
+                logger.warning(f"Shard {subtopic!r} failed: {e}")
+
+    questions: List[Dict[str, Any]] = []
+    seen = set()
+
+    def merge(quiz: Dict[str, Any]) -> None:
+        for q in quiz["questions"]:
+            key = _question_key(q)
+            if key not in seen and len(questions) < num_questions:
+                seen.add(key)
+                questions.append(q)
+
+    for shard in shards:
+        merge(shard)
+
+    # One top-up round for questions lost to failed shards or duplicates.
+    missing = num_questions - len(questions)
+    if missing > 0:
+        logger.info(f"Topping up {missing} questions for {topic!r}")
+        try:
+            merge(_generate_quiz(topic, difficulty, missing, avoid=[q["question"] for q in questions]))
+        except QuizValidationError as e:
+            logger.warning(f"Top-up request failed: {e}")
+    if not questions:
+        raise QuizValidationError([f"no shard of the {num_questions}-question quiz produced valid questions"])
+    if len(questions) < num_questions:
+        logger.warning(f"Sharded quiz for {topic!r} has {len(questions)} of {num_questions} questions")
+
+    return {
+        "topic": topic,
+        "difficulty": difficulty,
+        "questions": [{**q, "id": i} for i, q in enumerate(questions, start=1)],
+    }
+
 
-    return json.loads(resp.text)
+def design_quiz(
+    topic: str,
+    difficulty: str = "easy",
+    num_questions: int = 3,
+) -> Dict[str, Any]:
+    """Create a multiple-choice quiz as strict JSON."""
+    cfg = quiz_generator_agent.config
+    if cfg.QUIZ_SHARD_SIZE > 0 and num_questions > cfg.QUIZ_SHARD_SIZE:
+        generate = _generate_sharded_quiz
+    else:
+        generate = _generate_quiz
+
+    if not cfg.QUIZ_CACHE:
+        return generate(topic, difficulty, num_questions)
+
+    cache = get_quiz_cache()
+    key = quiz_cache_key(topic, difficulty, num_questions, PROMPT_VERSION, QUIZ_MODEL)
+    cached = load_cached_quiz(cache, key)
+    if cached is not None:
+        logger.info(f"Quiz cache hit for {topic!r} ({difficulty}, {num_questions} questions)")
+        return cached
+
+    quiz = generate(topic, difficulty, num_questions)
+    cache.put_bytes(key, json.dumps(quiz, ensure_ascii=False).encode("utf-8"))
+    return quiz
+
+
+@lru_cache(maxsize=None)
+def _build_quiz_agent():
+    from google.adk.agents.llm_agent import Agent
+
+    return Agent(
+        model="gemini-2.5-flash",
+        name="quiz_designer_agent",
+        description="Designs a multiple-choice quiz for a topic.",
+        instruction=(
+            "You ONLY design quizzes.\n"
+            "When the tool 'design_quiz' is called, you MUST call it and return the JSON.\n"
+            "Do not chat with the user directly."
+        ),
+        tools=[design_quiz],
+    )
 
 
-quiz_agent = Agent(
-    model="gemini-2.5-flash",
-    name="quiz_designer_agent",
-    description="Designs a multiple-choice quiz for a topic.",
-    instruction=(
-        "You ONLY design quizzes.\n"
-        "When the tool 'design_quiz' is called, you MUST call it and return the JSON.\n"
-        "Do not chat with the user directly."
-    ),
-    tools=[design_quiz],
-)
+def __getattr__(name: str):
+    # The ADK agent is only built when the orchestrator path asks for it.
+    if name == "quiz_agent":
+        return _build_quiz_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,65 @@
+
+"""Persistent cache of validated quizzes for `design_quiz`.
+
+Keyed on the normalized request (topic, difficulty, number of questions)
+plus the prompt version and model, so popular topics skip the LLM call
+entirely until the entry expires (QUIZ_CACHE_TTL_HOURS) or is evicted.
+"""
+
+import hashlib
+import json
+import threading
+from typing import Any, Dict
+
+from .file_cache import FileCache
+
+
+def normalize_topic(topic: str) -> str:
+    return " ".join(topic.split()).casefold()
+
+
+def quiz_cache_key(
+    topic: str,
+    difficulty: str,
+    num_questions: int,
+    prompt_version: int,
+    model: str,
+) -> str:
+    payload = json.dumps(
+        [normalize_topic(topic), difficulty.strip().lower(), int(num_questions), prompt_version, model],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def load_cached_quiz(cache: FileCache, key: str) -> Dict[str, Any] | None:
+    path = cache.get(key)
+    if path is None:
+        return None
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+_cache: FileCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_quiz_cache() -> FileCache:
+    """Process-wide quiz cache configured from `quiz_generator_agent.config`."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                import quiz_generator_agent.config as cfg
+
+                _cache = FileCache(
+                    root=cfg.QUIZ_CACHE_DIR,
+                    max_bytes=int(cfg.QUIZ_CACHE_MAX_MB * 1024 * 1024),
+                    max_age_sec=cfg.QUIZ_CACHE_TTL_HOURS * 3600,
+                    suffix=".json",
+                    touch_on_hit=False,
+                    name="quiz",
+                )
+    return _cache
@@ -0,0 +1,72 @@
+
+"""Validation and normalization of quiz JSON returned by the model."""
+
+from typing import Any, Dict, List
+
+
+class QuizValidationError(ValueError):
+    """The model's quiz did not match the schema, even after repair attempts."""
+
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__("Invalid quiz JSON: " + "; ".join(errors))
+
+
+def _is_text(value: Any) -> bool:
+    return isinstance(value, str) and bool(value.strip())
+
+
+def validate_quiz(data: Any, num_questions: int) -> List[str]:
+    """Check `data` against the quiz schema in one pass; return every problem found."""
+    if not isinstance(data, dict):
+        return [f"top level must be an object, got {type(data).__name__}"]
+
+    questions = data.get("questions")
+    if not isinstance(questions, list) or not questions:
+        return ["'questions' must be a non-empty list"]
+
+    errors: List[str] = []
+    if len(questions) < num_questions:
+        errors.append(f"expected {num_questions} questions, got {len(questions)}")
+
+    for i, q in enumerate(questions):
+        where = f"questions[{i}]"
+        if not isinstance(q, dict):
+            errors.append(f"{where} must be an object")
+            continue
+        if not _is_text(q.get("question")):
+            errors.append(f"{where}.question must be a non-empty string")
+        options = q.get("options")
+        if not isinstance(options, list) or len(options) != 4 or not all(_is_text(o) for o in options):
+            errors.append(f"{where}.options must be a list of 4 non-empty strings")
+        idx = q.get("correct_option_index")
+        if isinstance(idx, bool) or not isinstance(idx, int) or not 0 <= idx <= 3:
+            errors.append(f"{where}.correct_option_index must be an integer 0-3")
+        if not _is_text(q.get("fact")):
+            errors.append(f"{where}.fact must be a non-empty string")
+
+    return errors
+
+
+def normalize_quiz(
+    data: Dict[str, Any],
+    topic: str,
+    difficulty: str,
+    num_questions: int,
+) -> Dict[str, Any]:
+    """Return a validated quiz trimmed to `num_questions`, with ids renumbered from 1."""
+    questions = []
+    for i, q in enumerate(data["questions"][:num_questions], start=1):
+        questions.append({
+            "id": i,
+            "question": q["question"].strip(),
+            "options": [str(o).strip() for o in q["options"]],
+            "correct_option_index": q["correct_option_index"],
+            "fact": q["fact"].strip(),
+        })
+
+    return {
+        "topic": data.get("topic") or topic,
+        "difficulty": data.get("difficulty") or difficulty,
+        "questions": questions,
+    }
@@ -0,0 +1,319 @@
+
+"""Run directories and the run index.
+
+`start_run(topic)` creates one directory per run under OUTPUT_DIR, named
+`<slug>_<timestamp>_<random>` so concurrent runs never share it, and makes
+the `RunContext` current for every stage of the run: quiz and storyboard
+JSON, voiceovers, segments and the final video all land in that directory.
+Like metrics, the active run is held in a ContextVar; thread-pool work
+submitted with `metrics.submit` sees the same run.
+
+Each run is recorded in a SQLite index (RUN_INDEX_PATH) when it starts and
+when it finishes, so old runs can be listed and garbage-collected without
+scanning OUTPUT_DIR:
+
+    quiz-generator-runs list --limit 20
+    quiz-generator-runs gc --older-than-days 14 --keep 50
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import secrets
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+import quiz_generator_agent.config
+
+logger = logging.getLogger(__name__)
+
+_current: ContextVar["RunContext | None"] = ContextVar("quiz_run", default=None)
+
+
+def slugify(text: str) -> str:
+    slug = re.sub(r"[^a-zA-Z0-9]+", "_", text.strip().lower())
+    return slug.strip("_") or "quiz"
+
+
+def atomic_write_text(path: Path, text: str) -> Path:
+    """Write `text` to `path` via a temp file, so readers never see a partial file."""
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+    return path
+
+
+class RunContext:
+    def __init__(self, run_id: str, topic: str, run_dir: Path):
+        self.run_id = run_id
+        self.topic = topic
+        self.run_dir = run_dir
+        self.created_at = time.time()
+        self.final_video: str | None = None
+
+    def path(self, name: str) -> Path:
+        return self.run_dir / name
+
+    def write_json(self, name: str, data: Any) -> Path:
+        return atomic_write_text(self.path(name), json.dumps(data, indent=2, ensure_ascii=False))
+
+
+def new_run(topic: str, base_dir: Path | None = None) -> RunContext:
+    """Create a fresh, uniquely named run directory."""
+    # Absolute, so the index still points at it from another working directory.
+    base_dir = Path(base_dir or quiz_generator_agent.config.OUTPUT_DIR).resolve()
+    base_dir.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    while True:
+        run_id = f"{slugify(topic)}_{stamp}_{secrets.token_hex(3)}"
+        run_dir = base_dir / run_id
+        try:
+            run_dir.mkdir()
+        except FileExistsError:
+            continue
+        return RunContext(run_id, topic, run_dir)
+
+
+def current() -> RunContext | None:
+    return _current.get()
+
+
+@contextmanager
+def start_run(
+    topic: str,
+    difficulty: str | None = None,
+    num_questions: int | None = None,
+) -> Iterator[RunContext]:
+    """Create a run, make it current, and record its start and outcome in the index."""
+    run = new_run(topic)
+    index = get_run_index()
+    index.record_start(run, difficulty, num_questions)
+    token = _current.set(run)
+    status = "failed"
+    try:
+        yield run
+        status = "ok"
+    finally:
+        _current.reset(token)
+        index.record_finish(run, status)
+
+
+class RunIndex:
+    """SQLite table of runs: one row per run directory.
+
+    Every call opens its own short-lived connection, so the index can be
+    shared by threads, batch workers and the web UI. Index errors are logged
+    and never fail a run.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _ensure_schema(self) -> None:
+        if self._initialized:
+            return
+        with self._init_lock:
+            if self._initialized:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self._connect() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS runs (
+                        run_id TEXT PRIMARY KEY,
+                        topic TEXT,
+                        difficulty TEXT,
+                        num_questions INTEGER,
+                        run_dir TEXT NOT NULL,
+                        status TEXT NOT NULL,
+                        created_at REAL NOT NULL,
+                        finished_at REAL,
+                        final_video TEXT
+                    )
+                    """
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS runs_created_at ON runs (created_at)")
+            self._initialized = True
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        self._ensure_schema()
+        with self._connect() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def record_start(self, run: RunContext, difficulty: str | None = None, num_questions: int | None = None) -> None:
+        try:
+            self._execute(
+                "INSERT OR REPLACE INTO runs (run_id, topic, difficulty, num_questions, run_dir, status, created_at)"
+                " VALUES (?, ?, ?, ?, ?, 'running', ?)",
+                (run.run_id, run.topic, difficulty, num_questions, str(run.run_dir), run.created_at),
+            )
+        except sqlite3.Error as e:
+            # Recreate the schema next time in case the index file was removed.
+            self._initialized = False
+            logger.warning(f"Could not record run {run.run_id} in {self.path}: {e}")
+
+    def record_finish(self, run: RunContext, status: str) -> None:
+        try:
+            self._execute(
+                "UPDATE runs SET status = ?, finished_at = ?, final_video = ? WHERE run_id = ?",
+                (status, time.time(), run.final_video, run.run_id),
+            )
+        except sqlite3.Error as e:
+            # Recreate the schema next time in case the index file was removed.
+            self._initialized = False
+            logger.warning(f"Could not record run {run.run_id} in {self.path}: {e}")
+
+    def list_runs(
+        self,
+        limit: int | None = None,
+        status: str | None = None,
+        topic: str | None = None,
+    ) -> List[Dict[str, Any]]:
+        """Runs newest first, optionally filtered by status or topic substring."""
+        sql, params = "SELECT * FROM runs WHERE 1=1", []
+        if status:
+            sql += " AND status = ?"
+            params.append(status)
+        if topic:
+            sql += " AND topic LIKE ?"
+            params.append(f"%{topic}%")
+        sql += " ORDER BY created_at DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [dict(row) for row in self._execute(sql, tuple(params))]
+
+    def gc(
+        self,
+        older_than_days: float | None = None,
+        keep: int = 0,
+        dry_run: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """Delete finished runs older than `older_than_days`, keeping the newest `keep`.
+
+        Removes each run's directory and index row; returns the runs removed
+        (or that would be removed, with `dry_run`). A run still marked
+        'running' is only collected once it is older than `older_than_days`:
+        by then the process that started it has crashed or been killed.
+        """
+        sql = "SELECT * FROM runs WHERE run_id NOT IN (SELECT run_id FROM runs ORDER BY created_at DESC LIMIT ?)"
+        params: List[Any] = [max(0, keep)]
+        if older_than_days is None:
+            sql += " AND status != 'running'"
+        else:
+            sql += " AND created_at < ?"
+            params.append(time.time() - older_than_days * 86400)
+        sql += " ORDER BY created_at"
+        victims = [dict(row) for row in self._execute(sql, tuple(params))]
+        if dry_run:
+            return victims
+
+        for run in victims:
+            shutil.rmtree(run["run_dir"], ignore_errors=True)
+            self._execute("DELETE FROM runs WHERE run_id = ?", (run["run_id"],))
+        if victims:
+            logger.info(f"Removed {len(victims)} runs from {self.path.parent}")
+        return victims
+
+    def reindex(self, base_dir: Path) -> int:
+        """Add run directories from before the index existed; returns how many."""
+        known = {row["run_dir"] for row in self._execute("SELECT run_dir FROM runs")}
+        added = 0
+        for run_dir in Path(base_dir).resolve().iterdir():
+            if str(run_dir) in known or not (run_dir / "quiz.json").is_file():
+                continue
+            final_video = run_dir / "quiz_video_local.mp4"
+            self._execute(
+                "INSERT OR IGNORE INTO runs (run_id, topic, run_dir, status, created_at, final_video)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    run_dir.name,
+                    run_dir.name,
+                    str(run_dir),
+                    "ok" if final_video.is_file() else "unknown",
+                    run_dir.stat().st_mtime,
+                    str(final_video) if final_video.is_file() else None,
+                ),
+            )
+            added += 1
+        return added
+
+
+_index: RunIndex | None = None
+_index_lock = threading.Lock()
+
+
+def get_run_index() -> RunIndex:
+    """Process-wide run index at RUN_INDEX_PATH."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = RunIndex(quiz_generator_agent.config.RUN_INDEX_PATH)
+    return _index
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="List and garbage-collect quiz video runs.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    list_cmd = sub.add_parser("list", help="show recent runs")
+    list_cmd.add_argument("--limit", type=int, default=20)
+    list_cmd.add_argument("--status", default=None, help="ok, failed or running")
+    list_cmd.add_argument("--topic", default=None, help="substring of the topic")
+
+    gc_cmd = sub.add_parser("gc", help="delete old runs and their directories")
+    gc_cmd.add_argument("--older-than-days", type=float, default=30)
+    gc_cmd.add_argument("--keep", type=int, default=0, help="always keep the newest N runs")
+    gc_cmd.add_argument("--dry-run", action="store_true")
+
+    sub.add_parser("reindex", help="add run directories created before the index existed")
+
+    args = parser.parse_args()
+    index = get_run_index()
+
+    if args.command == "list":
+        for run in index.list_runs(limit=args.limit, status=args.status, topic=args.topic):
+            created = datetime.fromtimestamp(run["created_at"]).strftime("%Y-%m-%d %H:%M:%S")
+            print(f"{created}  {run['status']:<8} {run['run_id']}  {run['final_video'] or '-'}")
+    elif args.command == "gc":
+        removed = index.gc(older_than_days=args.older_than_days, keep=args.keep, dry_run=args.dry_run)
+        verb = "Would remove" if args.dry_run else "Removed"
+        print(f"{verb} {len(removed)} runs")
+        for run in removed:
+            print(f"  {run['run_dir']}")
+    else:
+        added = index.reindex(quiz_generator_agent.config.OUTPUT_DIR)
+        print(f"Indexed {added} existing run directories")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+
+"""Persistent store of encoded scene segments for incremental re-renders.
+
+Each scene is fingerprinted from everything that affects its encoded
+segment: the scene fields (text, voiceover, duration, type) plus the render
+style (resolution, font, colours, renderer, encoder settings, voice). A
+re-render only encodes scenes whose fingerprint is not already in the store,
+then stitches the video by stream copy, so fixing a typo in one `fact`
+re-renders one scene instead of the whole quiz. Scenes whose narration fell
+back to silence are not stored, so they get TTS again on the next render.
+"""
+
+import hashlib
+import json
+import threading
+from typing import Any, Dict
+
+from .file_cache import FileCache
+
+
+def scene_fingerprint(scene: Dict[str, Any], style: Dict[str, Any]) -> str:
+    payload = {
+        "text": scene.get("text", ""),
+        "voiceover": scene.get("voiceover", ""),
+        "duration_sec": scene.get("duration_sec", 4),
+        "type": scene.get("type", "generic"),
+        "style": style,
+    }
+    blob = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+_cache: FileCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_segment_cache() -> FileCache:
+    """Process-wide segment store configured from `quiz_generator_agent.config`."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                import quiz_generator_agent.config as cfg
+
+                _cache = FileCache(
+                    root=cfg.SEGMENT_CACHE_DIR,
+                    max_bytes=int(cfg.SEGMENT_CACHE_MAX_MB * 1024 * 1024),
+                    max_age_sec=cfg.SEGMENT_CACHE_MAX_AGE_DAYS * 86400,
+                    suffix=".mp4",
+                    name="segment",
+                )
+    return _cache
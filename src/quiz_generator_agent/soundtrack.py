@@ -0,0 +1,104 @@
+
+"""Assemble a whole video's audio into one soundtrack WAV.
+
+The WAV is created at its final length and memory-mapped; each scene's
+voiceover is decoded once and copied to that scene's offset, trimmed to
+its `duration_sec`, and the silence in between is simply never written.
+Memory stays flat however long the quiz is, and the result is muxed with
+the video in a single encode.
+
+The soundtrack uses the format our voiceovers are already in (Gemini TTS
+and the procedural timer sounds are 24 kHz mono 16-bit), so they are read
+directly with no resampling; the final AAC encode converts the rate once.
+Files in any other format are decoded with ffmpeg.
+"""
+
+import struct
+import wave
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+from .encoding import decode_audio
+from .procedural_audio import SAMPLE_RATE as SOUNDTRACK_RATE
+
+SOUNDTRACK_CHANNELS = 1
+_SAMPLE_WIDTH = 2
+_WAV_HEADER_BYTES = 44
+
+
+def scene_offsets(scenes: List[Dict[str, Any]], rate: int) -> List[int]:
+    """Start sample of every scene plus the total, rounded cumulatively.
+
+    Rounding the running total (not each duration) keeps audio and video
+    scene boundaries from drifting apart over a long quiz.
+    """
+    offsets, elapsed = [0], 0.0
+    for scene in scenes:
+        elapsed += scene.get("duration_sec", 4)
+        offsets.append(round(elapsed * rate))
+    return offsets
+
+
+def _wav_header(n_frames: int) -> bytes:
+    block_align = SOUNDTRACK_CHANNELS * _SAMPLE_WIDTH
+    data_bytes = n_frames * block_align
+    return b"".join([
+        b"RIFF", struct.pack("<I", 36 + data_bytes), b"WAVE",
+        b"fmt ", struct.pack(
+            "<IHHIIHH", 16, 1, SOUNDTRACK_CHANNELS, SOUNDTRACK_RATE,
+            SOUNDTRACK_RATE * block_align, block_align, _SAMPLE_WIDTH * 8,
+        ),
+        b"data", struct.pack("<I", data_bytes),
+    ])
+
+
+def read_pcm(audio_path: str, max_frames: int) -> np.ndarray:
+    """Up to `max_frames` of `audio_path` as int16 samples in the soundtrack format."""
+    try:
+        with wave.open(str(audio_path), "rb") as wf:
+            if (wf.getframerate(), wf.getnchannels(), wf.getsampwidth()) == (
+                SOUNDTRACK_RATE, SOUNDTRACK_CHANNELS, _SAMPLE_WIDTH,
+            ):
+                return np.frombuffer(wf.readframes(max_frames), dtype="<i2")
+    except (wave.Error, EOFError):
+        pass  # Not a plain PCM WAV; let ffmpeg handle it.
+
+    pcm = decode_audio(
+        audio_path,
+        duration=max_frames / SOUNDTRACK_RATE,
+        rate=SOUNDTRACK_RATE,
+        channels=SOUNDTRACK_CHANNELS,
+    )
+    return np.frombuffer(pcm, dtype="<i2")[:max_frames * SOUNDTRACK_CHANNELS]
+
+
+def write_soundtrack(
+    scenes: List[Dict[str, Any]],
+    audio_paths: Dict[int, str],
+    path: Path,
+) -> Path:
+    """Write every scene's audio at its offset into one WAV at `path`."""
+    offsets = scene_offsets(scenes, SOUNDTRACK_RATE)
+    total = offsets[-1]
+
+    with open(path, "wb") as f:
+        f.write(_wav_header(total))
+        # Extending the file leaves a zero-filled (silent, sparse) data chunk.
+        f.truncate(_WAV_HEADER_BYTES + total * SOUNDTRACK_CHANNELS * _SAMPLE_WIDTH)
+    if total == 0:
+        return path
+
+    buffer = np.memmap(path, dtype="<i2", mode="r+", offset=_WAV_HEADER_BYTES, shape=(total * SOUNDTRACK_CHANNELS,))
+    try:
+        for idx, audio_path in audio_paths.items():
+            if not audio_path:
+                continue
+            start, end = offsets[idx], offsets[idx + 1]
+            samples = read_pcm(audio_path, end - start)
+            buffer[start * SOUNDTRACK_CHANNELS:start * SOUNDTRACK_CHANNELS + len(samples)] = samples
+        buffer.flush()
+    finally:
+        del buffer
+    return path
@@ -1,66 +1,78 @@
 
+from functools import lru_cache
 from typing import Dict, Any, List
 
-from google.adk.agents.llm_agent import Agent
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-def build_storyboard(quiz: Dict[str, Any]) -> Dict[str, Any]:
-    """Convert quiz JSON into a storyboard of scenes."""
-    topic = quiz.get("topic", "General Knowledge")
-    scenes: List[Dict[str, Any]] = []
-
-    scenes.append({
+def intro_scenes(topic: str) -> List[Dict[str, Any]]:
+    """Opening scene; depends only on the topic."""
+    return [{
         "type": "intro",
         "duration_sec": 4,
         "text": f"Quiz Time! {topic}",
         "voiceover": f"Welcome to a quick quiz on {topic}.",
-    })
+    }]
 
-    for i, q in enumerate(quiz["questions"], start=1):
-        options = q["options"]
-        options_text = "\n".join(
-            f"{chr(ord('A') + idx)}) {opt}" for idx, opt in enumerate(options)
-        )
-        answer = options[q["correct_option_index"]]
-        fact = q["fact"]
-
-        scenes.append({
+
+def question_scenes(number: int, q: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Question, countdown, answer and fun-fact scenes for question `number`."""
+    options = q["options"]
+    options_text = "\n".join(
+        f"{chr(ord('A') + idx)}) {opt}" for idx, opt in enumerate(options)
+    )
+    answer = options[q["correct_option_index"]]
+    fact = q["fact"]
+
+    return [
+        {
             "type": "question",
             "duration_sec": 6,
-            "text": f"Question {i}:\n{q['question']}\n\n{options_text}",
+            "text": f"Question {number}:\n{q['question']}\n\n{options_text}",
             "voiceover": q["question"],
-        })
-
-        scenes.append({
+        },
+        {
             "type": "question_with_timer",
             "duration_sec": 4,
-            "text": f"Question {i}:\n{q['question']}\n\n{options_text}",
+            "text": f"Question {number}:\n{q['question']}\n\n{options_text}",
             "voiceover": "TIMER_COUNTDOWN",
-        })
-
-        scenes.append({
+        },
+        {
             "type": "answer",
             "duration_sec": 4,
             "text": f"Answer: {answer}",
             "voiceover": f"The correct answer is {answer}.",
-        })
-
-        scenes.append({
+        },
+        {
             "type": "fact",
             "duration_sec": 4,
             "text": f"Fun fact: {fact}",
             "voiceover": f"Fun fact: {fact}.",
-        })
+        },
+    ]
+
 
-    scenes.append({
+def outro_scenes() -> List[Dict[str, Any]]:
+    """Closing scene; independent of the quiz."""
+    return [{
         "type": "thanks",
         "duration_sec": 4,
         "text": "Thanks for watching! 🎉",
         "voiceover": "Thanks for watching this quiz. See you next time!",
-    })
+    }]
+
+
+def build_storyboard(quiz: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert quiz JSON into a storyboard of scenes."""
+    topic = quiz.get("topic", "General Knowledge")
+    scenes: List[Dict[str, Any]] = []
+
+    scenes.extend(intro_scenes(topic))
+    for i, q in enumerate(quiz["questions"], start=1):
+        scenes.extend(question_scenes(i, q))
+    scenes.extend(outro_scenes())
 
     return {
         "topic": topic,
@@ -68,13 +80,24 @@ def build_storyboard(quiz: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
-storyboard_agent = Agent(
-    model="gemini-2.5-flash-lite",
-    name="storyboard_agent",
-    description="Turns quiz JSON into a storyboard of scenes.",
-    instruction=(
-        "You convert quiz JSON into a storyboard.\n"
-        "Use the 'build_storyboard' tool. Do not redesign the quiz."
-    ),
-    tools=[build_storyboard],
-)
+@lru_cache(maxsize=None)
+def _build_storyboard_agent():
+    from google.adk.agents.llm_agent import Agent
+
+    return Agent(
+        model="gemini-2.5-flash-lite",
+        name="storyboard_agent",
+        description="Turns quiz JSON into a storyboard of scenes.",
+        instruction=(
+            "You convert quiz JSON into a storyboard.\n"
+            "Use the 'build_storyboard' tool. Do not redesign the quiz."
+        ),
+        tools=[build_storyboard],
+    )
+
+
+def __getattr__(name: str):
+    # The ADK agent is only built when the orchestrator path asks for it.
+    if name == "storyboard_agent":
+        return _build_storyboard_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
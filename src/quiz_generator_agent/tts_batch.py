@@ -0,0 +1,129 @@
+
+"""Pack several short voiceover lines into one TTS request and split the result.
+
+Most storyboard voiceovers are a handful of words, so per-request overhead
+and the rate limit dominate their cost. `plan_batches` groups short lines,
+`batch_prompt` asks the model to read them in order with a long pause after
+each, and `split_utterances` cuts the returned PCM back apart at the
+longest silences.
+
+The split is only trusted when it is unambiguous: there must be a clear
+gap for every boundary, noticeably longer than any pause left inside a
+line, and every piece must be roughly as long as its word count predicts.
+Otherwise `split_utterances` returns None and the caller falls back to one
+request per line.
+"""
+
+from typing import List, Tuple
+
+import numpy as np
+
+# Analysis window for silence detection.
+_WINDOW_SEC = 0.02
+# Anything quieter than this (16-bit RMS) is silence, whatever the level.
+_SILENCE_FLOOR = 300.0
+# ...and so is anything below this fraction of the loud end of the batch.
+_SILENCE_RELATIVE = 0.06
+# Boundary gaps must be this much longer than the longest gap kept inside a line.
+_GAP_MARGIN = 1.25
+# A piece may be this far off the length its word count predicts.
+_DURATION_TOLERANCE = (0.4, 2.5)
+# Silence kept before and after each split line.
+_PAD_SEC = 0.15
+
+
+def _words(text: str) -> int:
+    return max(1, len(text.split()))
+
+
+def plan_batches(texts: List[str], max_lines: int, max_words: int) -> List[List[str]]:
+    """Group lines of at most `max_words` words into batches of up to `max_lines`.
+
+    Long lines, and a short line that would end up alone in a batch, are
+    left out for individual requests.
+    """
+    short = [t for t in texts if _words(t) <= max_words]
+    batches = [short[i:i + max_lines] for i in range(0, len(short), max_lines)]
+    if batches and len(batches[-1]) == 1:
+        batches.pop()
+    return batches
+
+
+def batch_prompt(texts: List[str]) -> str:
+    return (
+        "Read each of the following lines exactly as written, in order, "
+        "with a two second pause after each line:\n\n" + "\n\n".join(texts)
+    )
+
+
+def _silent_runs(samples: np.ndarray, rate: int) -> Tuple[List[Tuple[int, int]], np.ndarray]:
+    """Runs of silent windows as (start, end) window indices, plus the mask."""
+    window = max(1, int(rate * _WINDOW_SEC))
+    n = len(samples) // window
+    frames = samples[:n * window].astype(np.float32).reshape(n, window)
+    rms = np.sqrt((frames ** 2).mean(axis=1))
+    threshold = max(_SILENCE_FLOOR, _SILENCE_RELATIVE * float(np.percentile(rms, 95)))
+    silent = rms < threshold
+
+    runs, start = [], None
+    for i, s in enumerate(silent):
+        if s and start is None:
+            start = i
+        elif not s and start is not None:
+            runs.append((start, i))
+            start = None
+    if start is not None:
+        runs.append((start, n))
+    return runs, silent
+
+
+def split_utterances(pcm: bytes, texts: List[str], rate: int, min_gap_sec: float) -> List[bytes] | None:
+    """Split 16-bit mono `pcm` into one piece per line of `texts`, or None if ambiguous."""
+    samples = np.frombuffer(pcm[:len(pcm) // 2 * 2], dtype="<i2")
+    window = max(1, int(rate * _WINDOW_SEC))
+    if len(samples) < window or len(texts) < 2:
+        return None
+
+    runs, silent = _silent_runs(samples, rate)
+    n_windows = len(silent)
+    # Leading and trailing silence never separates two lines.
+    inner = [(s, e) for s, e in runs if s > 0 and e < n_windows]
+    gaps = sorted(inner, key=lambda r: r[1] - r[0], reverse=True)
+    needed = len(texts) - 1
+    min_gap = min_gap_sec / _WINDOW_SEC
+    if len(gaps) < needed or gaps[needed - 1][1] - gaps[needed - 1][0] < min_gap:
+        return None
+    if len(gaps) > needed and (gaps[needed - 1][1] - gaps[needed - 1][0]) < _GAP_MARGIN * (gaps[needed][1] - gaps[needed][0]):
+        return None
+
+    boundaries = sorted(gaps[:needed])
+    pieces: List[Tuple[int, int]] = []
+    start = 0
+    for gap_start, gap_end in boundaries:
+        pieces.append((start, gap_start))
+        start = gap_end
+    pieces.append((start, n_windows))
+
+    # Trim each piece to its voiced part.
+    voiced = []
+    for s, e in pieces:
+        loud = np.flatnonzero(~silent[s:e])
+        if not len(loud):
+            return None
+        voiced.append((s + loud[0], s + loud[-1] + 1))
+
+    total_words = sum(_words(t) for t in texts)
+    total_voiced = sum(e - s for s, e in voiced)
+    low, high = _DURATION_TOLERANCE
+    for (s, e), text in zip(voiced, texts):
+        expected = total_voiced * _words(text) / total_words
+        if not low <= (e - s) / expected <= high:
+            return None
+
+    pad = int(_PAD_SEC * rate)
+    out = []
+    for s, e in voiced:
+        a = max(0, s * window - pad)
+        b = min(len(samples), e * window + pad)
+        out.append(samples[a:b].tobytes())
+    return out
@@ -1,29 +1,60 @@
 
 import quiz_generator_agent.config
 
+import asyncio
 import gradio as gr
-from typing import Tuple, Dict, Any
-import json
+from typing import Tuple, Dict, Any, AsyncIterator
 
-from .main import orchestrate_quiz_video
-from .orchestrator_agent import orchestrator_agent
+from .jobs import Job, QueueFull, get_job_manager
 
+# How often a waiting page checks its job for new progress.
+_POLL_SEC = 0.5
 
-def run_quiz_generator_agent(
+
+def _submit(topic: str, num_questions: int, difficulty: str) -> Job:
+    if not topic.strip():
+        raise gr.Error("Please enter a topic.")
+    try:
+        return get_job_manager().submit(topic, difficulty, int(num_questions))
+    except QueueFull:
+        raise gr.Error("Too many quiz videos are being generated right now. Please try again in a few minutes.")
+
+
+def _progress_markdown(snap: Dict[str, Any]) -> str:
+    lines = [f"⏳ {snap['stage']}… ({snap['elapsed_sec']:.0f}s)"]
+    lines += [f"- {label}: {count}" for label, count in snap["counts"].items()]
+    return "\n".join(lines)
+
+
+async def _watch(job: Job) -> AsyncIterator[Dict[str, Any]]:
+    """Yield a snapshot of `job` whenever it changes, until it finishes.
+
+    The render runs on the job manager's threads; this only polls, so a
+    waiting page costs the web server nothing but a timer.
+    """
+    seen = -1
+    while True:
+        snap = job.snapshot()
+        if snap["status"] in ("done", "failed"):
+            if snap["status"] == "failed":
+                raise gr.Error(f"Quiz video generation failed: {snap['error']}")
+            return
+        if snap["version"] != seen:
+            seen = snap["version"]
+            yield snap
+        await asyncio.sleep(_POLL_SEC)
+
+
+async def run_quiz_generator_agent(
     topic: str,
     num_questions: int,
     difficulty: str,
-) -> Tuple[str, Dict[str, Any], str]:
-    if not topic.strip():
-        raise gr.Error("Please enter a topic.")
-
-    result = orchestrate_quiz_video(
-        topic=topic,
-        difficulty=difficulty,
-        num_questions=num_questions,
-        debug=True,
-    )
+) -> AsyncIterator[Tuple[Any, Any, str]]:
+    job = _submit(topic, num_questions, difficulty)
+    async for snap in _watch(job):
+        yield gr.update(), gr.update(), _progress_markdown(snap)
 
+    result = job.result
     final_path = result["final_video"]
     storyboard = result["storyboard"]
     topic_out = result["topic"]
@@ -38,26 +69,24 @@ def run_quiz_generator_agent(
         f"📂 Output directory: `{output_dir}`",
         f"🎬 Final video: `{final_path}`",
     ]
+    if job.cached:
+        summary_lines.append("♻️ Reused a video generated earlier for the same request")
 
-    return final_path, storyboard, "\n".join(summary_lines)
+    yield final_path, storyboard, "\n".join(summary_lines)
 
 
-def run_orchestrator_flow(
+async def run_orchestrator_flow(
     topic: str,
     num_questions: int,
     difficulty: str,
-):
-    if not topic.strip():
-        raise gr.Error("Please enter a topic.")
-
+) -> AsyncIterator[Tuple[Any, str]]:
     # For now, use the direct orchestration function
     # TODO: Implement proper ADK agent invocation when API stabilizes
-    result = orchestrate_quiz_video(
-        topic=topic,
-        difficulty=difficulty,
-        num_questions=num_questions,
-        debug=True,
-    )
+    job = _submit(topic, num_questions, difficulty)
+    async for snap in _watch(job):
+        yield gr.update(), _progress_markdown(snap)
+
+    result = job.result
 
     final_video = result["final_video"]
     output_dir = result["output_dir"]
@@ -73,8 +102,10 @@ def run_orchestrator_flow(
         f"📂 Output directory: `{output_dir}`",
         f"🎬 Final video: `{final_video}`",
     ]
+    if job.cached:
+        summary_lines.append("♻️ Reused a video generated earlier for the same request")
 
-    return final_video, "\n".join(summary_lines)
+    yield final_video, "\n".join(summary_lines)
 
 
 def create_interface() -> gr.Blocks:
@@ -124,6 +155,8 @@ def create_interface() -> gr.Blocks:
             fn=run_quiz_generator_agent,
             inputs=[topic, num_questions, difficulty],
             outputs=[final_video, storyboard_json, summary],
+            # Handlers only watch background jobs, so they need no limit of their own.
+            concurrency_limit=None,
         )
 
         gr.Markdown("""---\n### Orchestrator Agent Flow""")
@@ -137,6 +170,7 @@ def create_interface() -> gr.Blocks:
             fn=run_orchestrator_flow,
             inputs=[topic, num_questions, difficulty],
             outputs=[orch_video, orch_summary],
+            concurrency_limit=None,
         )
 
     return demo
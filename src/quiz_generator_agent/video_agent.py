@@ -1,63 +1,55 @@
 
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from fractions import Fraction
 from pathlib import Path
-from typing import Dict, Any, List
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, Any, List, Tuple
+
+import numpy as np
+from PIL import Image
 
 import quiz_generator_agent.config
 
-from moviepy import (
-    ColorClip,
-    TextClip,
-    CompositeVideoClip,
-    concatenate_videoclips,
-    AudioFileClip,
-)
-from google.adk.agents.llm_agent import Agent
 import logging
 
+# MoviePy is imported where it is used: it is slow to import and the segment
+# renderers only need it for caption layout.
+if TYPE_CHECKING:
+    from moviepy import ImageClip
+
 logger = logging.getLogger(__name__)
 
-from .audio_agent import synthesize_audio
+from . import metrics, runs
+from .audio_agent import is_silent_fallback, prefetch_audio
+from .encoding import (
+    encoder_settings,
+    format_settings,
+    moviepy_write_args,
+    encode_still_segment,
+    mux_segment_audio,
+    concat_segments,
+    encode_slideshow,
+    frame_pipe,
+    output_format,
+)
+from .frame_cache import get_frame_cache, hit_rate
+from .fonts import resolve_font
+from .limits import stage_slot
+from .segment_cache import get_segment_cache, scene_fingerprint
+from .soundtrack import write_soundtrack
 
 
-W, H = 1280, 720
+W, H = quiz_generator_agent.config.VIDEO_WIDTH, quiz_generator_agent.config.VIDEO_HEIGHT
 
 
 def _get_available_font():
-    """Get an available font that works across different operating systems."""
-    import os
-    from moviepy import TextClip
-
-    # Try different font options in order of preference
-    font_options = [
-        # macOS fonts
-        "/System/Library/Fonts/Helvetica.ttc",
-        "/System/Library/Fonts/Arial.ttf",
-        "/Library/Fonts/Arial.ttf",
-        # Linux fonts (common)
-        "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
-        "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
-        "/usr/share/fonts/truetype/freefont/FreeSans.ttf",
-        # Windows fonts
-        "C:\\Windows\\Fonts\\arial.ttf",
-        "C:\\Windows\\Fonts\\calibri.ttf",
-        # Fallback - let MoviePy try to find a default
-        None
-    ]
-
-    for font in font_options:
-        try:
-            if font is None:
-                # Let MoviePy use its default
-                TextClip(text="test", font_size=24)
-                return None
-            elif os.path.exists(font):
-                TextClip(text="test", font=font, font_size=24)
-                return font
-        except:
-            continue
+    """Get an available font that works across different operating systems.
 
-    # If nothing works, return None and let MoviePy handle it
-    return None
+    Resolved once per process by the font registry; see `fonts.resolve_font`.
+    """
+    return resolve_font()
 
 
 def _scene_bg_color(scene_type: str):
@@ -73,111 +65,664 @@ def _scene_bg_color(scene_type: str):
     return colors.get(scene_type, colors["generic"])
 
 
-def _render_scene(
-    scene: Dict[str, Any],
-    scene_index: int,
-    audio_dir: Path,
-) -> CompositeVideoClip:
-    text = scene.get("text", "")
-    duration = scene.get("duration_sec", 4)
-    scene_type = scene.get("type", "generic")
-    voiceover = scene.get("voiceover", "")
-
-    bg_color = _scene_bg_color(scene_type)
-    bg = ColorClip(size=(W, H), color=bg_color, duration=duration)
+def _render_caption(text: str, caption_size: Tuple[int, int]) -> np.ndarray:
+    """Lay out a scene caption as an RGBA layer, via the frame cache.
 
+    Repeated captions (e.g. `question` / `question_with_timer`) are laid out
+    only once, whatever background they end up on.
+    """
     # Use the available font
     available_font = _get_available_font()
 
+    cache = get_frame_cache()
+    key = cache.key(
+        text=text,
+        font=available_font,
+        font_size=48,
+        size=caption_size,
+        color="white",
+    )
+    layer = cache.get(key)
+    if layer is not None:
+        return layer
+
+    from moviepy import TextClip
+
     txt = TextClip(
         text=text,
         font_size=48,
         font=available_font,
         color="white",
         method="caption",
-        size=(int(W * 0.9), int(H * 0.8)),
-    ).with_duration(duration).with_position("center")
+        size=caption_size,
+    )
+    try:
+        rgb = txt.get_frame(0)
+        alpha = txt.mask.get_frame(0) if txt.mask is not None else np.ones(rgb.shape[:2])
+    finally:
+        txt.close()
+
+    layer = np.dstack([rgb, (alpha * 255).round()]).astype(np.uint8)
+    cache.put(key, layer)
+    return layer
+
+
+def _rasterize_scene(scene: Dict[str, Any], size: Tuple[int, int] | None = None) -> np.ndarray:
+    """Composite a scene's background and caption once into an RGB frame (default W x H)."""
+    width, height = size or (W, H)
+    scene_type = scene.get("type", "generic")
+    caption = _render_caption(scene.get("text", ""), (int(width * 0.9), int(height * 0.8)))
+
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    frame[:] = _scene_bg_color(scene_type)
+
+    h, w = caption.shape[:2]
+    x, y = (width - w) // 2, (height - h) // 2
+    region = frame[y:y + h, x:x + w]
+    alpha = caption[..., 3:4].astype(np.float32) / 255
+    region[:] = (caption[..., :3] * alpha + region * (1 - alpha)).round()
+    return frame
+
+
+def _build_scene_visual(scene: Dict[str, Any]) -> "ImageClip":
+    from moviepy import ImageClip
+
+    duration = scene.get("duration_sec", 4)
+    return ImageClip(_rasterize_scene(scene)).with_duration(duration)
+
+
+def _render_scene(scene: Dict[str, Any], scene_index: int) -> "ImageClip":
+    # Audio is not attached per scene; it goes into one soundtrack (soundtrack.py).
+    with metrics.span("render_scene", scene_index=scene_index):
+        return _build_scene_visual(scene)
+
+
+def _render_scene_still(
+    scene: Dict[str, Any],
+    scene_id: str,
+    segment_dir: Path,
+    audio_path: str | None,
+    settings: Dict[str, Any] | None = None,
+) -> Path:
+    """Encode a scene as a still-image MP4 segment with its voiceover."""
+    segment_dir.mkdir(parents=True, exist_ok=True)
+
+    frame_path = segment_dir / f"{scene_id}.png"
+    with metrics.span("rasterize_scene", scene_id=scene_id):
+        Image.fromarray(_rasterize_scene(scene)).save(frame_path)
+
+    with metrics.span("encode_segment", scene_id=scene_id, renderer="still"):
+        return encode_still_segment(
+            frame_path,
+            audio_path,
+            duration=scene.get("duration_sec", 4),
+            output_path=segment_dir / f"{scene_id}.mp4",
+            settings=settings,
+        )
 
-    clip = CompositeVideoClip([bg, txt])
 
-    if voiceover:
-        scene_id = f"scene_{scene_index:03d}"
-        audio_path = synthesize_audio(
-            text=voiceover,
-            output_dir=str(audio_dir),
-            scene_id=scene_id,
+def _render_scene_composed(
+    scene: Dict[str, Any],
+    scene_id: str,
+    segment_dir: Path,
+    audio_path: str | None,
+    settings: Dict[str, Any] | None = None,
+) -> Path:
+    """Encode a scene through MoviePy into its own MP4 segment."""
+    settings = settings or encoder_settings()
+    segment_dir.mkdir(parents=True, exist_ok=True)
+
+    video_only = segment_dir / f"{scene_id}.video.mp4"
+    with metrics.span("encode_segment", scene_id=scene_id, renderer="compose"):
+        visual = _build_scene_visual(scene)
+        try:
+            visual.write_videofile(
+                str(video_only),
+                **moviepy_write_args(settings),
+                audio=False,
+                logger=None,
+            )
+        finally:
+            visual.close()
+
+    with metrics.span("mux_segment_audio", scene_id=scene_id):
+        segment = mux_segment_audio(
+            video_only,
+            audio_path,
+            duration=scene.get("duration_sec", 4),
+            output_path=segment_dir / f"{scene_id}.mp4",
+            settings=settings,
         )
-        audio_clip = AudioFileClip(audio_path)
+    video_only.unlink(missing_ok=True)
+    return segment
+
 
-        if audio_clip.duration > duration:
-            audio_clip = audio_clip.subclipped(0, duration)
+def _encode_scene_segment(job: Dict[str, Any]) -> Tuple[Path, Dict[str, int], List[Dict[str, Any]]]:
+    """Process-pool entry point: encode one scene into its segment file.
+
+    Also returns this job's frame-cache counters and, when `job["trace"]` is
+    set, its metric spans, since a worker process's state is not visible to
+    the parent.
+    """
+    cache = get_frame_cache()
+    before = cache.stats()
+
+    render = _render_scene_still if job["renderer"] == "still" else _render_scene_composed
+    with metrics.collect_spans(job.get("trace", False)) as spans:
+        segment = render(
+            job["scene"],
+            scene_id=job["scene_id"],
+            segment_dir=job["segment_dir"],
+            audio_path=job["audio_path"],
+            settings=job["settings"],
+        )
+
+    after = cache.stats()
+    return segment, {k: after[k] - before[k] for k in after}, spans
+
+
+def _worker_context():
+    # Never fork this process: other threads (voice prefetch, batch jobs, UI
+    # workers) may hold locks that a forked child would inherit still locked.
+    # A fork server (spawn where there is none) starts workers from a clean
+    # interpreter; each resolves the font once.
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def _encode_segments(
+    scenes: List[Dict[str, Any]],
+    audio_paths: Dict[int, str],
+    segment_dir: Path,
+    renderer: str,
+    workers: int,
+    settings: Dict[str, Any],
+    indices: List[int] | None = None,
+) -> List[Path]:
+    """Encode scenes (all, or just `indices`) into segments, in that order."""
+    if indices is None:
+        indices = list(range(len(scenes)))
+
+    jobs = [
+        {
+            "scene": scenes[idx],
+            "scene_id": f"scene_{idx:03d}",
+            "segment_dir": segment_dir,
+            "audio_path": audio_paths.get(idx),
+            "renderer": renderer,
+            "settings": settings,
+        }
+        for idx in indices
+    ]
+    if not jobs:
+        return []
+
+    if workers <= 1:
+        return [_encode_scene_segment(job)[0] for job in jobs]
+
+    run_metrics = metrics.current()
+    for job in jobs:
+        job["trace"] = run_metrics is not None
+    logger.info(f"Encoding {len(jobs)} scene segments with {workers} worker processes")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_worker_context()) as pool:
+        results = list(pool.map(_encode_scene_segment, jobs))
+
+    cache = get_frame_cache()
+    for _, counts, spans in results:
+        cache.record(counts)
+        if run_metrics is not None:
+            run_metrics.merge_spans(spans)
+    return [segment for segment, _, _ in results]
+
+
+def _render_style(renderer: str, settings: Dict[str, Any], voice_name: str) -> Dict[str, Any]:
+    """Everything besides the scene fields that changes an encoded segment."""
+    cfg = quiz_generator_agent.config
+    return {
+        "size": (W, H),
+        "font": _get_available_font(),
+        "font_size": 48,
+        "renderer": renderer,
+        # Thread count follows the worker count and does not change the picture.
+        "encoder": {k: v for k, v in settings.items() if k != "threads"},
+        "tts_model": cfg.TTS_MODEL,
+        "voice_name": voice_name,
+        "countdown": (cfg.COUNTDOWN_STYLE, cfg.COUNTDOWN_DURATION_SEC),
+    }
 
-        clip = clip.with_audio(audio_clip)
 
-    return clip
+def _write_composed_video(
+    scenes: List[Dict[str, Any]],
+    audio_paths: Dict[int, str],
+    work_dir: Path,
+    final_video_path: Path,
+    settings: Dict[str, Any],
+) -> None:
+    """Compose every scene in-process, write the video once, then mux in the soundtrack."""
+    from moviepy import concatenate_videoclips
+
+    scene_clips = [_render_scene(scene, scene_index=idx) for idx, scene in enumerate(scenes)]
+    video_only = work_dir / "video_only.mp4"
+    soundtrack = work_dir / "soundtrack.wav"
+    try:
+        with metrics.span("concatenate_videoclips", scenes=len(scene_clips)):
+            final = concatenate_videoclips(scene_clips, method="compose")
+        try:
+            with metrics.span("write_videofile"):
+                final.write_videofile(str(video_only), **moviepy_write_args(settings), audio=False, logger=None)
+        finally:
+            for c in scene_clips:
+                c.close()
+            final.close()
+
+        with metrics.span("build_soundtrack", scenes=len(scenes)):
+            write_soundtrack(scenes, audio_paths, soundtrack)
+        with metrics.span("mux_soundtrack"):
+            mux_segment_audio(
+                video_only,
+                str(soundtrack),
+                duration=sum(scene.get("duration_sec", 4) for scene in scenes),
+                output_path=final_video_path,
+                settings=settings,
+            )
+    finally:
+        video_only.unlink(missing_ok=True)
+        soundtrack.unlink(missing_ok=True)
+
+
+def _write_streamed_video(
+    scenes: List[Dict[str, Any]],
+    audio_paths: Dict[int, str],
+    work_dir: Path,
+    final_video_path: Path,
+    settings: Dict[str, Any],
+) -> None:
+    """Pipe scenes one at a time into a single encoder.
+
+    Only the current scene's clip is alive at any point, so peak memory and
+    open file handles stay flat however many scenes the quiz has.
+    """
+    soundtrack = work_dir / "soundtrack.wav"
+    with metrics.span("build_soundtrack", scenes=len(scenes)):
+        write_soundtrack(scenes, audio_paths, soundtrack)
+
+    fps = settings["fps"]
+    written, elapsed = 0, 0.0
+    try:
+        with frame_pipe((W, H), soundtrack, final_video_path, settings) as pipe:
+            for idx, scene in enumerate(scenes):
+                elapsed += scene.get("duration_sec", 4)
+                n = round(elapsed * fps) - written
+                with metrics.span("stream_scene", scene_index=idx, frames=n):
+                    clip = _build_scene_visual(scene)
+                    try:
+                        last_frame, data = None, b""
+                        for i in range(n):
+                            frame = clip.get_frame(i / fps)
+                            # Still scenes return the same array every time; convert it once.
+                            if frame is not last_frame:
+                                last_frame = frame
+                                data = np.ascontiguousarray(frame, dtype=np.uint8).tobytes()
+                            pipe.write(data)
+                    finally:
+                        clip.close()
+                written += n
+    finally:
+        soundtrack.unlink(missing_ok=True)
+
+
+def _format_groups(formats: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Group formats by aspect ratio, largest first within each group."""
+    groups: Dict[Fraction, List[Dict[str, Any]]] = {}
+    for fmt in formats:
+        width, height = fmt["size"]
+        groups.setdefault(Fraction(width, height), []).append(fmt)
+    return [sorted(group, key=lambda f: f["size"][0], reverse=True) for group in groups.values()]
+
+
+def _encode_format_group(
+    scenes: List[Dict[str, Any]],
+    soundtrack: Path,
+    frame_dir: Path,
+    outputs: List[Tuple[Path, Tuple[int, int], Dict[str, Any]]],
+) -> None:
+    """Rasterize scenes once at the group's largest size and encode every output from them."""
+    width, height = size = outputs[0][1]
+    frame_dir.mkdir(parents=True, exist_ok=True)
+    frames = []
+    for idx, scene in enumerate(scenes):
+        frame_path = frame_dir / f"scene_{idx:03d}_{width}x{height}.png"
+        with metrics.span("rasterize_scene", scene_index=idx, size=f"{width}x{height}"):
+            # Fast compression: these are read back once, right away.
+            Image.fromarray(_rasterize_scene(scene, size)).save(frame_path, compress_level=1)
+        frames.append((frame_path, scene.get("duration_sec", 4)))
+    with metrics.span("encode_formats", formats=len(outputs), size=f"{width}x{height}"):
+        encode_slideshow(frames, soundtrack, outputs)
+    for frame_path, _ in frames:
+        frame_path.unlink(missing_ok=True)
+
+
+def _write_format_videos(
+    scenes: List[Dict[str, Any]],
+    audio_paths: Dict[int, str],
+    work_dir: Path,
+    formats: List[Dict[str, Any]],
+    profile: str | None = None,
+) -> Dict[str, str]:
+    """Encode every output format from one soundtrack and one frame stream per aspect ratio.
+
+    Scenes are laid out once per aspect ratio, at the largest size asked for
+    in it; smaller formats of the same shape are scaled from those frames by
+    the same encoder process. Aspect ratios are encoded in parallel when
+    there are CPUs to spare.
+    """
+    soundtrack = work_dir / "soundtrack.wav"
+    with metrics.span("build_soundtrack", scenes=len(scenes)):
+        write_soundtrack(scenes, audio_paths, soundtrack)
+
+    groups = _format_groups(formats)
+    paths: Dict[str, str] = {}
+    jobs = []
+    for group in groups:
+        outputs = []
+        for fmt in group:
+            settings = format_settings(fmt, profile)
+            if len(groups) > 1 and not settings["threads"]:
+                # Parallel encoders share the CPUs instead of each starting one thread per core.
+                settings["threads"] = max(1, (os.cpu_count() or 1) // len(groups))
+            path = work_dir / f"quiz_video_{runs.slugify(fmt['name'])}.mp4"
+            outputs.append((path, fmt["size"], settings))
+            paths[fmt["name"]] = str(path)
+        jobs.append(outputs)
+
+    logger.info(f"Encoding {len(formats)} output formats from {len(groups)} sets of scene frames")
+    try:
+        with ThreadPoolExecutor(max_workers=min(len(jobs), os.cpu_count() or 1)) as pool:
+            futures = [
+                metrics.submit(pool, _encode_format_group, scenes, soundtrack, work_dir / "frames", outputs)
+                for outputs in jobs
+            ]
+            for fut in futures:
+                fut.result()
+    finally:
+        soundtrack.unlink(missing_ok=True)
+    return paths
 
 
 def render_video_from_storyboard(
     storyboard: Dict[str, Any],
+    renderer: str | None = None,
+    workers: int | None = None,
+    codec: str | None = None,
+    preset: str | None = None,
+    incremental: bool | None = None,
+    profile: str | None = None,
+    formats: List[str | Dict[str, Any]] | None = None,
+    voices: List[str] | None = None,
 ) -> Dict[str, Any]:
     """
     Given a storyboard, render scenes to a final stitched video.
 
-    This function chooses an output directory automatically based on
-    storyboard['topic'] and a timestamp, under the 'outputs/' folder.
+    Output goes into the current run's directory (see runs.py); when called
+    outside a run, e.g. to re-render a storyboard, a new run is started for
+    storyboard['topic'] under the 'outputs/' folder.
+
+    `renderer` is "compose" (MoviePy compositing, the default), "still"
+    (one rasterized frame per scene, still-image segments joined by stream
+    copy) or "stream" (scenes built one at a time and piped into a single
+    encoder, for bounded memory on long quizzes). Defaults to the
+    VIDEO_RENDERER setting.
+
+    With `workers` > 1 (default RENDER_WORKERS) every scene is encoded into
+    its own segment in a process pool and the segments are joined without
+    re-encoding.
+
+    `profile` picks the encoder profile ("default", "fast-draft", "archive"
+    or "low-fps-still"; default VIDEO_PROFILE), which sets fps, preset,
+    quality, GOP length and audio bitrate; `codec` and `preset` override it.
+
+    With `incremental` (default INCREMENTAL_RENDER) encoded segments are kept
+    in a persistent store keyed by a fingerprint of each scene and its render
+    style; only scenes whose fingerprint is new get TTS and encoding, and the
+    video is re-stitched from stored segments by stream copy.
+
+    `formats` (default VIDEO_FORMATS) renders several outputs in one call,
+    each an OUTPUT_FORMATS name ("720p", "1080p", "vertical"), a
+    "WIDTHxHEIGHT" string or a dict with "size" and encoder overrides. The
+    voiceovers and soundtrack are shared, scenes are laid out once per
+    aspect ratio and encoded by one ffmpeg process per aspect ratio, so an
+    extra format costs one more encode rather than a full render;
+    `renderer`, `workers` and `incremental` do not apply. The result's
+    "videos" maps each format name to its file, and "final_video" is the
+    first format's.
+
+    `voices` (default VIDEO_VOICES, else TTS_VOICE) names the narration
+    voices. The video is rendered once, narrated by the first voice; every
+    other voice gets its own TTS pass (overlapping the render) and a copy of
+    each rendered video with its soundtrack muxed in and the video stream
+    copied, named `<video>_<voice>.mp4`. With more than one voice the
+    result's "voices" maps each voice to its "final_video" (and "videos").
     """
-    from datetime import datetime
-    import re
-
-    topic = storyboard.get("topic", "quiz")
-    slug = re.sub(r"[^a-zA-Z0-9]+", "_", topic.strip().lower())
-    slug = slug.strip("_") or "quiz"
-    run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
-
-    base_output = Path("outputs")
-    base_output.mkdir(exist_ok=True)
-    out_dir = base_output / f"{slug}_{run_id}"
-    out_dir.mkdir(parents=True, exist_ok=True)
+    run = runs.current()
+    if run is None:
+        with runs.start_run(storyboard.get("topic", "quiz")):
+            return render_video_from_storyboard(
+                storyboard, renderer, workers, codec, preset, incremental, profile, formats, voices
+            )
+
+    cfg = quiz_generator_agent.config
+    renderer = renderer or cfg.VIDEO_RENDERER
+    if renderer not in ("compose", "still", "stream"):
+        raise ValueError(f"Unknown renderer: {renderer!r}")
 
+    scenes = storyboard["scenes"]
+    if formats is None:
+        formats = cfg.VIDEO_FORMATS
+    voices = list(dict.fromkeys(voices or cfg.VIDEO_VOICES or [cfg.TTS_VOICE]))
+
+    with ThreadPoolExecutor(max_workers=max(1, len(voices) - 1)) as pool:
+        # The other voices only need narration; synthesize it while the video renders.
+        variant_audio = {
+            voice: metrics.submit(pool, _prefetch_voice, run, scenes, voice)
+            for voice in voices[1:]
+        }
+        if formats:
+            formats = [output_format(spec) for spec in formats]
+            result = _render_formats(run, scenes, formats, codec, preset, profile, voices[0])
+            outputs = {
+                fmt["name"]: (Path(result["videos"][fmt["name"]]), format_settings(fmt, profile))
+                for fmt in formats
+            }
+        else:
+            result, settings = _render_single(
+                run, scenes, renderer, workers, codec, preset, incremental, profile, voices[0]
+            )
+            outputs = {None: (Path(result["final_video"]), settings)}
+
+        if variant_audio:
+            primary = {name: path for name, (path, _) in outputs.items()}
+            result["voices"] = {voices[0]: _variant_result(outputs, primary)}
+            for voice, audio in variant_audio.items():
+                result["voices"][voice] = _mux_voice_variant(run, scenes, outputs, voice, audio.result())
+    return result
+
+
+def _render_single(
+    run: runs.RunContext,
+    scenes: List[Dict[str, Any]],
+    renderer: str,
+    workers: int | None,
+    codec: str | None,
+    preset: str | None,
+    incremental: bool | None,
+    profile: str | None,
+    voice_name: str,
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Render one video with `renderer`; returns the result and its encoder settings."""
+    out_dir = run.run_dir
     audio_dir = out_dir / "audio"
     audio_dir.mkdir(parents=True, exist_ok=True)
-
-    scenes = storyboard["scenes"]
-    scene_clips: List[CompositeVideoClip] = []
-
-    for idx, scene in enumerate(scenes):
-        clip = _render_scene(scene, scene_index=idx, audio_dir=audio_dir)
-        scene_clips.append(clip)
-
     final_video_path = out_dir / "quiz_video_local.mp4"
-    final = concatenate_videoclips(scene_clips, method="compose")
-    final.write_videofile(str(final_video_path), fps=24)
-
-    for c in scene_clips:
-        if c.audio:
-            c.audio.close()
-        c.close()
-    if final.audio:
-        final.audio.close()
-    final.close()
 
-    return {
+    if workers is None:
+        workers = quiz_generator_agent.config.RENDER_WORKERS
+    if incremental is None:
+        incremental = quiz_generator_agent.config.INCREMENTAL_RENDER
+    settings = encoder_settings(profile, codec=codec, preset=preset)
+    if workers > 1 and not settings["threads"]:
+        # Parallel encoders share the CPUs instead of each starting one thread per core.
+        settings["threads"] = max(1, (os.cpu_count() or 1) // workers)
+    segment_dir = out_dir / "segments"
+
+    reused: Dict[int, Path] = {}
+    if incremental:
+        store = get_segment_cache()
+        style = _render_style(renderer, settings, voice_name)
+        fingerprints = [scene_fingerprint(scene, style) for scene in scenes]
+        for idx, fp in enumerate(fingerprints):
+            linked = store.materialize(fp, segment_dir / f"scene_{idx:03d}.mp4")
+            if linked:
+                reused[idx] = Path(linked)
+        logger.info(f"Incremental render: reusing {len(reused)} of {len(scenes)} scene segments")
+    todo = [idx for idx in range(len(scenes)) if idx not in reused]
+
+    # Synthesize all voiceovers up front so scene rendering only reads WAVs.
+    with metrics.span("prefetch_audio", scenes=len(todo)):
+        audio_paths = prefetch_audio(scenes, str(audio_dir), voice_name=voice_name, indices=todo)
+    frames_before = get_frame_cache().stats()
+
+    with stage_slot("render"):
+        if renderer == "still" or workers > 1 or incremental:
+            encoded = _encode_segments(
+                scenes,
+                audio_paths,
+                segment_dir=segment_dir,
+                renderer=renderer,
+                workers=workers,
+                settings=settings,
+                indices=todo,
+            )
+            if incremental:
+                for idx, segment in zip(todo, encoded):
+                    # The fingerprint does not cover the narration itself, so a
+                    # scene whose TTS failed must be encoded again next time.
+                    if is_silent_fallback(audio_paths.get(idx)):
+                        continue
+                    store.put(fingerprints[idx], segment)
+            segments_by_index = {**reused, **dict(zip(todo, encoded))}
+            segments = [segments_by_index[idx] for idx in range(len(scenes))]
+            with metrics.span("concat_segments", segments=len(segments)):
+                concat_segments(segments, final_video_path)
+        elif renderer == "stream":
+            _write_streamed_video(scenes, audio_paths, out_dir, final_video_path, settings)
+        else:
+            _write_composed_video(scenes, audio_paths, out_dir, final_video_path, settings)
+
+    frames_after = get_frame_cache().stats()
+    frame_counts = {k: frames_after[k] - frames_before[k] for k in frames_after}
+    logger.info(
+        f"Frame cache: {frame_counts['memory_hits']} memory hits, "
+        f"{frame_counts['disk_hits']} disk hits, {frame_counts['misses']} misses "
+        f"({hit_rate(frame_counts):.0%} hit rate)"
+    )
+
+    run.final_video = str(final_video_path)
+    result = {
         "final_video": str(final_video_path),
         "output_dir": str(out_dir),
     }
+    return result, settings
 
 
-video_agent = Agent(
-    model="gemini-2.5-flash-lite",
-    name="video_rendering_agent",
-    description="Renders a storyboard into a full quiz video using MoviePy and the audio agent.",
-    instruction=(
-        "You take a storyboard and create a final quiz video.\n"
-        "Use the 'render_video_from_storyboard' tool to:\n"
-        "  - generate audio via the audio agent for each scene\n"
-        "  - render scenes as video clips\n"
-        "  - stitch them into one final video.\n"
-    ),
-    tools=[render_video_from_storyboard],
-)
+def _render_formats(
+    run: runs.RunContext,
+    scenes: List[Dict[str, Any]],
+    formats: List[Dict[str, Any]],
+    codec: str | None,
+    preset: str | None,
+    profile: str | None,
+    voice_name: str,
+) -> Dict[str, Any]:
+    overrides = {"codec": codec, "preset": preset}
+    formats = [{**fmt, **{k: v for k, v in overrides.items() if v is not None}} for fmt in formats]
+    with metrics.span("prefetch_audio", scenes=len(scenes)):
+        audio_paths = prefetch_audio(scenes, str(run.run_dir / "audio"), voice_name=voice_name)
+    with stage_slot("render"):
+        videos = _write_format_videos(scenes, audio_paths, run.run_dir, formats, profile)
+
+    run.final_video = videos[formats[0]["name"]]
+    return {
+        "final_video": run.final_video,
+        "videos": videos,
+        "output_dir": str(run.run_dir),
+    }
+
+
+def _prefetch_voice(run: runs.RunContext, scenes: List[Dict[str, Any]], voice_name: str) -> Dict[int, str]:
+    with metrics.span("prefetch_audio", scenes=len(scenes), voice=voice_name):
+        return prefetch_audio(scenes, str(run.path(f"audio_{runs.slugify(voice_name)}")), voice_name=voice_name)
+
+
+def _variant_result(outputs: Dict[str | None, Tuple[Path, Dict[str, Any]]], paths: Dict[str | None, Path]) -> Dict[str, Any]:
+    """Shape one voice's files like a render result: "final_video", plus "videos" per format."""
+    variant: Dict[str, Any] = {"final_video": str(next(iter(paths.values())))}
+    if None not in outputs:
+        variant["videos"] = {name: str(path) for name, path in paths.items()}
+    return variant
+
+
+def _mux_voice_variant(
+    run: runs.RunContext,
+    scenes: List[Dict[str, Any]],
+    outputs: Dict[str | None, Tuple[Path, Dict[str, Any]]],
+    voice_name: str,
+    audio_paths: Dict[int, str],
+) -> Dict[str, Any]:
+    """Put `voice_name`'s narration on copies of every rendered video, copying the video stream."""
+    slug = runs.slugify(voice_name)
+    soundtrack = run.path(f"soundtrack_{slug}.wav")
+    with metrics.span("build_soundtrack", scenes=len(scenes), voice=voice_name):
+        write_soundtrack(scenes, audio_paths, soundtrack)
+    paths = {}
+    try:
+        for name, (video_path, settings) in outputs.items():
+            variant_path = video_path.with_name(f"{video_path.stem}_{slug}{video_path.suffix}")
+            with metrics.span("mux_soundtrack", voice=voice_name):
+                mux_segment_audio(
+                    video_path,
+                    str(soundtrack),
+                    duration=sum(scene.get("duration_sec", 4) for scene in scenes),
+                    output_path=variant_path,
+                    settings=settings,
+                )
+            paths[name] = variant_path
+    finally:
+        soundtrack.unlink(missing_ok=True)
+    return _variant_result(outputs, paths)
+
+
+@lru_cache(maxsize=None)
+def _build_video_agent():
+    from google.adk.agents.llm_agent import Agent
+
+    return Agent(
+        model="gemini-2.5-flash-lite",
+        name="video_rendering_agent",
+        description="Renders a storyboard into a full quiz video using MoviePy and the audio agent.",
+        instruction=(
+            "You take a storyboard and create a final quiz video.\n"
+            "Use the 'render_video_from_storyboard' tool to:\n"
+            "  - generate audio via the audio agent for each scene\n"
+            "  - render scenes as video clips\n"
+            "  - stitch them into one final video.\n"
+        ),
+        tools=[render_video_from_storyboard],
+    )
+
+
+def __getattr__(name: str):
+    # The ADK agent is only built when the orchestrator path asks for it.
+    if name == "video_agent":
+        return _build_video_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
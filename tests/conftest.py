@@ -0,0 +1,103 @@
+
+"""Shared fixtures: an isolated working directory and a stub Gemini client."""
+
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+# config refuses to import without a key; the stub client never uses it.
+os.environ.setdefault("GOOGLE_API_KEY", "test-key")
+
+from quiz_generator_agent import audio_cache, clients, frame_cache, quiz_cache, runs, segment_cache  # noqa: E402
+from quiz_generator_agent.tts_batch import batch_prompt  # noqa: E402
+
+TTS_RATE = 24000
+WORDS_PER_SEC = 2.5
+BATCH_PAUSE_SEC = 2.0
+
+
+def tone(seconds: float, amplitude: int = 4000) -> np.ndarray:
+    t = np.arange(int(seconds * TTS_RATE)) / TTS_RATE
+    return (amplitude * np.sin(2 * np.pi * 220 * t)).astype("<i2")
+
+
+def speech_pcm(contents) -> bytes:
+    """A tone per line, sized to its word count; batched lines are separated by pauses."""
+    text = str(contents)
+    instruction = batch_prompt([])
+    if not text.startswith(instruction):
+        return tone(max(0.5, len(text.split()) / WORDS_PER_SEC)).tobytes()
+    pause = np.zeros(int(BATCH_PAUSE_SEC * TTS_RATE), dtype="<i2")
+    parts = []
+    for line in text[len(instruction):].split("\n\n"):
+        parts += [tone(max(0.5, len(line.split()) / WORDS_PER_SEC)), pause]
+    return np.concatenate(parts).tobytes()
+
+
+def response(data: bytes = b"", text: str | None = None):
+    part = SimpleNamespace(inline_data=SimpleNamespace(data=data), text=text)
+    return SimpleNamespace(
+        candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))],
+        text=text,
+    )
+
+
+class StubModels:
+    """Answers TTS requests with `speech_pcm` and text requests from `text_replies`."""
+
+    def __init__(self):
+        self.requests = 0
+        self.contents = []
+        self.fail = False
+        self.text_replies = []
+
+    def _call(self, contents):
+        self.requests += 1
+        self.contents.append(contents)
+        if self.fail:
+            raise RuntimeError("stub Gemini is unavailable")
+
+    def generate_content(self, model, contents, config=None):
+        self._call(contents)
+        if self.text_replies:
+            return response(text=self.text_replies.pop(0))
+        return response(speech_pcm(contents))
+
+    def generate_content_stream(self, model, contents, config=None):
+        self._call(contents)
+        pcm = speech_pcm(contents)
+        step = TTS_RATE  # half a second of 16-bit audio
+        for start in range(0, len(pcm), step):
+            yield response(pcm[start:start + step])
+
+
+class StubClient:
+    def __init__(self):
+        self.models = StubModels()
+
+
+def _reset_singletons():
+    audio_cache._cache = None
+    frame_cache._cache = None
+    quiz_cache._cache = None
+    segment_cache._cache = None
+    runs._index = None
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in an empty directory, so the relative outputs/ and cache paths are private."""
+    monkeypatch.chdir(tmp_path)
+    _reset_singletons()
+    yield tmp_path
+    _reset_singletons()
+
+
+@pytest.fixture
+def stub_client():
+    client = StubClient()
+    clients.set_client(client)
+    yield client
+    clients.set_client(None)
@@ -0,0 +1,27 @@
+
+from quiz_generator_agent.batch import load_manifest
+
+HEADER = "topic,difficulty,num_questions\n"
+
+
+def _ids(tmp_path, rows):
+    path = tmp_path / "quizzes.csv"
+    path.write_text(HEADER + "".join(rows), encoding="utf-8")
+    return {(job["topic"], job["difficulty"]): job["job_id"] for job in load_manifest(path)}
+
+
+def test_job_ids_do_not_depend_on_row_order(tmp_path):
+    before = _ids(tmp_path, ["Space,easy,3\n", "Oceans,hard,5\n"])
+    after = _ids(tmp_path, ["Volcanoes,easy,3\n", "Oceans,hard,5\n", "Space,easy,3\n"])
+
+    assert after[("Space", "easy")] == before[("Space", "easy")]
+    assert after[("Oceans", "hard")] == before[("Oceans", "hard")]
+
+
+def test_repeated_rows_get_distinct_ids(tmp_path):
+    path = tmp_path / "quizzes.csv"
+    path.write_text(HEADER + "Space,easy,3\nSpace,easy,3\nSpace,easy,4\n", encoding="utf-8")
+
+    ids = [job["job_id"] for job in load_manifest(path)]
+
+    assert len(set(ids)) == 3
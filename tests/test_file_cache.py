@@ -0,0 +1,75 @@
+
+import os
+import time
+
+from quiz_generator_agent.file_cache import FileCache
+
+
+def _cache(root, max_bytes=1000, max_age_sec=3600, **kwargs):
+    return FileCache(root, max_bytes=max_bytes, max_age_sec=max_age_sec, suffix=".bin", **kwargs)
+
+
+def _age(cache, key, seconds):
+    then = time.time() - seconds
+    os.utime(cache.path_for(key), (then, then))
+
+
+def test_evicts_least_recently_used_entries_over_the_size_cap(tmp_path):
+    cache = _cache(tmp_path, max_bytes=250)
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.put_bytes(key, b"x" * 100)
+        _age(cache, key, 30 - i * 10)
+    # Reading "a" makes it the most recently used entry.
+    assert cache.get("a") is not None
+
+    assert cache.evict() == 1
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_evicts_expired_entries(tmp_path):
+    cache = _cache(tmp_path, max_age_sec=60)
+    cache.put_bytes("old", b"old")
+    cache.put_bytes("new", b"new")
+    _age(cache, "old", 120)
+
+    assert cache.get("old") is None
+    assert cache.evict() == 1
+    assert not cache.path_for("old").exists()
+    assert cache.get("new").read_bytes() == b"new"
+
+
+def test_without_touch_on_hit_age_is_a_ttl_from_write(tmp_path):
+    cache = _cache(tmp_path, max_age_sec=60, touch_on_hit=False)
+    cache.put_bytes("k", b"v")
+    _age(cache, "k", 50)
+    assert cache.get("k") is not None
+
+    _age(cache, "k", 70)
+    assert cache.get("k") is None
+
+
+def test_evict_removes_stale_temp_files_only(tmp_path):
+    cache = _cache(tmp_path)
+    stale = tmp_path / ".stale.tmp"
+    fresh = tmp_path / ".fresh.tmp"
+    stale.write_bytes(b"")
+    fresh.write_bytes(b"")
+    then = time.time() - 2 * 3600
+    os.utime(stale, (then, then))
+
+    cache.evict()
+    assert not stale.exists()
+    assert fresh.exists()
+
+
+def test_materialize_places_the_entry_at_dest(tmp_path):
+    cache = _cache(tmp_path / "cache")
+    cache.put_bytes("k", b"payload")
+    dest = tmp_path / "out" / "k.bin"
+
+    assert cache.materialize("k", dest) == str(dest)
+    assert dest.read_bytes() == b"payload"
+    assert cache.materialize("missing", tmp_path / "out" / "missing.bin") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "evictions": 0}
@@ -0,0 +1,43 @@
+
+from quiz_generator_agent.video_agent import render_video_from_storyboard
+
+STORYBOARD = {
+    "topic": "Incremental",
+    "scenes": [
+        {"id": "intro", "type": "intro", "text": "Welcome", "voiceover": "Welcome to the quiz.", "duration_sec": 1},
+        {"id": "thanks", "type": "thanks", "text": "Thanks", "voiceover": "Thanks for watching.", "duration_sec": 1},
+    ],
+}
+
+
+def _render():
+    return render_video_from_storyboard(STORYBOARD, renderer="still", incremental=True, formats=[], voices=["Kore"])
+
+
+def test_rerender_reuses_encoded_scenes(workdir, stub_client):
+    _render()
+    assert stub_client.models.requests > 0
+
+    stub_client.models.requests = 0
+    _render()
+    assert stub_client.models.requests == 0
+
+
+def test_scenes_narrated_by_silent_fallback_are_not_reused(workdir, stub_client):
+    # A TTS outage leaves silent narration; that render must not be kept...
+    stub_client.models.fail = True
+    _render()
+
+    # ...so once TTS works again, every scene is voiced and re-encoded.
+    stub_client.models.fail = False
+    stub_client.models.requests = 0
+    _render()
+    spoken = stub_client.models.contents[-stub_client.models.requests:]
+    assert stub_client.models.requests > 0
+    assert any("Welcome to the quiz." in str(c) for c in spoken)
+    assert any("Thanks for watching." in str(c) for c in spoken)
+
+    # The recovered segments are stored like any other.
+    stub_client.models.requests = 0
+    _render()
+    assert stub_client.models.requests == 0
@@ -0,0 +1,27 @@
+
+import pytest
+
+import quiz_generator_agent.config as cfg
+from quiz_generator_agent.jobs import request_key
+
+
+def test_request_key_normalizes_the_request():
+    assert request_key("  Space ", "Easy", 3) == request_key("space", "easy", "3")
+    assert request_key("Space", "easy", 3) != request_key("Space", "hard", 3)
+
+
+@pytest.mark.parametrize(
+    "name, value",
+    [
+        ("QUIZ_MAX_REPAIRS", 0),
+        ("QUIZ_SHARD_SIZE", 2),
+        ("PIPELINED", True),
+        ("COUNTDOWN_STYLE", "silent"),
+        ("COUNTDOWN_DURATION_SEC", 5.0),
+        ("TTS_MODEL", "other-tts"),
+    ],
+)
+def test_request_key_covers_settings_that_change_the_video(monkeypatch, name, value):
+    before = request_key("Space", "easy", 3)
+    monkeypatch.setattr(cfg, name, value)
+    assert request_key("Space", "easy", 3) != before
@@ -0,0 +1,41 @@
+
+import json
+
+import pytest
+
+import quiz_generator_agent.config as cfg
+from quiz_generator_agent.pipeline import render_quiz_pipelined
+from quiz_generator_agent.tts_batch import batch_prompt
+
+QUIZ = {
+    "topic": "Space",
+    "difficulty": "easy",
+    "questions": [
+        {
+            "id": i,
+            "question": f"Which planet is number {i} from the sun?",
+            "options": ["Mercury", "Venus", "Earth", "Mars"],
+            "correct_option_index": i - 1,
+            "fact": "Planets orbit the sun.",
+        }
+        for i in (1, 2)
+    ],
+}
+
+
+def test_pipelined_render_batches_each_questions_voiceovers(workdir, stub_client, monkeypatch):
+    monkeypatch.setattr(cfg, "TTS_BATCH_SIZE", 8)
+    stub_client.models.text_replies = [json.dumps(QUIZ)]
+
+    result = render_quiz_pipelined("Space", "easy", 2, workdir, renderer="still", profile="low-fps-still")
+
+    assert (workdir / "quiz_video_local.mp4").is_file()
+    assert len(result["storyboard"]["scenes"]) == 2 + 4 * len(QUIZ["questions"])
+    batched = [c for c in stub_client.models.contents if str(c).startswith(batch_prompt([]))]
+    assert len(batched) == len(QUIZ["questions"])
+
+
+def test_pipelined_render_rejects_the_stream_renderer(workdir, stub_client):
+    with pytest.raises(ValueError, match="stream"):
+        render_quiz_pipelined("Space", "easy", 2, workdir, renderer="stream")
+    assert stub_client.models.requests == 0
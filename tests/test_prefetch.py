@@ -0,0 +1,72 @@
+
+import threading
+import time
+from collections import defaultdict
+
+import quiz_generator_agent.config as cfg
+from quiz_generator_agent.audio_agent import is_silent_fallback, prefetch_audio
+
+from conftest import StubModels
+
+SCENES = [
+    {"voiceover": "Welcome to a quick quiz on Space."},
+    {"voiceover": "Which planet is closest to the sun?"},
+    {"voiceover": "The correct answer is Mercury."},
+    {"voiceover": "Which planet has the most moons?"},
+    {"voiceover": "The correct answer is Mercury."},
+    {"voiceover": "Welcome to a quick quiz on Space."},
+]
+
+
+class RateLimited(Exception):
+    code = 429
+
+
+class RateLimitedModels(StubModels):
+    """Answers the first request for each line with a 429, and records overlap."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = defaultdict(list)
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def generate_content_stream(self, model, contents, config=None):
+        with self._lock:
+            self.calls[contents].append(time.monotonic())
+            first = len(self.calls[contents]) == 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(0.05)
+            if first:
+                raise RateLimited("429 RESOURCE_EXHAUSTED")
+            yield from super().generate_content_stream(model, contents, config)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+class RateLimitedClient:
+    def __init__(self):
+        self.models = RateLimitedModels()
+
+
+def test_prefetch_backs_off_on_429_and_bounds_concurrency(workdir, monkeypatch):
+    monkeypatch.setattr(cfg, "TTS_BACKOFF_BASE_SEC", 0.1)
+    client = RateLimitedClient()
+
+    paths = prefetch_audio(SCENES, str(workdir / "audio"), max_concurrency=2, tts_client=client)
+
+    calls = client.models.calls
+    # Each distinct line costs one rejected and one successful request.
+    assert sorted(calls) == sorted({scene["voiceover"] for scene in SCENES})
+    for times in calls.values():
+        assert len(times) == 2
+        assert times[1] - times[0] >= 0.1
+    assert client.models.max_active == 2
+
+    assert sorted(paths) == list(range(len(SCENES)))
+    assert paths[0] == paths[5] and paths[2] == paths[4]
+    assert not any(is_silent_fallback(path) for path in paths.values())
@@ -0,0 +1,93 @@
+
+import json
+
+import pytest
+
+import quiz_generator_agent.config as cfg
+from quiz_generator_agent.quiz_agent import design_quiz
+from quiz_generator_agent.quiz_schema import QuizValidationError, validate_quiz
+
+
+def _question(i):
+    return {
+        "id": i,
+        "question": f"Question {i}?",
+        "options": [" A ", "B", "C", "D"],
+        "correct_option_index": i % 4,
+        "fact": f"Fact {i}.",
+    }
+
+
+def _quiz(n):
+    return {"topic": "Space", "difficulty": "easy", "questions": [_question(i) for i in range(1, n + 1)]}
+
+
+def test_validate_quiz_reports_every_problem():
+    quiz = _quiz(2)
+    quiz["questions"][0]["options"] = ["A", "B"]
+    quiz["questions"][1]["correct_option_index"] = True
+    del quiz["questions"][1]["fact"]
+
+    assert validate_quiz(quiz, 3) == [
+        "expected 3 questions, got 2",
+        "questions[0].options must be a list of 4 non-empty strings",
+        "questions[1].correct_option_index must be an integer 0-3",
+        "questions[1].fact must be a non-empty string",
+    ]
+    assert validate_quiz(_quiz(3), 3) == []
+    assert validate_quiz([], 3) == ["top level must be an object, got list"]
+
+
+def test_design_quiz_repairs_invalid_json(workdir, stub_client):
+    stub_client.models.text_replies = ["not json", json.dumps(_quiz(1)), json.dumps(_quiz(3))]
+
+    quiz = design_quiz("Space", "easy", 2)
+
+    assert stub_client.models.requests == 3
+    # Each repair request carries the previous errors back to the model.
+    repair = stub_client.models.contents[-1][-1].parts[0].text
+    assert "expected 2 questions, got 1" in repair
+    assert [q["id"] for q in quiz["questions"]] == [1, 2]
+    assert quiz["questions"][0]["options"][0] == "A"
+
+
+def test_design_quiz_gives_up_after_max_repairs(workdir, stub_client, monkeypatch):
+    monkeypatch.setattr(cfg, "QUIZ_MAX_REPAIRS", 1)
+    stub_client.models.text_replies = ["{}", "{}", json.dumps(_quiz(2))]
+
+    with pytest.raises(QuizValidationError) as exc:
+        design_quiz("Space", "easy", 2)
+
+    assert stub_client.models.requests == 2
+    assert exc.value.errors == ["'questions' must be a non-empty list"]
+
+
+def test_design_quiz_reuses_cached_quiz(workdir, stub_client):
+    stub_client.models.text_replies = [json.dumps(_quiz(2))]
+
+    first = design_quiz("Space", "easy", 2)
+    second = design_quiz("Space", "easy", 2)
+
+    assert stub_client.models.requests == 1
+    assert second == first
+
+
+def test_sharded_quiz_drops_duplicates_and_tops_up(workdir, stub_client, monkeypatch):
+    monkeypatch.setattr(cfg, "QUIZ_SHARD_SIZE", 2)
+    monkeypatch.setattr(cfg, "QUIZ_SHARD_CONCURRENCY", 1)
+    second = _quiz(2)
+    # Same question as the first shard's, up to case and punctuation.
+    second["questions"][0]["question"] = "  question 1 "
+    second["questions"][1]["question"] = "Question 3?"
+    top_up = _quiz(1)
+    top_up["questions"][0]["question"] = "Question 4?"
+    stub_client.models.text_replies = [json.dumps(_quiz(2)), json.dumps(second), json.dumps(top_up)]
+
+    quiz = design_quiz("Space", "easy", 4)
+
+    # Two shards get fixed subtopic hints, so there is no planning request.
+    assert stub_client.models.requests == 3
+    assert "FOCUS SUBTOPIC" in stub_client.models.contents[0][0].parts[0].text
+    assert "- Question 1?" in stub_client.models.contents[-1][0].parts[0].text
+    assert [q["question"] for q in quiz["questions"]] == [f"Question {i}?" for i in range(1, 5)]
+    assert [q["id"] for q in quiz["questions"]] == [1, 2, 3, 4]
@@ -0,0 +1,22 @@
+
+from pathlib import Path
+
+from quiz_generator_agent.video_agent import _worker_context, render_video_from_storyboard
+
+STORYBOARD = {
+    "topic": "Workers",
+    "scenes": [
+        {"id": "intro", "type": "intro", "text": "Welcome", "voiceover": "Welcome to the quiz.", "duration_sec": 1},
+        {"id": "thanks", "type": "thanks", "text": "Thanks", "voiceover": "Thanks for watching.", "duration_sec": 1},
+    ],
+}
+
+
+def test_worker_processes_are_not_forked():
+    assert _worker_context().get_start_method() in ("forkserver", "spawn")
+
+
+def test_render_with_worker_processes(workdir, stub_client):
+    result = render_video_from_storyboard(STORYBOARD, renderer="still", workers=2, formats=[], voices=["Kore"])
+
+    assert Path(result["final_video"]).is_file()
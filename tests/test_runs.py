@@ -0,0 +1,45 @@
+
+import time
+
+from quiz_generator_agent.runs import get_run_index, new_run
+
+
+def _record(index, topic, status, age_days):
+    run = new_run(topic)
+    run.created_at = time.time() - age_days * 86400
+    index.record_start(run)
+    if status != "running":
+        index.record_finish(run, status)
+    return run
+
+
+def test_new_run_records_an_absolute_run_dir(workdir):
+    run = new_run("Space")
+    assert run.run_dir.is_absolute()
+    assert run.run_dir.parent == (workdir / "outputs").resolve()
+
+
+def test_gc_collects_stale_running_rows(workdir):
+    index = get_run_index()
+    old_ok = _record(index, "old ok", "ok", 30)
+    crashed = _record(index, "crashed", "running", 30)
+    running = _record(index, "running", "running", 0)
+    recent = _record(index, "recent", "ok", 0)
+
+    removed = index.gc(older_than_days=14)
+
+    assert {run["run_id"] for run in removed} == {old_ok.run_id, crashed.run_id}
+    assert not crashed.run_dir.exists()
+    assert running.run_dir.exists() and recent.run_dir.exists()
+    assert {run["run_id"] for run in index.list_runs()} == {running.run_id, recent.run_id}
+
+
+def test_gc_without_age_never_collects_running_rows(workdir):
+    index = get_run_index()
+    crashed = _record(index, "crashed", "running", 30)
+    failed = _record(index, "failed", "failed", 30)
+
+    removed = index.gc()
+
+    assert [run["run_id"] for run in removed] == [failed.run_id]
+    assert crashed.run_dir.exists()
@@ -0,0 +1,81 @@
+
+import numpy as np
+
+import quiz_generator_agent.config as cfg
+from quiz_generator_agent.audio_agent import prefetch_audio
+from quiz_generator_agent.audio_cache import get_audio_cache
+from quiz_generator_agent.tts_batch import plan_batches, split_utterances
+
+from conftest import TTS_RATE, tone
+
+LINES = ["one two three four five", "six seven eight", "nine ten eleven twelve thirteen fourteen"]
+
+SCENES = [
+    {"voiceover": "What is the capital of France?"},
+    {"voiceover": "Paris is the capital of France."},
+    {"voiceover": "Which planet is known as the red planet?"},
+]
+
+
+def _pause(seconds):
+    return np.zeros(int(seconds * TTS_RATE), dtype="<i2")
+
+
+def _speech(words, gap=0.2):
+    """A line of `words` tones separated by short pauses, like words in a sentence."""
+    parts = []
+    for _ in range(words):
+        parts += [tone(0.3), _pause(gap)]
+    return np.concatenate(parts[:-1])
+
+
+def test_plan_batches_groups_short_lines():
+    texts = ["a b", "c d e", "f", "a very long line that is read on its own", "g h"]
+    assert plan_batches(texts, max_lines=2, max_words=4) == [["a b", "c d e"], ["f", "g h"]]
+    # A short line left alone in the last batch is sent by itself.
+    assert plan_batches(texts[:3], max_lines=2, max_words=4) == [["a b", "c d e"]]
+
+
+def test_split_utterances_cuts_at_the_pauses_between_lines():
+    lines = [_speech(len(text.split())) for text in LINES]
+    pcm = np.concatenate([_pause(0.3), lines[0], _pause(1.5), lines[1], _pause(1.5), lines[2], _pause(0.5)])
+
+    pieces = split_utterances(pcm.tobytes(), LINES, TTS_RATE, min_gap_sec=0.6)
+
+    assert pieces is not None and len(pieces) == 3
+    for piece, line in zip(pieces, lines):
+        # Each piece is its line plus at most the padding on either side.
+        assert len(line) <= len(piece) // 2 <= len(line) + int(0.35 * TTS_RATE)
+
+
+def test_split_utterances_rejects_ambiguous_audio():
+    lines = [_speech(len(text.split())) for text in LINES]
+    # The pauses between lines are no longer than the pauses inside them.
+    no_gaps = np.concatenate([lines[0], _pause(0.2), lines[1], _pause(0.2), lines[2]])
+    assert split_utterances(no_gaps.tobytes(), LINES, TTS_RATE, min_gap_sec=0.6) is None
+
+    # Two clear gaps, but the pieces do not match the lines' lengths.
+    mismatched = np.concatenate([tone(0.3), _pause(1.5), tone(0.3), _pause(1.5), _speech(30)])
+    assert split_utterances(mismatched.tobytes(), LINES, TTS_RATE, min_gap_sec=0.6) is None
+
+    # A single gap cannot separate three lines.
+    one_gap = np.concatenate([lines[0], _pause(1.5), lines[1], lines[2]])
+    assert split_utterances(one_gap.tobytes(), LINES, TTS_RATE, min_gap_sec=0.6) is None
+
+
+def test_batched_prefetch_counts_each_miss_once(workdir, stub_client, monkeypatch):
+    monkeypatch.setattr(cfg, "TTS_BATCH_SIZE", 8)
+    paths = prefetch_audio(SCENES, str(workdir / "audio"))
+
+    assert sorted(paths) == [0, 1, 2]
+    assert stub_client.models.requests == 1
+    assert get_audio_cache().stats()["misses"] == len(SCENES)
+
+
+def test_fallback_lines_are_not_looked_up_again(workdir, stub_client, monkeypatch):
+    monkeypatch.setattr(cfg, "TTS_BATCH_SIZE", 8)
+    # One line per request after the batch fails.
+    stub_client.models.fail = True
+    prefetch_audio(SCENES, str(workdir / "audio"))
+
+    assert get_audio_cache().stats()["misses"] == len(SCENES)
@@ -0,0 +1,29 @@
+
+import wave
+
+from quiz_generator_agent.audio_agent import is_silent_fallback, prefetch_audio
+
+SCENES = [{"voiceover": "Which planet is closest to the sun?"}]
+
+
+def test_stream_without_audio_falls_back_to_a_single_request(workdir, stub_client, monkeypatch):
+    def no_streaming(model, contents, config=None):
+        stub_client.models.requests += 1
+        raise NotImplementedError("this model cannot stream audio")
+
+    monkeypatch.setattr(stub_client.models, "generate_content_stream", no_streaming)
+
+    path = prefetch_audio(SCENES, str(workdir / "audio"))[0]
+
+    assert stub_client.models.requests == 2
+    assert not is_silent_fallback(path)
+    with wave.open(path) as wf:
+        assert wf.getnframes() > 0
+
+
+def test_streamed_audio_is_written_to_disk(workdir, stub_client):
+    path = prefetch_audio(SCENES, str(workdir / "audio"))[0]
+
+    assert stub_client.models.requests == 1
+    assert not is_silent_fallback(path)
+    assert not list((workdir / "audio").glob(".*.tmp"))